@@ -1,15 +1,38 @@
 from flask import Flask, render_template, request, redirect, url_for, session, jsonify
-import sqlite3
 from functools import wraps
 import os  # Import os module to handle directory creation
-import pandas as pd
 from werkzeug.utils import secure_filename
 import csv
-from flask import Response
+import itertools
+from flask import send_file
 from flask_bcrypt import Bcrypt
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 import uuid
-import random
+import archive
+import attendance
+import attendance_analytics
+import attendance_bits
+import attendance_stats
+import click
+import csv_export
+import db
+import grading
+import heatmaps
+import ia_autosave
+import ia_papers
+import ia_session
+import jobs
+import metrics
+import migrations
+import pagination
+import profiling
+import question_import
+import question_search
+import question_stats
+import refdata
+import student_import
+import user_cache
+from db import get_db
 
 app = Flask(__name__)
 
@@ -19,123 +42,103 @@ bcrypt = Bcrypt(app)
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 
-# database path
-DB_PATH = "attendance_system/database/attendance.db"
+# database path; ATTENDANCE_DB_PATH points the app at another file, e.g. one from fake_record.py
+DB_PATH = os.environ.get("ATTENDANCE_DB_PATH", "attendance_system/database/attendance.db")
 
 # Ensure the database directory exists
 os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
 
-# function to create table
-def create_tables():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+# pooled per-worker connections, see db.py
+db.init_app(app, DB_PATH)
 
-    # School
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS School (
-                   id INTEGER PRIMARY KEY AUTOINCREMENT,
-                   name TEXT NOT NULL
-                )
-    '''
-    )
+# terms older than ARCHIVE_AFTER_DAYS live in a second file attached as `archive`, see archive.py
+archive.init_app(app, os.path.join(os.path.dirname(DB_PATH), "archive.db"))
 
-    # Department 
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS Department (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    school_id INTEGER,
-                    FOREIGN KEY (school_id) REFERENCES School(id)
-                   )
-    '''
-    )
+# opt-in request profiling and SQL instrumentation (PROFILE=1), see profiling.py
+profiling.init_app(app, os.path.join(os.path.dirname(DB_PATH), "logs", "profile.log"))
 
-    # Class
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS Class (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    department_id INTEGER,
-                    FOREIGN KEY (department_id) REFERENCES Department(id)
-                   )
-    '''
-    )
-
-    # Teacher
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS Teacher (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    email TEXT UNIQUE NOT NULL,
-                    password TEXT NOT NULL,
-                    user_id INTEGER,
-                    subject TEXT,
-                    FOREIGN KEY (user_id) REFERENCES users(id)
-                   )
-    '''
-    )
+# per-route latency, in-flight requests, lock errors, cache and queue metrics at /metrics, see metrics.py
+metrics.init_app(app, os.path.join(os.path.dirname(DB_PATH), "metrics"))
 
-    # Student
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS Student (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    email TEXT UNIQUE NOT NULL,
-                    password TEXT NOT NULL,
-                    roll_number TEXT UNIQUE NOT NULL,
-                    class_id INTEGER,
-                    user_id INTEGER,
-                    FOREIGN KEY (class_id) REFERENCES Class(id)
-                    FOREIGN KEY (user_id) REFERENCES users(id)
-                   )
-    '''
-    )
+# background jobs and their downloadable artifacts, see jobs.py
+JOB_DIR = os.path.join(os.path.dirname(DB_PATH), "jobs")
+jobs.init_app(app, JOB_DIR)
 
-    # Attendance
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS Attendance (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    student_id INTEGER,
-                    date DATE NOT NULL,
-                    status TEXT CHECK(status IN ('Present', 'Absent')),
-                    FOREIGN KEY (student_id) REFERENCES Student(id)
-                   )
-    '''
-    )
+# attendance heatmaps, rendered by a background job and cached on disk, see heatmaps.py
+heatmaps.init_app(app, os.path.join(os.path.dirname(DB_PATH), "heatmaps"))
 
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            role TEXT CHECK(role IN ('admin', 'teacher', 'student')) NOT NULL DEFAULT 'student'
-        )
-    ''')
-
-    conn.commit()
-    conn.close()
+# function to create table
+# the schema itself lives in migrations.py; this brings the database up to the latest version
+def create_tables():
+    conn = db.connection(DB_PATH)
+    migrations.migrate(conn)
 
 # call the function to create table
 create_tables()
 
+# the nightly archive run queues the next one itself; every worker start makes sure one is queued
+archive.schedule(db.connection(DB_PATH))
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Apply pending schema migrations."""
+    conn = db.connection(DB_PATH)
+    applied = migrations.migrate(conn)
+    for version, name in applied:
+        click.echo(f"applied {version}: {name}")
+    click.echo(f"schema version {migrations.schema_version(conn)}")
+
+@app.cli.command('explain-queries')
+@click.option('--strict', is_flag=True, help='Exit with status 1 if any query does a full table scan.')
+def explain_queries_command(strict):
+    """Print EXPLAIN QUERY PLAN for every query the app issues."""
+    conn = db.connection(DB_PATH)
+    flagged = 0
+    for location, sql, plan, scans in migrations.explain_queries(conn):
+        click.echo(f"{location}  {sql}")
+        for detail in plan:
+            click.echo(f"    {detail}")
+        if scans:
+            flagged += 1
+            click.echo("    ^ full table scan")
+    click.echo(f"{flagged} queries with full table scans")
+    if strict and flagged:
+        raise SystemExit(1)
+
 class User(UserMixin):
     def __init__(self, id, email, role):
         self.id = id
         self.email = email
         self.role = role
 
+def fetch_user(user_id):
+    cursor = get_db().cursor()
+    cursor.execute("SELECT id, email, role FROM users WHERE id = ?", (user_id,))
+    return cursor.fetchone()
+
 @login_manager.user_loader
 def load_user(user_id):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, email, role FROM users WHERE id = ?", (user_id,))
-    user = cursor.fetchone()
-    conn.close()
+    user = user_cache.get(get_db(), user_id, fetch_user)
 
     if user:
         return User(id=user[0], email=user[1], role=user[2])
     return None
 
+def page_urls(page):
+    # first/next links for a keyset-paginated listing, keeping the current filters
+    args = request.args.to_dict()
+    args.pop('after', None)
+    args = {**request.view_args, **args}   # a query arg may share a view arg's name
+    urls = {'first': None, 'next': None}
+    if request.args.get('after'):
+        urls['first'] = url_for(request.endpoint, **args)
+    if page.next:
+        urls['next'] = url_for(request.endpoint, **args, after=page.next)
+    return urls
+
+def wants_json():
+    return request.args.get('format') == 'json'
+
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -177,7 +180,7 @@ def register():
         role = request.form['role']
         password = bcrypt.generate_password_hash(request.form['password']).decode('utf-8')
 
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         cursor = conn.cursor()
 
         # check if email already exists
@@ -192,13 +195,13 @@ def register():
         # Insert into Teacher or Student table based on role
         if role == 'teacher':
             cursor.execute("INSERT INTO Teacher (user_id, name,email,password) VALUES (?, ?, ?, ?)", (user_id, name,email,password))
+            refdata.invalidate(conn)
         elif role == 'student':
             roll_number = request.form['roll_number']
             class_id = request.form['class_id']
             cursor.execute("INSERT INTO Student (user_id, name, roll_number, class_id,email,password) VALUES (?, ?, ?, ?, ?, ?)", (user_id, name, roll_number, class_id, email, password))
         
         conn.commit()
-        conn.close()
 
         return redirect(url_for('login'))
     
@@ -211,12 +214,10 @@ def login():
         email = request.form['email']
         password = request.form['password']
 
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute("SELECT id, email, password, role FROM users WHERE email = ?", (email,))
         user = cursor.fetchone()
-
-        conn.close()
         
             # user[0]=id	user[1]=email	user[2]=password	user[3]=role
         # print(user[2])
@@ -254,21 +255,78 @@ def teacher_dashboard(teacher_id):
 def student_dashboard(student_id):
     return render_template('student_dashboard.html', student_id = student_id)
 
+@app.route('/db_stats')
+@admin_required
+def db_stats():
+    if not app.config['DB_POOL_STATS']:
+        return "DB pool stats are disabled (set DB_POOL_STATS=1)", 404
+    get_db()
+    return jsonify(db.pool_stats())
+
+@app.route('/cache_stats')
+@admin_required
+def cache_stats():
+    ref = refdata.get(get_db())
+    return jsonify(
+        ia_autosave=ia_autosave.stats(),
+        users=user_cache.stats(),
+        refdata={'version': ref.version, 'schools': len(ref.schools), 'departments': len(ref.departments),
+                 'classes': len(ref.classes), 'teachers': len(ref.teachers)},
+    )
+
+@app.route('/profile')
+@admin_required
+def profile():
+    if not app.config['PROFILE']:
+        return "Profiling is disabled (set PROFILE=1)", 404
+    records = profiling.recent(request.args.get('limit', 200, type=int))
+    if request.args.get('route'):
+        records = [r for r in records if r['route'] == request.args['route']]
+    if request.args.get('n_plus_one'):
+        records = [r for r in records if r['n_plus_one']]
+    return jsonify(routes=profiling.summary(records), requests=records[::-1])
+
+@metrics.collector
+def worker_metrics():
+    samples = []
+    for cache, stats in (('users', user_cache.stats()), ('refdata', refdata.stats()),
+                         ('ia_questions', ia_session.stats()), ('page_counts', pagination.stats()),
+                         ('attendance_analytics', attendance_analytics.stats()), ('heatmaps', heatmaps.stats())):
+        samples.append(('cache_hits_total', {'cache': cache}, stats['hits'] + stats.get('shared_hits', 0)))
+        samples.append(('cache_misses_total', {'cache': cache}, stats['misses']))
+    autosave = ia_autosave.stats()
+    samples.append(('sqlite_locked_total', {'source': 'autosave'}, autosave['retries']))
+    samples.append(('sqlite_locked_total', {'source': 'jobs'}, jobs.stats()['busy']))
+    samples.append(('queue_depth', {'queue': 'autosave', 'status': 'pending'}, autosave['pending']))
+    return samples
+
+@metrics.scrape_collector
+def job_metrics(conn):
+    depths = jobs.queue_depths(conn)
+    return [('queue_depth', {'queue': 'jobs', 'status': status}, depths.get(status, 0))
+            for status in ('queued', 'running', 'failed')]
+
+@app.route('/metrics')
+def metrics_endpoint():
+    # for a scraper holding METRICS_TOKEN, or an admin in the browser
+    if not metrics.authorized(app.config['METRICS_TOKEN']) and session.get('role') != 'admin':
+        return "Access Denied", 403
+    if not app.config['METRICS']:
+        return "Metrics are disabled (set METRICS=1)", 404
+    return metrics.render(get_db()), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
 # ---------------------------------------------------------------------------------------------------------------------
 # --------------------------------------------------school oprations---------------------------------------------------
 @app.route('/add_school', methods = ['GET','POST'])
 @admin_required
 def add_school():
-    print("in add_school app.py")
     if request.method == 'POST':
         name = request.form['add_school']
-        print("in method")
-        print(name)
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute("INSERT INTO School (name) VALUES (?)", (name,))
+        refdata.invalidate(conn)
         conn.commit()
-        conn.close()
 
         return redirect(url_for('manage_schools'))  # Redirect to the school list page
 
@@ -277,41 +335,36 @@ def add_school():
 @app.route('/manage_schools')
 @admin_required
 def manage_schools():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM School")
-    schools = cursor.fetchall()
-    conn.close()
+    schools = refdata.get(get_db()).schools
 
     return render_template('manage_schools.html', schools=schools)
 
 @app.route('/edit_school/<int:school_id>', methods = ['GET','POST'])
 @admin_required
 def edit_school(school_id):
-    conn =sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
 
     if request.method=='POST':
         new_name = request.form['name']
         cursor.execute("UPDATE School SET name = ? WHERE id = ?",(new_name,school_id))
+        refdata.invalidate(conn)
         conn.commit()
-        conn.close()
         return redirect(url_for('manage_schools')) 
     
     cursor.execute("SELECT * FROM School WHERE id = ?", (school_id,))
     school = cursor.fetchone()
-    conn.close()
 
     return render_template('edit_school.html',school=school)
 
 @app.route('/delete_school/<int:school_id>',methods =['GET','POST'])
 @admin_required
 def delete_school(school_id):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute("DELETE FROM School WHERE id = ?", (school_id,))
+    refdata.invalidate(conn)
     conn.commit()
-    conn.close()
 
     return redirect(url_for('manage_schools'))
 # --------------------------------------------------------------------------------------------------------------------
@@ -320,40 +373,37 @@ def delete_school(school_id):
 @app.route('/add_department',methods = ['GET','POST'])
 @admin_required
 def add_department():
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
 
     if request.method == 'POST':
         name = request.form['name']
         school_id = request.form['school_id']
         cursor.execute("INSERT INTO Department (name,school_id) VALUES (?,?)",(name,school_id))
+        refdata.invalidate(conn)
         conn.commit()
-        conn.close()
         return redirect(url_for('manage_departments'))
     
-    cursor.execute("SELECT * FROM School")
-    schools = cursor.fetchall()
-    conn.close()
+    schools = refdata.get(conn).schools
 
     return render_template('add_department.html',schools=schools)
 
 @app.route('/manage_departments')
 @admin_required
 def manage_departments():
-    conn =sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute(
         '''SELECT Department.id, Department.name, School.name FROM Department JOIN School ON Department.school_id = School.id'''
     )
     departments = cursor.fetchall()
-    conn.close()
 
     return render_template('manage_departments.html',departments = departments)
 
 @app.route('/edit_department/<int:department_id>',methods =['GET','POST'])
 @admin_required
 def edit_department(department_id):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
 
     if request.method == 'POST':
@@ -362,28 +412,25 @@ def edit_department(department_id):
         cursor.execute(
             "UPDATE Department SET name = ?, school_id = ? WHERE id = ?", (new_name, new_school_id, department_id)
         )
+        refdata.invalidate(conn)
         conn.commit()
-        conn.close()
         return redirect(url_for('manage_departments'))
     
-    cursor.execute("SELECT * FROM Department WHERE id = ?", (department_id,))
-    department = cursor.fetchone()
+    ref = refdata.get(conn)
+    department = ref.department.get(department_id)
+    schools = ref.schools
 
-    cursor.execute("SELECT * FROM School")
-    schools = cursor.fetchall()
-
-    conn.close()
 
     return render_template('edit_department.html',department= department , schools = schools)
 
 @app.route('/delete_department/<int:department_id>')
 @admin_required
 def delete_department(department_id):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute("DELETE FROM Department WHERE id = ?", (department_id,))
+    refdata.invalidate(conn)
     conn.commit()
-    conn.close()
 
     return redirect(url_for('manage_departments'))
 # --------------------------------------------------------------------------------------------------------------------
@@ -391,111 +438,83 @@ def delete_department(department_id):
 @app.route('/add_class', methods = ['GET','POST'])
 @admin_required
 def add_class():
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
 
     if request.method == 'POST':
         name = request.form['name']
         department_id = request.form['department_id']
         cursor.execute("INSERT INTO Class (name,department_id) VALUES (?,?)" , (name,department_id))
+        refdata.invalidate(conn)
         conn.commit()
-        conn.close()
         return redirect(url_for('manage_classes'))
     
-    cursor.execute("SELECT * FROM Department")
-    departments = cursor.fetchall()
-    conn.close()
+    departments = refdata.get(conn).departments
 
     return render_template('add_class.html',departments = departments)
 
 @app.route('/manage_classes')
 @admin_required
 def manage_classes():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT Class.id , Class.name , Department.name from Class JOIN Department ON Class.department_id = Department.id
-''')
-    classes = cursor.fetchall()
-    conn.close()
-    
-    return render_template('manage_classes.html',classes = classes)
+    conn = get_db()
+    try:
+        page = pagination.fetch(
+            conn, "Class.id, Class.name, Department.name",
+            "FROM Class JOIN Department ON Class.department_id = Department.id",
+            [('Class.id', 0)], after=request.args.get('after'), limit=pagination.per_page(request.args),
+        )
+    except ValueError as e:
+        return str(e), 400
+    classes = page.rows
+
+    if wants_json():
+        return jsonify(classes=[{'id': c[0], 'name': c[1], 'department': c[2]} for c in classes], total=page.total, next=page.next)
+    return render_template('manage_classes.html',classes = classes, page = page, pager = page_urls(page))
 
 @app.route('/edit_class/<int:class_id>', methods=['GET', 'POST'])
 @admin_required
 def edit_class(class_id):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
 
     if request.method == 'POST':
         new_name = request.form['name']
         new_department_id = request.form['department_id']
         cursor.execute("UPDATE Class SET name = ?, department_id = ? WHERE id = ?", (new_name, new_department_id, class_id))
+        refdata.invalidate(conn)
         conn.commit()
-        conn.close()
 
         return redirect(url_for('manage_classes'))
     
-    cursor.execute("SELECT * FROM Class WHERE id = ?",(class_id,))
-    class_ = cursor.fetchone()
-
-    cursor.execute("SELECT * FROM Department")
-    departments = cursor.fetchall()
+    ref = refdata.get(conn)
+    class_ = ref.class_.get(class_id)
+    departments = ref.departments
 
-    conn.close()
 
     return render_template('edit_class.html',class_ = class_ , departments = departments)
 
 @app.route('/delete_class/<int:class_id>', methods=['GET', 'POST'])
 @admin_required
 def delete_class(class_id):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute("DELETE FROM Class WHERE id = ?", (class_id,))
+    refdata.invalidate(conn)
     conn.commit()
-    conn.close()
     return redirect(url_for('manage_classes'))  
 # --------------------------------------------------------------------------------------------------------------------
 # ----------------------------------------------------student---------------------------------------------------------
 UPLOAD_FOLDER = "uploads"
-ALLOWED_EXTENSIONS = {'xlsx'}
+ALLOWED_EXTENSIONS = {'xlsx', 'csv'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
-def add_students_from_excel(filepath):
-    df = pd.read_excel(filepath)  # Read Excel file
-
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    for _, row in df.iterrows():
-        name = row['Name']
-        email = row['Email']
-        password = bcrypt.generate_password_hash(str(row['Password'])).decode('utf-8')  # Hash password
-        roll_number = row['Roll Number']  # New field
-        class_name = row['Class Name']
-        department_name = row['Department Name']
-        # class_id = row['Class ID']
-
-        # Find class_id from Class table by Class Name
-        cursor.execute("SELECT id FROM Department WHERE name = ?", (department_name,))
-        department_id = cursor.fetchone()[0]
-        # print(department_id)
-        # print(class_name)
-        cursor.execute("SELECT id FROM Class WHERE name = ? and department_id = ?", (class_name, department_id))
-        class_id = cursor.fetchone()[0]
-        print(class_id)
-
-        # Insert into users table
-        cursor.execute("INSERT INTO users (email, password, role) VALUES (?, ?, 'student')", 
-                       (email, password))
-        user_id = cursor.lastrowid  # Get newly created user ID
-
-        # Insert into Student table
-        cursor.execute("INSERT INTO Student (user_id, name, roll_number, class_id, email, password) VALUES (?, ?, ?, ?, ?, ?)", 
-                       (user_id, name, roll_number, class_id, email, password))
-
-    conn.commit()
-    conn.close()
+def add_students_from_excel(filepath, error_path=None, progress=None):
+    # prefetch / validate / parallel hash / one-transaction insert, see student_import.py
+    return student_import.import_students(
+        get_db(), filepath, error_path=error_path, progress=progress,
+        rounds=app.config.get('BCRYPT_LOG_ROUNDS', 12),
+        workers=app.config.get('IMPORT_HASH_WORKERS'),
+    )
 
 
 # Ensure upload folder exists
@@ -516,34 +535,25 @@ def upload_students():
             return "No selected file", 400
         
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+            filename = f"{uuid.uuid4().hex}_{secure_filename(file.filename)}"
+            filepath = os.path.abspath(os.path.join(app.config['UPLOAD_FOLDER'], filename))
             file.save(filepath)
             
-            # Process the Excel file
-            add_students_from_excel(filepath)
+            # Process the Excel file in the background
+            job_id = jobs.enqueue(get_db(), 'import_students', {'filepath': filepath}, created_by=session['user_id'])
             
-            return redirect(url_for('manage_students'))
+            return f"Student upload queued (job {job_id}). <a href='{url_for('job_status', job_id=job_id)}'>Check progress</a> <a href='{url_for('manage_students')}'>Manage Students</a>"
     
     return render_template('upload_students.html')
 
 @app.route('/manage_students')
 @teacher_or_admin_required
 def manage_students():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    conn = get_db()
+    ref = refdata.get(conn)
+    schools, departments, classes = ref.schools, ref.departments, ref.classes
 
-    cursor.execute("SELECT * FROM School")
-    schools = cursor.fetchall()
-
-    cursor.execute("SELECT * FROM Department")
-    departments = cursor.fetchall()
-
-    cursor.execute("SELECT  * FROM Class")
-    classes = cursor.fetchall()
-
-    # Build the query for filtering students
-    query = "SELECT Student.id, Student.name, Student.email, Class.name FROM Student JOIN Class ON Student.class_id = Class.id JOIN Department ON Class.department_id = Department.id"
+    # Build the filters; the listing itself is paged by id (or roll number), see pagination.py
     filters = []
     params = []
 
@@ -562,14 +572,23 @@ def manage_students():
         filters.append("Student.class_id = ?")
         params.append(class_id)
 
-    if filters:
-        query += " WHERE " + " AND ".join(filters)
-
-    cursor.execute(query, params)
-    students = cursor.fetchall()
-    conn.close()
-
-    return render_template('manage_students.html', students=students, schools=schools, departments=departments, classes=classes)
+    keys = [('Student.roll_number', 4)] if request.args.get('sort') == 'roll_number' else [('Student.id', 0)]
+    try:
+        page = pagination.fetch(
+            conn, "Student.id, Student.name, Student.email, Class.name, Student.roll_number",
+            "FROM Student JOIN Class ON Student.class_id = Class.id JOIN Department ON Class.department_id = Department.id",
+            keys, filters, params, after=request.args.get('after'), limit=pagination.per_page(request.args),
+        )
+    except ValueError as e:
+        return str(e), 400
+    students = page.rows
+
+    if wants_json():
+        return jsonify(
+            students=[{'id': s[0], 'name': s[1], 'email': s[2], 'class': s[3], 'roll_number': s[4]} for s in students],
+            total=page.total, next=page.next,
+        )
+    return render_template('manage_students.html', students=students, schools=schools, departments=departments, classes=classes, page=page, pager=page_urls(page))
 
 
     # cursor.execute('''
@@ -585,7 +604,7 @@ def manage_students():
 @app.route('/edit_student/<int:student_id>', methods=['GET', 'POST'])
 @teacher_or_admin_required
 def edit_student(student_id):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
 
     if request.method == 'POST':
@@ -594,30 +613,27 @@ def edit_student(student_id):
         new_class_id = request.form['class_id']
         cursor.execute("UPDATE Student SET name = ?, class_id = ? WHERE id = ?", (new_name, new_class_id, student_id))
         cursor.execute("UPDATE users SET email = ? WHERE id = ?", (new_email, student_id))
-        cursor.execute("UPDATE users SET name = ?, email = ?, clss_id = ? WHERE id = ?", (new_name, new_email, new_class_id, student_id))
+        user_cache.invalidate(conn, student_id)
         conn.commit()
-        conn.close()
 
         return redirect(url_for('manage_students'))
     cursor.execute("SELECT * FROM users WHERE id = ?", (student_id,))
     student = cursor.fetchone()
 
-    cursor.execute("SELECT * FROM Class")
-    classes = cursor.fetchall()
+    classes = refdata.get(conn).classes
 
-    conn.close()
 
     return render_template('edit_student.html', student=student, classes=classes)
 
 @app.route('/delete_student/<int:student_id>', methods=['GET', 'POST'])
 @admin_required
 def delete_student(student_id):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute("DELETE FROM student WHERE user_id = ?", (student_id,))
     cursor.execute("DELETE FROM users WHERE id = ?", (student_id,))
+    user_cache.invalidate(conn, student_id)
     conn.commit()
-    conn.close()
 
     return redirect(url_for('manage_students'))
 # --------------------------------------------------------------------------------------------------------------------
@@ -631,7 +647,7 @@ def add_teacher():
         subject = request.form['subject']
         password = bcrypt.generate_password_hash(request.form['password']).decode('utf-8')
 
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         cursor = conn.cursor()
 
         # Insert into users table
@@ -640,9 +656,9 @@ def add_teacher():
 
         # Insert into Teacher table
         cursor.execute("INSERT INTO Teacher (user_id, name, email, subject, password) VALUES (?, ?, ?, ?, ?)", (user_id, name, email, subject, password))
+        refdata.invalidate(conn)
 
         conn.commit()
-        conn.close()
 
         return redirect(url_for('manage_teachers'))
 
@@ -651,22 +667,26 @@ def add_teacher():
 @app.route('/manage_teachers')
 @admin_required
 def manage_teachers():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT users.id, Teacher.name, users.email FROM users
-        JOIN Teacher ON users.id = Teacher.user_id
-        WHERE users.role = 'teacher'
-    ''')
-    teachers = cursor.fetchall()
-    conn.close()
+    conn = get_db()
+    try:
+        page = pagination.fetch(
+            conn, "users.id, Teacher.name, users.email",
+            "FROM users JOIN Teacher ON users.id = Teacher.user_id",
+            [('users.id', 0)], ["users.role = 'teacher'"],
+            after=request.args.get('after'), limit=pagination.per_page(request.args),
+        )
+    except ValueError as e:
+        return str(e), 400
+    teachers = page.rows
 
-    return render_template('manage_teachers.html', teachers=teachers)
+    if wants_json():
+        return jsonify(teachers=[{'id': t[0], 'name': t[1], 'email': t[2]} for t in teachers], total=page.total, next=page.next)
+    return render_template('manage_teachers.html', teachers=teachers, page=page, pager=page_urls(page))
 
 @app.route('/edit_teacher/<int:teacher_id>', methods=['GET', 'POST'])
 @admin_required
 def edit_teacher(teacher_id):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
 
     if request.method == 'POST':
@@ -675,26 +695,27 @@ def edit_teacher(teacher_id):
         new_subject = request.form['subject']
         cursor.execute("UPDATE users SET email = ? WHERE id = ?", (new_email, teacher_id))
         cursor.execute("UPDATE Teacher SET name = ? WHERE user_id = ?", (new_name, teacher_id))
+        user_cache.invalidate(conn, teacher_id)
+        refdata.invalidate(conn)
         conn.commit()
-        conn.close()
 
         return redirect(url_for('manage_teachers'))
 
     cursor.execute("SELECT users.id, Teacher.name, users.email , Teacher.subject FROM users JOIN Teacher ON users.id = Teacher.user_id WHERE users.id = ?", (teacher_id,))
     teacher = cursor.fetchone()
-    conn.close()
 
     return render_template('edit_teacher.html', teacher=teacher)
 
 @app.route('/delete_teacher/<int:teacher_id>', methods=['GET', 'POST'])
 @admin_required
 def delete_teacher(teacher_id):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute("DELETE FROM Teacher WHERE user_id = ?", (teacher_id,))
     cursor.execute("DELETE FROM users WHERE id = ?", (teacher_id,))
+    user_cache.invalidate(conn, teacher_id)
+    refdata.invalidate(conn)
     conn.commit()
-    conn.close()
 
     return redirect(url_for('manage_teachers'))
 # --------------------------------------------------------------------------------------------------------------------
@@ -702,53 +723,74 @@ def delete_teacher(teacher_id):
 @app.route('/mark_attendance', methods=['GET', 'POST'])
 @teacher_required
 def mark_attendance():
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
 
     teacher_id = session['user_id']
 
+    rejected = []
     if request.method == 'POST':
         class_id = request.form['class_id']
         date = request.form['date']
-
-        # Get the list of student IDs in the selected class
-        cursor.execute("SELECT id FROM Student WHERE class_id = ?", (class_id,))
-        student_ids = [row[0] for row in cursor.fetchall()]
-
-        # Iterate over all student IDs and check if they are present or absent
-        for student_id in student_ids:
-            status = 'Present' if str(student_id) in request.form else 'Absent'
-            cursor.execute("INSERT INTO Attendance (student_id, date, status) VALUES (?, ?, ?)", 
-                           (student_id, date, status))
-        
-        conn.commit()
-        conn.close()
-        return redirect(url_for('teacher_dashboard', teacher_id = teacher_id))
+        if not refdata.get(conn).teaches(teacher_id, class_id):
+            return "Access Denied", 403
+
+        # Every student of the class, Present if ticked on the form; one upsert batch, see attendance.py
+        entries = attendance.roster_entries(attendance.roster(conn, class_id), date, request.form.keys())
+        results = attendance.mark(conn, class_id, entries, marked_by=teacher_id)
+        if any(result['result'] != 'rejected' for result in results):
+            heatmaps.schedule(conn, 'class', class_id)
+        rejected = [result for result in results if result['result'] == 'rejected']
+        if not rejected:
+            return redirect(url_for('teacher_dashboard', teacher_id = teacher_id))
     
-    cursor.execute('''SELECT Class.id, Class.name 
-    FROM Class 
-    JOIN TeacherClassSubject ON Class.id = TeacherClassSubject.class_id 
-    WHERE TeacherClassSubject.teacher_id = ?
-    ''', (teacher_id,))
-    print(teacher_id)
-    classes = cursor.fetchall()
-    print(classes)
-
-    selected_class_id = request.args.get('class_id')
-    selected_date = request.args.get('date')
+    classes = refdata.get(conn).classes_for_teacher(teacher_id)
+
+    selected_class_id = request.values.get('class_id')
+    selected_date = request.values.get('date')
     students = []
-    if selected_class_id:
+    if selected_class_id and refdata.get(conn).teaches(teacher_id, selected_class_id):
         cursor.execute("SELECT id, name, roll_number FROM Student WHERE class_id = ?", (selected_class_id,))
         students = cursor.fetchall()
 
-    conn.close()
+    # the form comes back with the entries attendance.mark() refused, the rest are saved
+    names = {student[0]: f"{student[2]} - {student[1]}" for student in students}
+    rejected = [(names.get(result['student_id'], result['student_id']), result['error']) for result in rejected]
+    return render_template('mark_attendance.html', classes=classes, students=students, selected_class_id=selected_class_id, selected_date=selected_date,teacher_id = teacher_id,
+                           rejected=rejected), 400 if rejected else 200
 
-    return render_template('mark_attendance.html', classes=classes, students=students, selected_class_id=selected_class_id, selected_date=selected_date,teacher_id = teacher_id)
+@app.route('/api/attendance/mark', methods=['POST'])
+@teacher_required
+def mark_attendance_batch():
+    # JSON batch marking: {"class_id": 1, "days": [{"date": "2025-01-10", "present": [3, 4]}, ...],
+    #                      "records": [{"student_id": 3, "date": "2025-01-10", "status": "Absent"}, ...]}
+    # "days" marks the whole roster for each date, "records" sets individual entries.
+    data = request.get_json(silent=True) or {}
+    class_id = data.get('class_id')
+    conn = get_db()
+    if not refdata.get(conn).teaches(session['user_id'], class_id):
+        return jsonify(error="class not assigned to this teacher"), 403
+
+    entries = []
+    student_ids = attendance.roster(conn, class_id)
+    for day in data.get('days', []):
+        entries += attendance.roster_entries(student_ids, day.get('date'), day.get('present', []))
+    for record in data.get('records', []):
+        entries.append((record.get('student_id'), record.get('date'), record.get('status')))
+    if not entries:
+        return jsonify(error="nothing to mark"), 400
+
+    results = attendance.mark(conn, class_id, entries, marked_by=session['user_id'])
+    heatmaps.schedule(conn, 'class', class_id)
+    counts = {}
+    for result in results:
+        counts[result['result']] = counts.get(result['result'], 0) + 1
+    return jsonify(class_id=class_id, counts=counts, results=results)
 
 @app.route('/view_attendance', methods=['GET', 'POST'])
 @login_required
 def view_attendance():
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
 
     teacher_id = session['user_id']
@@ -757,9 +799,10 @@ def view_attendance():
         if request.method == 'POST':
             class_id = request.form['class_id']
             date = request.form['date']
-            cursor.execute('''
+            # a date before the archive cutoff is read from the archive, see archive.py
+            cursor.execute(f'''
             SELECT Student.roll_number, Student.name, Attendance.status 
-            FROM Attendance 
+            FROM {archive.attendance(conn, date, date)} 
             JOIN Student ON Attendance.student_id = Student.id 
             WHERE Student.class_id = ? AND Attendance.date = ?''', (class_id, date))
 
@@ -767,30 +810,28 @@ def view_attendance():
         else:
             attendance_records = []
 
-        cursor.execute('''
-        SELECT Class.id, Class.name 
-        FROM Class 
-        JOIN TeacherClassSubject ON Class.id = TeacherClassSubject.class_id 
-        WHERE TeacherClassSubject.teacher_id = ?
-        ''', (teacher_id,))
-        print(teacher_id)
-        classes = cursor.fetchall()
-        print(classes)
-
-        conn.close()
+        classes = refdata.get(conn).classes_for_teacher(teacher_id)
+
         return render_template('view_attendance_teacher.html', attendance_records=attendance_records, classes=classes,teacher_id = teacher_id)
     elif current_user.role == 'student':
-        cursor.execute('''SELECT Teacher.subject, Attendance.date, Attendance.status FROM Attendance 
+        cursor.execute(f'''SELECT Teacher.subject, Attendance.date, Attendance.status FROM {archive.attendance(conn)} 
         JOIN Student ON Attendance.student_id = Student.id 
         JOIN TeacherClassSubject ON Student.class_id = TeacherClassSubject.class_id 
-        JOIN Teacher ON TeacherClassSubject.teacher_id = Teacher.user_id WHERE Attendance.student_id = ?''', (current_user.id,))
+        JOIN Teacher ON TeacherClassSubject.teacher_id = Teacher.user_id WHERE Attendance.student_id = ?
+        ORDER BY Attendance.date''', (current_user.id,))
         attendance_records = cursor.fetchall()
 
-        conn.close()
         return render_template('view_attendance_student.html', attendance_records=attendance_records)
     
     return "Access Denied!!", 403
 
+def query_attendance_report(conn, teacher_id, class_id, start_date, end_date):
+    # (roll, name, date, status) by date, unpacked from the per-month bitmasks, see attendance_bits.py;
+    # raises ValueError for a bad date range
+    if not refdata.get(conn).teaches(teacher_id, class_id):
+        return iter(())
+    return attendance_bits.class_report(conn, class_id, start_date, end_date)
+
 @app.route('/download_attendance', methods=['POST'])
 @teacher_required
 def download_attendance():
@@ -798,57 +839,161 @@ def download_attendance():
     start_date = request.form['start_date']
     end_date = request.form['end_date']
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
     teacher_id = session['user_id']
 
-    cursor.execute('''
-    SELECT Student.roll_number, Student.name, Attendance.date, Attendance.status 
-    FROM Attendance 
-    JOIN Student ON Student.id = Attendance.student_id 
-    JOIN TeacherClassSubject ON Student.class_id = TeacherClassSubject.class_id 
-    WHERE TeacherClassSubject.teacher_id = ? AND Student.class_id = ? AND Attendance.date BETWEEN ? AND ? 
-    ORDER BY Attendance.date''', (teacher_id,class_id, start_date, end_date))
-    attendance_records = cursor.fetchall()
-    conn.close()
-
-    # Create csv file 
-    output = []
-    output.append(['Roll Number', 'Student Name', 'Date', 'Status'])
-
-    for record in attendance_records:
-        output.append([record[0], record[1], record[2], record[3]])
-
-    response = Response('\n'.join([','.join(map(str, row)) for row in output]), mimetype="text/csv")
-    response.headers["Content-Disposition"] = "attachment; filename=attendance_report.csv"
-    return response
+    # large date ranges can be built in the background and downloaded from the job
+    if request.form.get('background'):
+        job_id = jobs.enqueue(get_db(), 'attendance_report',
+                              {'teacher_id': teacher_id, 'class_id': class_id, 'start_date': start_date, 'end_date': end_date},
+                              created_by=teacher_id)
+        return jsonify(job_id=job_id, status_url=url_for('job_status', job_id=job_id))
+
+    try:
+        rows = query_attendance_report(get_db(), teacher_id, class_id, start_date, end_date)
+        rows = itertools.chain([next(rows)], rows)  # validates the dates before the response starts
+    except StopIteration:
+        rows = iter(())
+    except ValueError:
+        return "Invalid date range", 400
+
+    # streamed as the rows are produced, see csv_export.py
+    return csv_export.csv_response(['Roll Number', 'Student Name', 'Date', 'Status'], rows, "attendance_report.csv")
 # --------------------------------------------------------------------------------------------------------------------
 # --------------------------------------------------attendance_Analysis-----------------------------------------------
 @app.route('/attendance_summary/<int:class_id>')
 # @teacher_or_admin_required
 def attendance_summary(class_id):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute('''SELECT Student.name, SUM(CASE WHEN Attendance.status = 'Present' THEN 1 ELSE 0 END) AS present_days, COUNT(Attendance.id) AS total_days FROM Attendance JOIN Student ON Attendance.student_id = Student.id WHERE Student.class_id = ? GROUP BY Student.id''', (class_id,))
-
-    data = cursor.fetchall()
-    conn.close()
+    # ?start=&end=: percentages and absence streaks for a date range from the bitmasks (attendance_bits.py);
+    # otherwise the whole history from the trigger-maintained aggregate (attendance_stats.py)
+    start, end = request.args.get('start'), request.args.get('end')
+    if start or end:
+        # the range branch is teachers (of this class) and admins only
+        if 'user_id' not in session or session.get('role') not in ['teacher', 'admin']:
+            return "Access Denied: Teachers or Admins Only", 403
+        if session.get('role') == 'teacher' and not refdata.get(get_db()).teaches(session['user_id'], class_id):
+            return jsonify(error="class not assigned to this teacher"), 403
+        try:
+            return jsonify(attendance_bits.class_range_summary(get_db(), class_id, start, end))
+        except ValueError:
+            return jsonify(error="start and end must be YYYY-MM-DD dates, start <= end"), 400
+    return jsonify(attendance_stats.class_summary(get_db(), class_id))
+
+@app.route('/attendance_summary/<int:class_id>/monthly')
+@teacher_or_admin_required
+def attendance_summary_monthly(class_id):
+    conn = get_db()
+    if session.get('role') == 'teacher' and not refdata.get(conn).teaches(session['user_id'], class_id):
+        return jsonify(error="class not assigned to this teacher"), 403
+    return jsonify(attendance_stats.class_monthly(conn, class_id))
 
-    result = []
-    for row in data:
-        name, present_days, total_days = row
-        attendance_percentage = (present_days / total_days * 100) if total_days > 0 else 0
-        result.append({'name': name, 'attendance_percentage': round(attendance_percentage, 2)})
+@app.route('/attendance_analytics/<int:class_id>')
+@teacher_or_admin_required
+def attendance_analytics_view(class_id):
+    # rolling rates, absence streaks, weekday and per-subject breakdowns (attendance_analytics.py);
+    # ?threshold= sets the at-risk cut-off in percent
+    conn = get_db()
+    if session.get('role') == 'teacher' and not refdata.get(conn).teaches(session['user_id'], class_id):
+        return jsonify(error="class not assigned to this teacher"), 403
+    try:
+        threshold = float(request.args.get('threshold', attendance_analytics.AT_RISK_THRESHOLD))
+    except ValueError:
+        return jsonify(error="threshold must be a number"), 400
+    analysis = attendance_analytics.class_analytics(conn, class_id)
+    return jsonify(dict(analysis, threshold=threshold, at_risk=attendance_analytics.at_risk(analysis, threshold)))
+
+@app.cli.command('analyze-attendance')
+@click.option('--threshold', type=float, default=attendance_analytics.AT_RISK_THRESHOLD, show_default=True)
+def analyze_attendance_command(threshold):
+    """List at-risk students of every class."""
+    for class_id, analysis in attendance_analytics.institution(db.connection(DB_PATH)):
+        flagged = attendance_analytics.at_risk(analysis, threshold)
+        click.echo(f"class {class_id}: {len(analysis['students'])} students, {len(flagged)} at risk")
+        for student in flagged:
+            click.echo(f"  {student['roll_number']} {student['name']}: {student['attendance_percentage']}% overall, "
+                       f"{student['rate_30d']}% last 30 days, absent {student['current_absence_streak']} in a row")
+
+@app.route('/heatmap/<any(class, student):target>/<int:target_id>.<any(png, json):fmt>')
+@login_required
+def heatmap(target, target_id, fmt):
+    # served from the file rendered for the current attendance version, never rendered here;
+    # 202 while the background job writes it. revalidation (If-None-Match) costs one version check.
+    conn = get_db()
+    class_id = heatmaps.class_of(conn, target, target_id)
+    if class_id is None:
+        return "Not found", 404
+    role = session.get('role')
+    if role == 'teacher':
+        allowed = refdata.get(conn).teaches(session['user_id'], class_id)
+    elif role == 'student':
+        allowed = target == 'student' and conn.execute(
+            "SELECT 1 FROM Student WHERE id = ? AND user_id = ?", (target_id, session['user_id'])
+        ).fetchone() is not None
+    else:
+        allowed = role == 'admin'
+    if not allowed:
+        return "Access Denied", 403
+
+    cached = heatmaps.cached(conn, class_id, target, target_id, fmt)
+    if cached is None:
+        heatmaps.schedule(conn, target, target_id)
+        return jsonify(status='rendering'), 202, {'Retry-After': '2'}
+    path, etag = cached
+    response = send_file(path, mimetype=heatmaps.FORMATS[fmt], etag=etag, conditional=True, max_age=0)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
 
-    return jsonify(result)
+@app.cli.command('rebuild-attendance-aggregates')
+def rebuild_attendance_aggregates_command():
+    """Recompute the attendance aggregate tables from Attendance."""
+    attendance_stats.rebuild(db.connection(DB_PATH))
+    attendance_bits.rebuild(db.connection(DB_PATH))
+    click.echo("attendance aggregates rebuilt")
+
+@app.cli.command('check-attendance-aggregates')
+def check_attendance_aggregates_command():
+    """Compare the attendance aggregates against a full recompute."""
+    mismatches = attendance_stats.check(db.connection(DB_PATH)) + attendance_bits.check(db.connection(DB_PATH))
+    for table, key, stored, expected in mismatches:
+        click.echo(f"{table} {key}: stored={stored} expected={expected}")
+    click.echo(f"{len(mismatches)} mismatches")
+    if mismatches:
+        raise SystemExit(1)
+
+@app.cli.command('archive-attendance')
+@click.option('--before', help='Archive the terms that ended before this date (YYYY-MM-DD). '
+                               'Default: ARCHIVE_AFTER_DAYS ago, rounded down to the start of its term.')
+def archive_attendance_command(before):
+    """Move old attendance and IA results to the archive database and vacuum."""
+    try:
+        before = archive.term_start(before) if before else archive.default_cutoff()
+    except ValueError:
+        raise click.BadParameter("expected YYYY-MM-DD", param_hint='--before')
+    result = archive.run(db.connection(DB_PATH), before)
+    click.echo(f"archived before {result['cutoff']}: {result['attendance_rows']} attendance rows, "
+               f"{result['result_rows']} IA results")
+    click.echo(f"hot database {result['hot_bytes_before'] / 2**20:.1f} MB -> {result['hot_bytes'] / 2**20:.1f} MB, "
+               f"archive {result['archive_bytes'] / 2**20:.1f} MB")
+
+@app.cli.command('import-questions')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--difficulty', type=click.Choice(question_import.DIFFICULTIES), help="For sheets without a difficulty column.")
+@click.option('--subject', help="For sheets without a subject column.")
+@click.option('--errors', 'error_path', type=click.Path(dir_okay=False), help="Write rejected rows to this CSV.")
+def import_questions_command(path, difficulty, subject, error_path):
+    """Import questions from an xlsx or CSV file into the question bank."""
+    summary = question_import.import_questions(
+        db.connection(DB_PATH), path, error_path=error_path, default_difficulty=difficulty, default_subject=subject,
+    )
+    click.echo(", ".join(f"{key} {value}" for key, value in summary.items() if key != 'error_file'))
+    if summary['error_file']:
+        click.echo(f"rejected rows written to {summary['error_file']}")
 
 # --------------------------------------------------------------------------------------------------------------------
 @app.route('/assign_teacher', methods=['GET', 'POST'])
 @admin_required
 def assign_teacher():
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
 
     if request.method == 'POST':
@@ -856,85 +1001,153 @@ def assign_teacher():
         class_id = request.form['class_id']
         cursor.execute("INSERT INTO TeacherClassSubject (teacher_id, class_id) VALUES (?, ?)", 
                        (teacher_id, class_id))
+        refdata.invalidate(conn)
         conn.commit()
-        conn.close()
         return redirect(url_for('admin_dashboard'))
 
-    cursor.execute("SELECT user_id, name FROM Teacher")
-    teachers = cursor.fetchall()
-
-    cursor.execute("SELECT id, name FROM Class")
-    classes = cursor.fetchall()
+    ref = refdata.get(conn)
+    teachers = [(row[0], row[1]) for row in ref.teachers]
+    classes = [(row[0], row[1]) for row in ref.classes]
 
-    conn.close()
 
     return render_template('assign_teacher_to_class.html', teachers=teachers, classes=classes)
 
-test_id = None
 # ---------------------------------------------------------------------------------------------------------------------
 # ---------------------------------------------IA taking---------------------------------------------------------------
+@app.route('/upload_questions', methods=['GET', 'POST'])
+@admin_required
+def upload_questions():
+    if request.method == 'POST':
+        file = request.files.get('file')
+        if file is None or file.filename == '':
+            return "No selected file", 400
+        if not allowed_file(file.filename):
+            return "Only .xlsx and .csv files are accepted", 400
+
+        filename = f"{uuid.uuid4().hex}_{secure_filename(file.filename)}"
+        filepath = os.path.abspath(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+        file.save(filepath)
+        payload = {
+            'filepath': filepath,
+            'difficulty': request.form.get('difficulty') or None,
+            'subject': request.form.get('subject', '').strip() or None,
+        }
+        job_id = jobs.enqueue(get_db(), 'import_questions', payload, created_by=session['user_id'])
+        return f"Question import queued (job {job_id}). <a href='{url_for('job_status', job_id=job_id)}'>Check progress</a> <a href='{url_for('admin_dashboard')}'>Admin Dashboard</a>"
+
+    return render_template('upload_questions.html', difficulties=question_import.DIFFICULTIES)
+
+@app.route("/questions/search")
+@teacher_required
+def search_questions():
+    # ranked keyword search over the question bank: ?q=&subject=&difficulty=&after=&per_page=
+    try:
+        page = question_search.search(
+            get_db(), request.args.get('q'), subject=request.args.get('subject'),
+            difficulty=request.args.get('difficulty'), after=request.args.get('after'),
+            limit=pagination.per_page(request.args),
+        )
+    except ValueError as e:
+        return str(e), 400
+    questions = [
+        {'qid': row[0], 'question': row[1], 'options': {'A': row[2], 'B': row[3], 'C': row[4], 'D': row[5]},
+         'subject': row[6], 'difficulty': row[7], 'score': row[8]}
+        for row in page.rows
+    ]
+    return jsonify(questions=questions, total=page.total, next=page.next)
+
+def paper_variants(form):
+    return max(1, min(form.get('variants', ia_papers.VARIANTS, type=int) or ia_papers.VARIANTS, 26))
+
 @app.route("/Create_IA/<int:teacher_id>", methods=["GET", "POST"])
 @teacher_required
 def Create_IA(teacher_id):
-    global test_id
+    # the IA being built is tracked in the teacher's session, not in a module global
+    test_id = session.get('ia_test_id')
     questions = []
     selected_questions = []
+    search_next = None
+    message = None
 
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
 
-    cursor.execute("Select Subject FROM Teacher WHERE user_id = ? ", (teacher_id,))
-    subjects = cursor.fetchall()
-
-    cursor.execute('''
-        SELECT Class.id, Class.name 
-        FROM Class 
-        JOIN TeacherClassSubject ON Class.id = TeacherClassSubject.class_id 
-        WHERE TeacherClassSubject.teacher_id = ?
-        ''',(teacher_id,))
-    classes = cursor.fetchall()
+    ref = refdata.get(conn)
+    teacher = ref.teacher.get(teacher_id)
+    subjects = [(teacher[2],)] if teacher else []
+    classes = ref.classes_for_teacher(teacher_id)
 
     subject = request.form.get("subject")
     class_id = request.form.get("class_id")
     difficulty = request.form.get("difficulty")
     test_name = request.form.get("test_name")
     ia_date = request.form.get("ia_date")
+    keywords = request.form.get("keywords", "").strip()
+    # empirical difficulty from graded IAs (question_stats.py): % answered correctly, and sort order
+    p_min = request.form.get("p_min", type=float)
+    p_max = request.form.get("p_max", type=float)
+    sort = request.form.get("sort")
+    question_stat = {}
     if request.method == "POST":
         if test_id is None:
             test_id = str(uuid.uuid4())
             cursor.execute("INSERT INTO tests (test_id, subject, test_name, teacher_id,class_id, ia_date) VALUES (?, ?, ?, ?, ?, ?)",
                            (test_id, subject, test_name, teacher_id , class_id,ia_date))
-            print("test_id")
             conn.commit()
+            session['ia_test_id'] = test_id
 
     if request.method == "POST":
         if "fetch_questions" in request.form:
-            print(difficulty,subject)
-            cursor.execute(
-                "SELECT qid, question FROM Question_Database WHERE difficulty = ? AND subject = ?",
-                (difficulty, subject))
-            questions = cursor.fetchall()
-            print(questions)
-            
+            if keywords:
+                # ranked FTS5 search within the subject/difficulty; further pages via search_questions
+                page = question_search.search(conn, keywords, subject=subject, difficulty=difficulty)
+                questions = [(row[0], row[1]) for row in page.rows]
+                search_next = page.next
+                question_stat = question_stats.lookup(conn, [qid for qid, _ in questions])
+            else:
+                rows = question_stats.browse(
+                    conn, subject, difficulty,
+                    p_min=p_min / 100 if p_min is not None else None, p_max=p_max / 100 if p_max is not None else None,
+                    sort=sort,
+                )
+                questions = [(qid, question) for qid, question, *_ in rows]
+                question_stat = {qid: stat for qid, _, *stat in rows}
+
 
         elif "save_questions" in request.form:
             selected_questions = request.form.getlist("selected_questions")
             for qid in selected_questions:
                 cursor.execute("SELECT ans FROM Question_Database WHERE qid = ?", (qid,))
                 answer = cursor.fetchone()
-                cursor.execute("INSERT INTO Test_Questions (test_id, qid, answer) VALUES (?, ?, ?)", (test_id, qid, answer[0]))
+                cursor.execute("INSERT OR IGNORE INTO Test_Questions (test_id, qid, answer) VALUES (?, ?, ?)", (test_id, qid, answer[0]))
+            ia_papers.generate(conn, test_id, paper_variants(request.form))
+            ia_session.invalidate(conn, test_id)
             conn.commit()
-            conn.close()
+
+        elif "generate_paper" in request.form:
+            # blueprint, e.g. 10 Easy + 10 Medium + 5 Hard from the chosen subject
+            counts = {d: request.form.get(f"count_{d}", type=int) or 0 for d in ia_papers.DIFFICULTIES}
+            try:
+                added = ia_papers.add_questions(conn, test_id, subject, counts)
+            except ValueError as e:
+                conn.rollback()
+                message = str(e)
+            else:
+                variants = ia_papers.generate(conn, test_id, paper_variants(request.form))
+                ia_session.invalidate(conn, test_id)
+                conn.commit()
+                message = f"Added {added} questions in {variants} paper variants."
 
         elif "link" in request.form:
+            session.pop('ia_test_id', None)
             return f"IA has been created Successfully!!!👍👍<a href='{url_for('teacher_dashboard', teacher_id=session['user_id'])}'>Teacher Dashboard</a>"
 
-    return render_template("Create_IA.html", questions=questions, subjects=subjects, difficulty=difficulty, test_name=test_name, test_id=test_id, classes=classes,ia_date = ia_date,teacher_id = teacher_id)
+    return render_template("Create_IA.html", questions=questions, subjects=subjects, difficulty=difficulty, test_name=test_name, test_id=test_id, classes=classes,ia_date = ia_date,teacher_id = teacher_id, keywords = keywords, search_next = search_next, message = message, variants = ia_papers.VARIANTS, question_stat = question_stat, p_min = p_min, p_max = p_max, sort = sort)
 
 @app.route("/available_IA/<int:student_id>", methods=["GET", "POST"])
 @student_required
 def available_IA(student_id):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
 
     # Fetch student details
@@ -952,159 +1165,224 @@ def available_IA(student_id):
     test_details = cursor.fetchall()
     # test_details contains tuples: (test_id, test_name, subject)
 
-    conn.close()
 
     return render_template("available_IA.html", 
                            name=student_detail[0], 
                            roll=student_detail[1], 
                            test_details=test_details)
 
-s = {}
 @app.route("/give_IA/<test_id>/<roll>", methods=["GET", "POST"])
 @student_required
 def give_IA(test_id, roll):
-    global s
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT roll , test_id FROM Test_Response")
-    given = cursor.fetchall()
-    markes = cursor.execute("SELECT markes FROM Student_Result WHERE roll = ? and test_id = ?", (roll, test_id)).fetchone()
-    for record in given:
-        if roll == record[0] and test_id == record[1] or markes is not None:
-            return f"You have already submitted your IA or IA has reached its deadline!!!<a href ='{url_for('student_dashboard', student_id=session['user_id'])}'>Student_Dashboard</a>"
+    conn = get_db()
+    if ia_session.has_submitted(conn, test_id, roll):
+        return f"You have already submitted your IA or IA has reached its deadline!!!<a href ='{url_for('student_dashboard', student_id=session['user_id'])}'>Student_Dashboard</a>"
 
-    questions = []
-
-    if test_id not in s.keys():
-        test_questions = cursor.execute("SELECT qid FROM Test_Questions WHERE test_id = ?", (test_id,)).fetchall()
-        for qid_tuple in test_questions:
-            qid = qid_tuple[0]  # Extract the qid value from the tuple
-            question = cursor.execute(
-                "SELECT qid, question, option_A, option_B, option_C, option_D FROM Question_Database WHERE qid = ?",
-                (qid,)
-            ).fetchone()
-            if question:
-                questions.append(dict(zip(["qid", "question", "option_A", "option_B", "option_C", "option_D"], question)))
-        random.shuffle(questions)
-        s[test_id] = questions
-    else:
-        questions = s[test_id]
+    # the student's precomputed variant, the same on every worker; see ia_papers.py
+    questions = ia_papers.paper_for_student(conn, test_id, roll)
 
     if request.method == "POST":
         if "submit" in request.form:
-            for question in questions:
-                answer = request.form.get(f"answer_{question['qid']}")
-                cursor.execute(
-                    "INSERT INTO Test_Response (roll, qid, answer, test_id) VALUES (?, ?, ?, ?)",
-                    (roll, question['qid'], answer, test_id)
-                )
-            conn.commit()
-            conn.close()
-            del s[test_id]
+            answers = submitted_answers(test_id, roll, questions)
+            if not ia_session.submit(conn, test_id, roll, answers):
+                return f"You have already submitted your IA or IA has reached its deadline!!!<a href ='{url_for('student_dashboard', student_id=session['user_id'])}'>Student_Dashboard</a>"
             return f"Test submitted successfully!🤦‍♂️🥳<a href ='{url_for('student_dashboard', student_id=session['user_id'])}'>Student_Dashboard</a>"
 
-    return render_template("give_IA.html", questions=questions, test_id=test_id, roll=roll, auto_submit_url=url_for('auto_submit_IA', test_id=test_id, roll=roll))
+    # answers autosaved before a reload or a dropped connection are ticked again
+    saved = ia_autosave.saved_answers(conn, test_id, roll)
+    saved = {str(q['qid']): ia_papers.displayed(q, saved.get(str(q['qid']))) for q in questions}
+    return render_template("give_IA.html", questions=questions, test_id=test_id, roll=roll, saved=saved,
+                           auto_submit_url=url_for('auto_submit_IA', test_id=test_id, roll=roll),
+                           autosave_url=url_for('autosave_IA', test_id=test_id, roll=roll))
+
+def submitted_answers(test_id, roll, questions):
+    # whatever is still in this worker's autosave buffer, overridden by the answers on the form
+    answers = ia_autosave.take(test_id, roll)
+    for qid, answer in ia_papers.canonical_answers(questions, request.form):
+        if answer is not None:
+            answers[str(qid)] = answer
+    return list(answers.items())
+
+@app.route("/autosave_IA/<test_id>/<roll>", methods=["POST"])
+@student_required
+def autosave_IA(test_id, roll):
+    # answer deltas while the test is open: {"answers": {"<qid>": "B", ...}} in the letters shown
+    conn = get_db()
+    if ia_session.has_submitted(conn, test_id, roll):
+        return jsonify(error="already submitted"), 409
+    paper = {str(q['qid']): q for q in ia_papers.paper_for_student(conn, test_id, roll)}
+    answers = []
+    for qid, shown in ((request.get_json(silent=True) or {}).get('answers') or {}).items():
+        question = paper.get(str(qid))
+        if question is None or shown not in ia_papers.OPTION_LETTERS:
+            return jsonify(error=f"invalid answer for question {qid}"), 400
+        answers.append((question['qid'], ia_papers.canonical(question, shown)))
+    ia_autosave.record(test_id, roll, answers)
+    return jsonify(saved=len(answers))
 
 @app.route("/auto_submit_IA/<test_id>/<roll>", methods=["POST"])
 @student_required
 def auto_submit_IA(test_id, roll):
-    global s
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    conn = get_db()
 
-    if test_id in s:
-        questions = s[test_id]
-        for question in questions:
-            answer = request.form.get(f"answer_{question['qid']}", None)  # Default to None if no answer
-            cursor.execute(
-                "INSERT INTO Test_Response (roll, qid, answer, test_id) VALUES (?, ?, ?, ?)",
-                (roll, question['qid'], answer, test_id)
-            )
-        conn.commit()
-        conn.close()
-        del s[test_id]
-        return "Test auto-submitted due to screen focus loss! <a href='{url_for('student_dashboard', student_id=session['user_id'])}'>Student Dashboard</a>"
+    questions = ia_papers.paper_for_student(conn, test_id, roll)
+    if questions and not ia_session.has_submitted(conn, test_id, roll):
+        answers = submitted_answers(test_id, roll, questions)
+        if ia_session.submit(conn, test_id, roll, answers):
+            return "Test auto-submitted due to screen focus loss! <a href='{url_for('student_dashboard', student_id=session['user_id'])}'>Student Dashboard</a>"
 
     return "Error: Test not found or already submitted."
 
+@app.route("/IA/<test_id>/variants")
+@teacher_required
+def IA_variants(test_id):
+    # question order and answer key of every variant, for printed papers and checking
+    conn = get_db()
+    test = conn.execute("SELECT teacher_id FROM Tests WHERE test_id = ?", (test_id,)).fetchone()
+    if test is None or str(test[0]) != str(session['user_id']):
+        return "Test not found", 404
+    variants = [
+        {'variant': i, 'qids': [qid for qid, _ in layout], 'options': [perm for _, perm in layout], 'answer_key': key}
+        for i, (layout, key) in enumerate(ia_papers.load_variants(conn, test_id))
+    ]
+    return jsonify(test_id=test_id, variants=variants)
+
 @app.route("/list_IA/<int:teacher_id>", methods = ['GET','POST'])
 @teacher_required
 def list_IA(teacher_id):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT test_name, class_id, ia_date ,test_id FROM Tests WHERE teacher_id = ?" , (teacher_id, ))
-    ia_list = cursor.fetchall()
-    conn.close()
-
-    return render_template("list_IA.html",test_id = test_id , teacher_id = teacher_id , ia_list = ia_list)
+    conn = get_db()
+    # newest IA first; (ia_date, test_id) is unique, so the order is stable across pages
+    try:
+        page = pagination.fetch(
+            conn, "test_name, class_id, ia_date, test_id", "FROM Tests",
+            [('ia_date', 2), ('test_id', 3)], ["teacher_id = ?"], [teacher_id],
+            after=request.args.get('after'), limit=pagination.per_page(request.args), descending=True,
+        )
+    except ValueError as e:
+        return str(e), 400
+    ia_list = page.rows
+
+    if wants_json():
+        return jsonify(
+            tests=[{'test_name': t[0], 'class_id': t[1], 'ia_date': t[2], 'test_id': t[3]} for t in ia_list],
+            total=page.total, next=page.next,
+        )
+    return render_template("list_IA.html", teacher_id = teacher_id , ia_list = ia_list, page = page, pager = page_urls(page))
 
 @app.route("/download_IA_Result/<test_id>" , methods = ['GET','POST'])
 @teacher_required
 def download_IA_Result(test_id):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
-    cursor.execute("SELECT Student_result.roll , Class.name , Student_result.markes , Student_result.total_markes FROM Student_result Join Class on Student_result.class_id = Class.id WHERE test_id = ? ",(test_id, ))
-    IA_Result = cursor.fetchall()
+    cursor.execute(f"SELECT Student_result.roll , Class.name , Student_result.markes , Student_result.total_markes FROM {archive.results(conn)} Join Class on Student_result.class_id = Class.id WHERE test_id = ? ",(test_id, ))
 
-    output = []
-    output.append(['Roll Number', 'Class Name', 'Obtained Marks', 'Total Marks'])
-
-    for record in IA_Result:
-        output.append([record[0], record[1], record[2], record[3]])
-
-    response = Response('\n'.join([','.join(map(str, row)) for row in output]), mimetype="text/csv")
-    response.headers["Content-Disposition"] = "attachment; filename=IA_Result.csv"
-    return response
+    return csv_export.csv_response(['Roll Number', 'Class Name', 'Obtained Marks', 'Total Marks'], cursor, "IA_Result.csv")
 
 @app.route("/close_IA/<test_id>", methods=['GET', 'POST'])
 @teacher_required
 def close_IA(test_id):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    # Fetch class_id as a single value
-    cursor.execute("SELECT class_id FROM Tests WHERE test_id = ?", (test_id,))
-    class_id_tuple = cursor.fetchall()
-    if class_id_tuple is None:
-        conn.close()
+    conn = get_db()
+    if conn.execute("SELECT 1 FROM Tests WHERE test_id = ?", (test_id,)).fetchone() is None:
         return "Error: Test not found", 404
-    for class_id in class_id_tuple: # Extract the value from the tuple
-
-        # Fetch roll numbers of students in the class
-        cursor.execute("SELECT roll_number FROM Student WHERE class_id = ?", (class_id[0],))
-        rolls = cursor.fetchall()
-
-        # Fetch roll numbers of students who have given the IA
-        cursor.execute("SELECT roll FROM Test_Response WHERE test_id = ?", (test_id,))
-        ia_given_rolls = cursor.fetchall()
-
-        for roll_tuple in rolls:
-            roll = roll_tuple[0]  # Extract the roll number from the tuple
-            markes = 0
-            total_markes = cursor.execute("SELECT count(qid) FROM Test_Questions WHERE test_id = ?", (test_id,)).fetchone()[0]
-            if roll in [r[0] for r in ia_given_rolls]:  # Compare roll numbers
-                qids = cursor.execute("SELECT qid FROM Test_Questions WHERE test_id = ?", (test_id,)).fetchall()
-                for qid_tuple in qids:
-                    qid = qid_tuple[0]  # Extract the qid value
-                    answer = cursor.execute(
-                        "SELECT answer FROM Test_Questions WHERE test_id = ? AND qid = ?", (test_id, qid)
-                    ).fetchone()
-                    response_ans = cursor.execute(
-                        "SELECT answer FROM Test_Response WHERE roll = ? AND qid = ? AND test_id = ?", (roll, qid, test_id)
-                    ).fetchone()
-                    if response_ans == answer:
-                        markes += 1
-            cursor.execute(
-                "INSERT INTO Student_Result (roll, class_id, test_id, markes, total_markes) VALUES (?, ?, ?, ?, ?)",
-                (roll, class_id[0], test_id, markes, total_markes,)
-            )
-            conn.commit()
 
-    cursor.execute("DELETE FROM Test_Response WHERE test_id = ?",(test_id,))
-    cursor.execute("DELETE FROM Test_Questions WHERE test_id = ?",(test_id,))
+    # grading runs in the background; closing the same IA twice returns the job already in flight
+    job_id = jobs.enqueue(conn, 'close_ia', {'test_id': test_id}, created_by=session['user_id'], dedupe_key=f"close_ia:{test_id}")
+    return f"Closing IA, results are being generated (job {job_id}). <a href='{url_for('job_status', job_id=job_id)}'>Check progress</a> <a href='{url_for('teacher_dashboard', teacher_id=session['user_id'])}'>Teacher Dashboard</a>"
+
+# ---------------------------------------------------------------------------------------------------------------------
+# ---------------------------------------------background jobs---------------------------------------------------------
+@jobs.handler('close_ia')
+def close_ia_job(job):
+    conn = get_db()
+    test_id = job.payload['test_id']
+
+    # a retry after a crash must not grade twice
+    already_graded = conn.execute(f"SELECT 1 FROM {archive.results(conn)} WHERE test_id = ? LIMIT 1", (test_id,)).fetchone()
+    graded = None
+    if already_graded is None:
+        graded = grading.grade_test(conn, test_id)
+        if graded is None:
+            raise LookupError(f"test {test_id} not found")
+    ia_session.invalidate(conn, test_id)
     conn.commit()
-    conn.close()
-    return f"Test Closed. Result Generated successfully! 🤦‍♂️🥳 <a href='{url_for('teacher_dashboard', teacher_id=session['user_id'])}'>Teacher Dashboard</a>"
+    job.progress(0.8, "graded")
+
+    with open(job.artifact_path('IA_Result.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Roll Number', 'Class Name', 'Obtained Marks', 'Total Marks'])
+        writer.writerows(conn.execute(f"SELECT Student_result.roll , Class.name , Student_result.markes , Student_result.total_markes FROM {archive.results(conn)} Join Class on Student_result.class_id = Class.id WHERE test_id = ? ", (test_id,)))
+    return {'graded': graded}
+
+@jobs.handler('import_questions')
+def import_questions_job(job):
+    return question_import.import_questions(
+        get_db(), job.payload['filepath'], error_path=job.artifact_path('question_import_errors.csv'),
+        default_difficulty=job.payload.get('difficulty'), default_subject=job.payload.get('subject'),
+        progress=job.progress,
+    )
+
+@jobs.handler('import_students')
+def import_students_job(job):
+    # rejected rows end up in a downloadable per-row error file
+    return add_students_from_excel(job.payload['filepath'], error_path=job.artifact_path('import_errors.csv'), progress=job.progress)
+
+@jobs.handler('render_heatmap')
+def render_heatmap_job(job):
+    return {'version': heatmaps.render(get_db(), job.payload['target'], job.payload['id'])}
+
+@jobs.handler('archive')
+def archive_job(job):
+    conn = get_db()
+    try:
+        return archive.run(conn, archive.default_cutoff())
+    finally:
+        archive.schedule(conn)
+
+@jobs.handler('attendance_report')
+def attendance_report_job(job):
+    p = job.payload
+    records = query_attendance_report(get_db(), p['teacher_id'], p['class_id'], p['start_date'], p['end_date'])
+    rows = 0
+    with open(job.artifact_path('attendance_report.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Roll Number', 'Student Name', 'Date', 'Status'])
+        for record in records:
+            writer.writerow(record)
+            rows += 1
+    return {'rows': rows}
+
+def _job_for_current_user(job_id):
+    job = jobs.get(get_db(), job_id)
+    if job is None or (session.get('role') != 'admin' and job['created_by'] != session.get('user_id')):
+        return None
+    return job
+
+@app.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    job = _job_for_current_user(job_id)
+    if job is None:
+        return "Job not found", 404
+    fields = ('id', 'kind', 'status', 'attempts', 'progress', 'message', 'result', 'error', 'created_at', 'updated_at')
+    status = {field: job[field] for field in fields}
+    if job['status'] == 'done' and job['artifact']:
+        status['download_url'] = url_for('job_download', job_id=job_id)
+    return jsonify(status)
+
+@app.route('/jobs/<job_id>/download')
+@login_required
+def job_download(job_id):
+    job = _job_for_current_user(job_id)
+    if job is None or job['status'] != 'done' or not job['artifact'] or not os.path.exists(job['artifact']):
+        return "No file available for this job", 404
+    return send_file(os.path.abspath(job['artifact']), as_attachment=True)
+
+@app.cli.command('run-jobs')
+def run_jobs_command():
+    """Run a dedicated background job worker in the foreground."""
+    conn = db.connection(DB_PATH)
+    click.echo(f"requeued {jobs.requeue_abandoned(conn)} abandoned jobs")
+    jobs.work_forever(app)
 
 
 @app.route('/logout')
@@ -0,0 +1,228 @@
+# archival tier for old attendance and IA results
+# whole terms (starting on the TERM_MONTHS) older than the cutoff move out of the hot database into a
+# second SQLite file, attached to every connection as `archive` (db.attach). nothing but move()
+# writes to it, and attendance.mark() rejects dates before the cutoff, so archived terms are
+# read-only. Attendance_Bits and the attendance_stats.py aggregates keep covering the archived
+# history, which leaves date-range reports, summaries, analytics and heatmaps reading the same small
+# tables as before; queries on the row tables take their FROM expression from attendance() and
+# results(), which only union in the archive when the requested range reaches before the cutoff.
+# the hot file is vacuumed after a move so it actually shrinks.
+import datetime
+import os
+import sqlite3
+import time
+
+import db
+import jobs
+
+SCHEMA = 'archive'
+TERM_MONTHS = (1, 7)       # terms start on 1 January and 1 July
+KEEP_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '730'))   # age of the last term to archive; 0 turns the nightly job off
+RUN_AT_HOUR = 3            # local time of the nightly job
+
+# created in the archive file itself. clustered on the lookup keys, no surrogate id, no other index:
+# a student's history and a test's results are each one range of the primary key
+TABLES = [
+    '''
+    CREATE TABLE IF NOT EXISTS Attendance (
+        student_id INTEGER NOT NULL,
+        date DATE NOT NULL,
+        status TEXT,
+        marked_by INTEGER,
+        PRIMARY KEY (student_id, date)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS Student_result (
+        roll TEXT NOT NULL,
+        class_id INT NOT NULL,
+        test_id TEXT NOT NULL,
+        markes INT,
+        total_markes INT,
+        PRIMARY KEY (test_id, roll)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS Archive_Run (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        cutoff TEXT NOT NULL,
+        attendance_rows INTEGER NOT NULL,
+        result_rows INTEGER NOT NULL,
+        archived_at REAL NOT NULL
+    )
+    ''',
+]
+
+ARCHIVED_TESTS = "SELECT test_id FROM main.Tests WHERE ia_date < ? ORDER BY test_id"
+
+# one chunk per transaction: a student_id range of attendance, or one test's results, is copied and
+# deleted together, so every row is in exactly one of the two files and no transaction holds the
+# write lock for long
+COPY_ATTENDANCE = f'''
+    INSERT OR REPLACE INTO {SCHEMA}.Attendance (student_id, date, status, marked_by)
+    SELECT student_id, date, status, marked_by FROM main.Attendance
+    WHERE student_id >= ? AND student_id < ? AND date < ?
+'''
+DELETE_ATTENDANCE = "DELETE FROM main.Attendance WHERE student_id >= ? AND student_id < ? AND date < ?"
+COPY_RESULTS = f'''
+    INSERT OR REPLACE INTO {SCHEMA}.Student_result (roll, class_id, test_id, markes, total_markes)
+    SELECT roll, class_id, test_id, markes, total_markes FROM main.Student_result WHERE test_id = ?
+'''
+DELETE_RESULTS = "DELETE FROM main.Student_result WHERE test_id = ?"
+CHUNK_STUDENTS = 500
+
+def init_app(app, path):
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+        for statement in TABLES:
+            conn.execute(statement)
+        conn.commit()
+    finally:
+        conn.close()
+    db.attach(SCHEMA, path)
+    app.config.setdefault('ARCHIVE_DB_PATH', path)
+
+
+def cutoff(conn):
+    # ISO date before which attendance lives in the archive; None if nothing was archived or the
+    # connection has no archive attached
+    try:
+        row = conn.execute(f"SELECT MAX(cutoff) FROM {SCHEMA}.Archive_Run").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return datetime.date.fromisoformat(row[0]).isoformat() if row[0] else None
+
+
+def term_start(day):
+    if isinstance(day, str):
+        day = datetime.date.fromisoformat(day)
+    return datetime.date(day.year, max(m for m in TERM_MONTHS if m <= day.month), 1)
+
+
+def default_cutoff(today=None):
+    return term_start((today or datetime.date.today()) - datetime.timedelta(days=KEEP_DAYS))
+
+
+def attendance(conn, start=None, end=None):
+    # FROM expression named Attendance holding the rows of start..end (ISO dates, None = open ended):
+    # the hot table alone unless the range reaches before the cutoff. a row lives in one file only
+    # (move() copies and deletes in one transaction), but rows before the cutoff can still be hot
+    # while a move is running or after it was interrupted, so the hot side keeps all its dates.
+    before = cutoff(conn)
+    if before is None or (start is not None and start >= before):
+        return "Attendance"
+    return f'''(
+        SELECT student_id, date, status, marked_by FROM main.Attendance
+        UNION ALL
+        SELECT student_id, date, status, marked_by FROM {SCHEMA}.Attendance WHERE date < '{before}'
+    ) AS Attendance'''
+
+
+def results(conn):
+    # FROM expression named Student_result; a hot row the archive also holds (an interrupted move)
+    # is skipped, the test_id filter of the caller still reaches both primary keys
+    if cutoff(conn) is None:
+        return "Student_result"
+    return f'''(
+        SELECT roll, class_id, test_id, markes, total_markes FROM {SCHEMA}.Student_result
+        UNION ALL
+        SELECT roll, class_id, test_id, markes, total_markes FROM main.Student_result AS hot
+        WHERE NOT EXISTS (SELECT 1 FROM {SCHEMA}.Student_result AS archived
+                          WHERE archived.test_id = hot.test_id AND archived.roll = hot.roll)
+    ) AS Student_result'''
+
+
+def _suspend_delete_triggers(conn):
+    # the DELETE trigger of Attendance_Bits would take the archived days out of the masks; dropped
+    # for the move and re-created from its stored SQL in the same transaction
+    triggers = conn.execute(
+        "SELECT name, sql FROM main.sqlite_master WHERE type = 'trigger' "
+        "AND tbl_name IN ('Attendance', 'Student_result') AND sql LIKE '% DELETE ON %'"
+    ).fetchall()
+    for name, _ in triggers:
+        conn.execute(f"DROP TRIGGER main.{name}")
+    return [sql for _, sql in triggers]
+
+
+def _record_run(conn, before):
+    return conn.execute(
+        f"INSERT INTO {SCHEMA}.Archive_Run (cutoff, attendance_rows, result_rows, archived_at) VALUES (?, 0, 0, ?)",
+        (before, time.time()),
+    ).lastrowid
+
+
+def move(conn, before):
+    # archives the terms that ended before `before` (rounded down to a term start): the attendance
+    # dated before it and the results of tests held before it. returns the cutoff and row counts.
+    # the new cutoff commits first, which makes attendance.mark() reject the dates being moved;
+    # then each chunk is copied and deleted in a transaction of its own. a crash leaves the rest
+    # of the rows in the hot file, where readers still find them and the next run picks them up.
+    current = cutoff(conn)
+    before = max(term_start(before).isoformat(), current or '')   # the cutoff never moves back
+
+    run_id = None
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if before != current:
+            run_id = _record_run(conn, before)
+        low, high = conn.execute("SELECT MIN(student_id), MAX(student_id) FROM main.Attendance").fetchone()
+        tests = [row[0] for row in conn.execute(ARCHIVED_TESTS, (before,))]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    chunks = [(COPY_ATTENDANCE, DELETE_ATTENDANCE, (start, start + CHUNK_STUDENTS, before), 'attendance_rows')
+              for start in range(low, high + 1, CHUNK_STUDENTS)] if low is not None else []
+    chunks += [(COPY_RESULTS, DELETE_RESULTS, (test_id,), 'result_rows') for test_id in tests]
+    moved = {'attendance_rows': 0, 'result_rows': 0}
+    for copy, delete, params, counter in chunks:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(copy, params).rowcount
+            if rows:
+                triggers = _suspend_delete_triggers(conn)
+                conn.execute(delete, params)
+                for sql in triggers:
+                    conn.execute(sql)
+                if run_id is None:   # rows left over from an interrupted run at the same cutoff
+                    run_id = _record_run(conn, before)
+                conn.execute(f"UPDATE {SCHEMA}.Archive_Run SET {counter} = {counter} + ? WHERE id = ?", (rows, run_id))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        moved[counter] += rows
+    return dict(moved, cutoff=before)
+
+
+def _size(conn, schema):
+    page_count = conn.execute(f"PRAGMA {schema}.page_count").fetchone()[0]
+    return page_count * conn.execute(f"PRAGMA {schema}.page_size").fetchone()[0]
+
+
+def vacuum(conn):
+    # rewrites the hot file without the freed pages and truncates the WAL; needs no open transaction
+    conn.execute("VACUUM main")
+    conn.execute("PRAGMA main.wal_checkpoint(TRUNCATE)")
+
+
+def run(conn, before):
+    # move() then vacuum(), what the nightly job and `flask archive-attendance` do
+    hot_before = _size(conn, 'main')
+    moved = move(conn, before)
+    if moved['attendance_rows'] or moved['result_rows']:
+        vacuum(conn)
+    return dict(moved, hot_bytes_before=hot_before, hot_bytes=_size(conn, 'main'), archive_bytes=_size(conn, SCHEMA))
+
+
+def schedule(conn, now=None):
+    # queues the next nightly run; the day in the dedupe key lets the running job queue tomorrow's
+    if not KEEP_DAYS:
+        return None
+    now = now or datetime.datetime.now()
+    run_at = now.replace(hour=RUN_AT_HOUR, minute=0, second=0, microsecond=0)
+    if run_at <= now:
+        run_at += datetime.timedelta(days=1)
+    return jobs.enqueue(conn, 'archive', {}, dedupe_key=f"archive:{run_at.date().isoformat()}", run_after=run_at.timestamp())
@@ -0,0 +1,113 @@
+# batched attendance marking
+# a whole roster (or several dates of it) is written with one executemany upsert inside one
+# transaction. the unique index on Attendance(student_id, date) makes re-marking idempotent:
+# a second submission for the same day updates the status instead of adding a duplicate row.
+# marked_by records the teacher who last set the status, for the per-subject analytics.
+# dates before the archive cutoff (archive.py) are read-only and rejected.
+import datetime
+
+import archive
+import cache_version
+
+STATUSES = ('Present', 'Absent')
+
+UPSERT = '''
+    INSERT INTO Attendance (student_id, date, status, marked_by) VALUES (?, ?, ?, ?)
+    ON CONFLICT(student_id, date) DO UPDATE SET status = excluded.status, marked_by = excluded.marked_by
+    WHERE Attendance.status IS NOT excluded.status
+'''
+
+
+def version_name(class_id):
+    # Cache_Version counter bumped by every mark of the class (see attendance_analytics.py)
+    return f"attendance:{int(class_id)}"
+
+
+def roster(conn, class_id):
+    return [row[0] for row in conn.execute("SELECT id FROM Student WHERE class_id = ?", (class_id,))]
+
+
+def roster_entries(student_ids, date, present_ids):
+    # the form semantics: everyone on the roster, Present if ticked, Absent otherwise
+    present = {str(s) for s in present_ids}
+    return [(student_id, date, 'Present' if str(student_id) in present else 'Absent') for student_id in student_ids]
+
+
+def _valid_date(value):
+    try:
+        return datetime.date.fromisoformat(str(value)).isoformat()
+    except ValueError:
+        return None
+
+
+def mark(conn, class_id, entries, marked_by=None):
+    # entries: iterable of (student_id, date, status); returns one result dict per entry
+    members = set(roster(conn, class_id))
+    results = []
+    rows = []
+    for student_id, date, status in entries:
+        result = {'student_id': student_id, 'date': date, 'status': status}
+        try:
+            student_id = int(student_id)
+        except (TypeError, ValueError):
+            student_id = None
+        iso_date = _valid_date(date)
+        if student_id not in members:
+            result['result'] = 'rejected'
+            result['error'] = 'student is not in this class'
+        elif iso_date is None:
+            result['result'] = 'rejected'
+            result['error'] = 'invalid date'
+        elif status not in STATUSES:
+            result['result'] = 'rejected'
+            result['error'] = 'invalid status'
+        else:
+            result.update(student_id=student_id, date=iso_date)
+            rows.append((student_id, iso_date, status, marked_by))
+        results.append(result)
+
+    if not rows:
+        return results
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # read under the write lock, so a move committing in between cannot archive a date we write
+        archived_before = archive.cutoff(conn)
+        if archived_before is not None:
+            for result in results:
+                if 'result' not in result and result['date'] < archived_before:
+                    result['result'] = 'rejected'
+                    result['error'] = 'date is archived'
+            rows = [row for row in rows if row[1] >= archived_before]
+        if not rows:
+            conn.commit()
+            return results
+        dates = sorted({date for _, date, _, _ in rows})
+        placeholders = ','.join('?' * len(dates))
+        existing = {
+            (student_id, date): status
+            for student_id, date, status in conn.execute(
+                f'''SELECT Attendance.student_id, Attendance.date, Attendance.status FROM Attendance
+                    JOIN Student ON Student.id = Attendance.student_id
+                    WHERE Student.class_id = ? AND Attendance.date IN ({placeholders})''',
+                [class_id, *dates],
+            )
+        }
+        conn.executemany(UPSERT, rows)
+        cache_version.bump(conn, version_name(class_id))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    for result in results:
+        if 'result' in result:
+            continue
+        previous = existing.get((result['student_id'], result['date']))
+        if previous is None:
+            result['result'] = 'inserted'
+        elif previous == result['status']:
+            result['result'] = 'unchanged'
+        else:
+            result['result'] = 'updated'
+    return results
@@ -0,0 +1,187 @@
+# vectorised attendance analytics per class
+# a class's whole history comes out of Attendance_Bits in one query as student x day boolean
+# matrices (attendance_bits.load_class); everything else is array operations on them: overall and
+# rolling 7/30-day rates, absence streaks and day-of-week patterns. the per-subject breakdown is
+# one grouped query on Attendance.marked_by: a record counts towards the subject of the teacher
+# who marked it, if that teacher is assigned to the class in TeacherClassSubject.
+# results are cached per worker and class, tagged with the class's Cache_Version counter that
+# attendance.mark() bumps, so a new mark from any worker invalidates them.
+import calendar
+import datetime
+import threading
+import time
+
+import numpy as np
+
+import archive
+import attendance
+import attendance_bits
+import cache_version
+
+AT_RISK_THRESHOLD = 75.0   # percent
+TTL = 600                  # seconds; also bounds staleness after writes that bypass attendance.mark()
+MAX_ENTRIES = 512
+WINDOWS = (7, 30)          # rolling windows in calendar days
+WEEKDAYS = list(calendar.day_name)
+
+_cache = {}                # class_id -> (version, expires_at, analysis)
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+SPAN = '''
+    SELECT MIN(Attendance_Bits.month), MAX(Attendance_Bits.month)
+    FROM Student JOIN Attendance_Bits ON Attendance_Bits.student_id = Student.id
+    WHERE Student.class_id = ?
+'''
+
+BY_MARKER = '''
+    SELECT Attendance.marked_by, SUM(Attendance.status = 'Present'), COUNT(*)
+    FROM Student JOIN {attendance} ON Attendance.student_id = Student.id
+    WHERE Student.class_id = ?
+    GROUP BY Attendance.marked_by
+'''
+
+CLASS_SUBJECTS = '''
+    SELECT TeacherClassSubject.teacher_id, Teacher.subject
+    FROM TeacherClassSubject JOIN Teacher ON Teacher.user_id = TeacherClassSubject.teacher_id
+    WHERE TeacherClassSubject.class_id = ?
+'''
+
+
+def _rate(present, total):
+    # percentages rounded to 2 places, NaN where nothing was recorded
+    present, total = np.asarray(present, dtype=float), np.asarray(total, dtype=float)
+    return np.round(np.divide(present * 100, total, out=np.full(total.shape, np.nan), where=total > 0), 2)
+
+
+def _values(array):
+    return [None if np.isnan(v) else v for v in array.tolist()]
+
+
+def _window_sums(daily, window):
+    # sum over the trailing `window` calendar days ending on each day
+    totals = np.cumsum(daily)
+    totals[window:] = totals[window:] - totals[:-window]
+    return totals
+
+
+def load(conn, class_id):
+    # -> (students, days, marked, present) trimmed to the class's first..last recorded day
+    first, last = conn.execute(SPAN, (class_id,)).fetchone()
+    if first is None:
+        return [], [], np.zeros((0, 0), dtype=bool), np.zeros((0, 0), dtype=bool)
+    start = datetime.date(first // 100, first % 100, 1)
+    end = datetime.date(last // 100, last % 100, calendar.monthrange(last // 100, last % 100)[1])
+    students, days, marked, present = attendance_bits.load_class(conn, class_id, start, end)
+    recorded = np.flatnonzero(marked.any(axis=0))
+    span = slice(recorded[0], recorded[-1] + 1)
+    return students, days[span], marked[:, span], present[:, span]
+
+
+def subjects(conn, class_id):
+    subject_of = {}
+    for teacher_id, subject in conn.execute(CLASS_SUBJECTS, (class_id,)):
+        subject_of.setdefault(teacher_id, subject)
+    counts = {}
+    for marked_by, present_days, total_days in conn.execute(BY_MARKER.format(attendance=archive.attendance(conn)), (class_id,)):
+        subject = subject_of.get(marked_by) or 'unattributed'
+        p, t = counts.get(subject, (0, 0))
+        counts[subject] = (p + present_days, t + total_days)
+    return [
+        {'subject': subject, 'present_days': p, 'total_days': t, 'attendance_percentage': round(p * 100.0 / t, 2)}
+        for subject, (p, t) in sorted(counts.items())
+    ]
+
+
+def analyze(students, days, marked, present):
+    present_days, total_days = present.sum(axis=1), marked.sum(axis=1)
+    columns = {
+        'present_days': present_days.tolist(), 'total_days': total_days.tolist(),
+        'attendance_percentage': _values(_rate(present_days, total_days)),
+    }
+
+    # days are consecutive calendar days, so a window as of the last day is the last `window` columns
+    for window in WINDOWS:
+        columns[f'rate_{window}d'] = _values(_rate(present[:, -window:].sum(axis=1), marked[:, -window:].sum(axis=1)))
+
+    # absence streaks over each student's recorded days (see attendance_bits.class_range_summary)
+    order = np.argsort(marked, axis=1, kind='stable')
+    absent = np.take_along_axis(marked & ~present, order, axis=1)
+    columns['current_absence_streak'] = attendance_bits.trailing_runs(absent).tolist()
+    columns['longest_absence_streak'] = attendance_bits.longest_runs(absent).tolist()
+
+    # (students, 7) counts per weekday through a one-hot (days, 7) matrix
+    one_hot = np.zeros((len(days), 7))
+    one_hot[np.arange(len(days)), [day.weekday() for day in days]] = 1
+    weekday_present, weekday_total = present @ one_hot, marked @ one_hot
+    weekday_rate = np.where(weekday_total > 0, weekday_present / np.maximum(weekday_total, 1), np.inf)
+    columns['weakest_weekday'] = [
+        WEEKDAYS[k] if total else None for k, total in zip(np.argmin(weekday_rate, axis=1).tolist(), total_days.tolist())
+    ]
+
+    per_student = [
+        dict({'student_id': student_id, 'roll_number': roll, 'name': name}, **{key: values[i] for key, values in columns.items()})
+        for i, (student_id, roll, name) in enumerate(students)
+    ]
+
+    # class trend: daily rate and its rolling rates, on the days attendance was taken
+    daily_present, daily_total = present.sum(axis=0), marked.sum(axis=0)
+    taken = daily_total > 0
+    trend = {'date': [day.isoformat() for day, t in zip(days, taken.tolist()) if t],
+             'rate': _values(_rate(daily_present, daily_total)[taken])}
+    for window in WINDOWS:
+        rolled = _rate(_window_sums(daily_present, window), _window_sums(daily_total, window))
+        trend[f'rate_{window}d'] = _values(rolled[taken])
+
+    class_present, class_total = weekday_present.sum(axis=0), weekday_total.sum(axis=0)
+    class_rate = _rate(class_present, class_total)
+    return {
+        'days': int(taken.sum()),
+        'students': per_student,
+        'trend': [dict(zip(trend, values)) for values in zip(*trend.values())],
+        'weekdays': [
+            {'weekday': WEEKDAYS[k], 'present_days': int(class_present[k]), 'total_days': int(class_total[k]),
+             'attendance_percentage': float(class_rate[k])}
+            for k in range(7) if class_total[k]
+        ],
+    }
+
+
+def class_analytics(conn, class_id):
+    class_id = int(class_id)
+    version = cache_version.get(conn, attendance.version_name(class_id))
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(class_id)
+        if entry and entry[0] == version and entry[1] > now:
+            _stats['hits'] += 1
+            return entry[2]
+        _stats['misses'] += 1
+    analysis = analyze(*load(conn, class_id))
+    analysis['subjects'] = subjects(conn, class_id)
+    with _lock:
+        if len(_cache) >= MAX_ENTRIES:
+            _cache.clear()
+        _cache[class_id] = (version, now + TTL, analysis)
+    return analysis
+
+
+def institution(conn):
+    # (class_id, analysis) for every class with students, through the same cache
+    for (class_id,) in conn.execute("SELECT DISTINCT class_id FROM Student WHERE class_id IS NOT NULL ORDER BY class_id").fetchall():
+        yield class_id, class_analytics(conn, class_id)
+
+
+def at_risk(analysis, threshold=AT_RISK_THRESHOLD):
+    # students below the threshold overall or over the last 30 days, lowest first
+    flagged = [
+        s for s in analysis['students']
+        if (s['attendance_percentage'] is not None and s['attendance_percentage'] < threshold)
+        or (s['rate_30d'] is not None and s['rate_30d'] < threshold)
+    ]
+    return sorted(flagged, key=lambda s: min(v for v in (s['attendance_percentage'], s['rate_30d']) if v is not None))
+
+
+def stats():
+    with _lock:
+        return dict(_stats, size=len(_cache))
@@ -0,0 +1,219 @@
+# compact bitset copy of the attendance history
+# Attendance_Bits holds one row per (student, month): bit d-1 of `marked` says day d was recorded,
+# the same bit of `present` says the student was there. a month of a student is two small integers
+# instead of up to 31 Attendance rows plus their index entries. triggers on Attendance keep it in
+# sync in the same transaction, like the aggregates in attendance_stats.py; bitmasks are used
+# rather than BLOBs because SQLite's bitwise operators can update an integer inside the trigger.
+# date-range reports, percentages and streaks unpack the masks of a class into day-by-student
+# boolean matrices with NumPy instead of reading one row per student per day.
+import datetime
+
+import numpy as np
+
+import archive
+
+# 'YYYY-MM-DD' -> month key YYYYMM and the day's bit
+_MONTH = "CAST(substr({d}, 1, 4) || substr({d}, 6, 2) AS INTEGER)"
+_BIT = "(1 << (CAST(substr({d}, 9, 2) AS INTEGER) - 1))"
+_ISO = "{d} GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'"
+
+TABLES = [
+    '''
+    CREATE TABLE IF NOT EXISTS Attendance_Bits (
+        student_id INTEGER NOT NULL,
+        month INTEGER NOT NULL,
+        marked INTEGER NOT NULL DEFAULT 0,
+        present INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (student_id, month),
+        FOREIGN KEY (student_id) REFERENCES Student(id)
+    ) WITHOUT ROWID
+    ''',
+]
+
+TRIGGERS = [
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_attendance_bits_insert AFTER INSERT ON Attendance
+    WHEN {_ISO.format(d='NEW.date')}
+    BEGIN
+        INSERT INTO Attendance_Bits (student_id, month, marked, present)
+        VALUES (NEW.student_id, {_MONTH.format(d='NEW.date')}, {_BIT.format(d='NEW.date')},
+                CASE WHEN NEW.status = 'Present' THEN {_BIT.format(d='NEW.date')} ELSE 0 END)
+        ON CONFLICT(student_id, month) DO UPDATE SET
+            marked = marked | excluded.marked,
+            present = (present & ~excluded.marked) | excluded.present;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_attendance_bits_update AFTER UPDATE OF status ON Attendance
+    WHEN OLD.status IS NOT NEW.status AND {_ISO.format(d='NEW.date')}
+    BEGIN
+        UPDATE Attendance_Bits
+        SET present = CASE WHEN NEW.status = 'Present' THEN present | {_BIT.format(d='NEW.date')}
+                           ELSE present & ~{_BIT.format(d='NEW.date')} END
+        WHERE student_id = NEW.student_id AND month = {_MONTH.format(d='NEW.date')};
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_attendance_bits_delete AFTER DELETE ON Attendance
+    WHEN {_ISO.format(d='OLD.date')}
+    BEGIN
+        UPDATE Attendance_Bits
+        SET marked = marked & ~{_BIT.format(d='OLD.date')}, present = present & ~{_BIT.format(d='OLD.date')}
+        WHERE student_id = OLD.student_id AND month = {_MONTH.format(d='OLD.date')};
+        DELETE FROM Attendance_Bits
+        WHERE student_id = OLD.student_id AND month = {_MONTH.format(d='OLD.date')} AND marked = 0;
+    END
+    ''',
+]
+
+# one (student, date) per row (unique index, migration 7), so summing the bits is an OR.
+# {{attendance}} is filled in by archive.attendance(): the masks also cover archived terms
+RECOMPUTE = f'''
+    SELECT student_id, {_MONTH.format(d='date')}, SUM({_BIT.format(d='date')}),
+           SUM(CASE WHEN status = 'Present' THEN {_BIT.format(d='date')} ELSE 0 END)
+    FROM {{attendance}} WHERE {_ISO.format(d='date')}
+    GROUP BY student_id, {_MONTH.format(d='date')}
+'''
+
+
+def recompute(conn):
+    # caller owns the transaction (used by the migration and by rebuild)
+    conn.execute("DELETE FROM Attendance_Bits")
+    conn.execute("INSERT INTO Attendance_Bits (student_id, month, marked, present) " + RECOMPUTE.format(attendance=archive.attendance(conn)))
+
+
+def rebuild(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        recompute(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def check(conn):
+    # (table, key, stored, expected) for every (student, month) where the masks and a recompute disagree
+    stored = {r[:2]: r[2:] for r in conn.execute("SELECT student_id, month, marked, present FROM Attendance_Bits")}
+    expected = {r[:2]: r[2:] for r in conn.execute(RECOMPUTE.format(attendance=archive.attendance(conn)))}
+    return [
+        ('Attendance_Bits', key, stored.get(key), expected.get(key))
+        for key in stored.keys() | expected.keys() if stored.get(key) != expected.get(key)
+    ]
+
+
+def _months(start, end):
+    months = []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def _days_in_month(year, month):
+    following = datetime.date(year + 1, 1, 1) if month == 12 else datetime.date(year, month + 1, 1)
+    return (following - datetime.date(year, month, 1)).days
+
+
+def load_class(conn, class_id, start, end):
+    # -> (students [(id, roll, name)], days [date], marked, present) with bool matrices of shape
+    # (students, days) covering start..end inclusive, clamped to the months the class has data for
+    # so the arrays follow the data rather than the requested range
+    start, end = datetime.date.fromisoformat(str(start)), datetime.date.fromisoformat(str(end))
+    if end < start:
+        raise ValueError("end date is before start date")
+    students = conn.execute(
+        "SELECT id, roll_number, name FROM Student WHERE class_id = ? ORDER BY id", (class_id,)
+    ).fetchall()
+    first, last = conn.execute('''
+        SELECT MIN(Attendance_Bits.month), MAX(Attendance_Bits.month)
+        FROM Student JOIN Attendance_Bits ON Attendance_Bits.student_id = Student.id
+        WHERE Student.class_id = ? AND Attendance_Bits.month BETWEEN ? AND ?
+    ''', (class_id, start.year * 100 + start.month, end.year * 100 + end.month)).fetchone()
+    if first is None:
+        return students, [], np.zeros((len(students), 0), dtype=bool), np.zeros((len(students), 0), dtype=bool)
+    start = max(start, datetime.date(first // 100, first % 100, 1))
+    end = min(end, datetime.date(last // 100, last % 100, _days_in_month(last // 100, last % 100)))
+    months = _months(start, end)
+    keys = [year * 100 + month for year, month in months]
+    masks = np.zeros((2, len(students), len(months)), dtype='<u4')
+    if students:
+        row_of = {student_id: i for i, (student_id, _, _) in enumerate(students)}
+        column_of = {key: j for j, key in enumerate(keys)}
+        rows = conn.execute('''
+            SELECT Attendance_Bits.student_id, Attendance_Bits.month, Attendance_Bits.marked, Attendance_Bits.present
+            FROM Student JOIN Attendance_Bits ON Attendance_Bits.student_id = Student.id
+            WHERE Student.class_id = ? AND Attendance_Bits.month BETWEEN ? AND ?
+        ''', (class_id, keys[0], keys[-1])).fetchall()
+        if rows:
+            data = np.array(rows, dtype=np.int64)
+            i = np.fromiter((row_of[s] for s in data[:, 0]), dtype=np.intp, count=len(data))
+            j = np.fromiter((column_of[m] for m in data[:, 1]), dtype=np.intp, count=len(data))
+            masks[0, i, j] = data[:, 2]
+            masks[1, i, j] = data[:, 3]
+
+    # (2, students, months, 4 bytes) -> (2, students, months * 32) bits, day 1 first
+    bits = np.unpackbits(masks.view(np.uint8).reshape(2, len(students), len(months), 4), axis=3, bitorder='little')
+    bits = bits.reshape(2, len(students), len(months) * 32).astype(bool)
+    columns = np.concatenate([
+        np.arange(_days_in_month(year, month)) + j * 32 for j, (year, month) in enumerate(months)
+    ])
+    first = start.day - 1
+    last = first + (end - start).days + 1
+    columns = columns[first:last]
+    days = [start + datetime.timedelta(days=n) for n in range(len(columns))]
+    return students, days, bits[0][:, columns], bits[1][:, columns]
+
+
+def longest_runs(matrix):
+    # longest run of True in every row
+    n, d = matrix.shape
+    padded = np.zeros((n, d + 2), dtype=np.int8)
+    padded[:, 1:-1] = matrix
+    edges = np.diff(padded, axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)   # row-major, so the n-th end closes the n-th start
+    longest = np.zeros(n, dtype=np.int64)
+    np.maximum.at(longest, rows, ends - starts)
+    return longest
+
+
+def trailing_runs(matrix):
+    # length of the run of True that ends on the last column
+    if not matrix.shape[1]:
+        return np.zeros(matrix.shape[0], dtype=np.int64)
+    reversed_ = matrix[:, ::-1]
+    return np.where(reversed_.all(axis=1), matrix.shape[1], np.argmin(reversed_, axis=1))
+
+
+def class_range_summary(conn, class_id, start, end):
+    # per student over start..end: days present / recorded and absence streaks, counted over the
+    # days the student was recorded on (an unrecorded day neither extends nor breaks a streak)
+    students, _, marked, present = load_class(conn, class_id, start, end)
+    # a stable sort moves each row's unrecorded days to the front and keeps recorded days in order
+    order = np.argsort(marked, axis=1, kind='stable')
+    absent = np.take_along_axis(marked & ~present, order, axis=1)
+    present_days = present.sum(axis=1)
+    total_days = marked.sum(axis=1)
+    longest = longest_runs(absent)
+    current = trailing_runs(absent)
+    present_days, total_days = present_days.tolist(), total_days.tolist()
+    return [
+        {
+            'name': name, 'roll_number': roll, 'present_days': present_days[i], 'total_days': total_days[i],
+            'attendance_percentage': round(present_days[i] * 100.0 / total_days[i], 2) if total_days[i] else None,
+            'current_absence_streak': int(current[i]), 'longest_absence_streak': int(longest[i]),
+        }
+        for i, (_, roll, name) in enumerate(students)
+    ]
+
+
+def class_report(conn, class_id, start, end):
+    # (roll, name, date, status) for every recorded day in start..end, by date then student
+    students, days, marked, present = load_class(conn, class_id, start, end)
+    for d in np.flatnonzero(marked.any(axis=0)):
+        date = days[d].isoformat()
+        for i in np.flatnonzero(marked[:, d]):
+            _, roll, name = students[i]
+            yield roll, name, date, 'Present' if present[i, d] else 'Absent'
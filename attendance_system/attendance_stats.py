@@ -0,0 +1,146 @@
+# materialized attendance aggregates
+# Attendance_Student_Agg (per student) and Attendance_Class_Month_Agg (per class and month) are kept
+# up to date by triggers on Attendance, so every insert, status change or delete lands in the same
+# transaction as the row itself. the aggregates count the full recorded history; rows moved to the
+# archive (archive.py) stay counted. `flask rebuild-attendance-aggregates` recomputes them.
+import archive
+
+TABLES = [
+    '''
+    CREATE TABLE IF NOT EXISTS Attendance_Student_Agg (
+        student_id INTEGER PRIMARY KEY,
+        present_days INTEGER NOT NULL DEFAULT 0,
+        total_days INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY (student_id) REFERENCES Student(id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS Attendance_Class_Month_Agg (
+        class_id INTEGER NOT NULL,
+        month TEXT NOT NULL,
+        present_days INTEGER NOT NULL DEFAULT 0,
+        total_days INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (class_id, month),
+        FOREIGN KEY (class_id) REFERENCES Class(id)
+    ) WITHOUT ROWID
+    ''',
+]
+
+# added by migration 17 (see migrations.py)
+DELETE_TRIGGER = '''
+    CREATE TRIGGER IF NOT EXISTS trg_attendance_agg_delete AFTER DELETE ON Attendance
+    BEGIN
+        UPDATE Attendance_Student_Agg
+        SET present_days = present_days - (CASE WHEN OLD.status = 'Present' THEN 1 ELSE 0 END),
+            total_days = total_days - 1
+        WHERE student_id = OLD.student_id;
+        UPDATE Attendance_Class_Month_Agg
+        SET present_days = present_days - (CASE WHEN OLD.status = 'Present' THEN 1 ELSE 0 END),
+            total_days = total_days - 1
+        WHERE class_id = (SELECT class_id FROM Student WHERE id = OLD.student_id) AND month = substr(OLD.date, 1, 7);
+    END
+'''
+
+TRIGGERS = [
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_attendance_agg_insert AFTER INSERT ON Attendance
+    BEGIN
+        INSERT INTO Attendance_Student_Agg (student_id, present_days, total_days)
+        VALUES (NEW.student_id, CASE WHEN NEW.status = 'Present' THEN 1 ELSE 0 END, 1)
+        ON CONFLICT(student_id) DO UPDATE SET present_days = present_days + excluded.present_days,
+                                              total_days = total_days + 1;
+        INSERT INTO Attendance_Class_Month_Agg (class_id, month, present_days, total_days)
+        SELECT class_id, substr(NEW.date, 1, 7), CASE WHEN NEW.status = 'Present' THEN 1 ELSE 0 END, 1
+        FROM Student WHERE id = NEW.student_id AND class_id IS NOT NULL
+        ON CONFLICT(class_id, month) DO UPDATE SET present_days = present_days + excluded.present_days,
+                                                   total_days = total_days + 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_attendance_agg_update AFTER UPDATE OF status ON Attendance
+    WHEN OLD.status IS NOT NEW.status
+    BEGIN
+        UPDATE Attendance_Student_Agg
+        SET present_days = present_days + (CASE WHEN NEW.status = 'Present' THEN 1 ELSE 0 END)
+                                        - (CASE WHEN OLD.status = 'Present' THEN 1 ELSE 0 END)
+        WHERE student_id = NEW.student_id;
+        UPDATE Attendance_Class_Month_Agg
+        SET present_days = present_days + (CASE WHEN NEW.status = 'Present' THEN 1 ELSE 0 END)
+                                        - (CASE WHEN OLD.status = 'Present' THEN 1 ELSE 0 END)
+        WHERE class_id = (SELECT class_id FROM Student WHERE id = NEW.student_id) AND month = substr(NEW.date, 1, 7);
+    END
+    ''',
+    DELETE_TRIGGER,
+]
+
+# full recompute from the row table and its archive (archive.attendance()); also what the
+# consistency check compares against
+STUDENT_RECOMPUTE = '''
+    SELECT student_id, SUM(CASE WHEN status = 'Present' THEN 1 ELSE 0 END), COUNT(*)
+    FROM {attendance} GROUP BY student_id
+'''
+CLASS_MONTH_RECOMPUTE = '''
+    SELECT Student.class_id, substr(Attendance.date, 1, 7),
+           SUM(CASE WHEN Attendance.status = 'Present' THEN 1 ELSE 0 END), COUNT(*)
+    FROM {attendance} JOIN Student ON Student.id = Attendance.student_id
+    WHERE Student.class_id IS NOT NULL
+    GROUP BY Student.class_id, substr(Attendance.date, 1, 7)
+'''
+
+
+def recompute(conn):
+    # caller owns the transaction (used by the migration and by rebuild)
+    conn.execute("DELETE FROM Attendance_Student_Agg")
+    conn.execute("DELETE FROM Attendance_Class_Month_Agg")
+    source = archive.attendance(conn)
+    conn.execute("INSERT INTO Attendance_Student_Agg (student_id, present_days, total_days) " + STUDENT_RECOMPUTE.format(attendance=source))
+    conn.execute("INSERT INTO Attendance_Class_Month_Agg (class_id, month, present_days, total_days) "
+                 + CLASS_MONTH_RECOMPUTE.format(attendance=source))
+
+
+def rebuild(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        recompute(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def check(conn):
+    # rows where the aggregate and a full recompute disagree, as (table, key, stored, expected)
+    mismatches = []
+    source = archive.attendance(conn)
+    stored = {r[0]: r[1:] for r in conn.execute("SELECT student_id, present_days, total_days FROM Attendance_Student_Agg WHERE total_days > 0")}
+    expected = {r[0]: r[1:] for r in conn.execute(STUDENT_RECOMPUTE.format(attendance=source))}
+    for key in stored.keys() | expected.keys():
+        if stored.get(key) != expected.get(key):
+            mismatches.append(('Attendance_Student_Agg', key, stored.get(key), expected.get(key)))
+
+    stored = {r[:2]: r[2:] for r in conn.execute("SELECT class_id, month, present_days, total_days FROM Attendance_Class_Month_Agg WHERE total_days > 0")}
+    expected = {r[:2]: r[2:] for r in conn.execute(CLASS_MONTH_RECOMPUTE.format(attendance=source))}
+    for key in stored.keys() | expected.keys():
+        if stored.get(key) != expected.get(key):
+            mismatches.append(('Attendance_Class_Month_Agg', key, stored.get(key), expected.get(key)))
+    return mismatches
+
+
+def class_summary(conn, class_id):
+    # O(students in class): one row per student from the aggregate, no Attendance scan
+    rows = conn.execute('''
+        SELECT Student.name, ROUND(Attendance_Student_Agg.present_days * 100.0 / Attendance_Student_Agg.total_days, 2)
+        FROM Student
+        JOIN Attendance_Student_Agg ON Attendance_Student_Agg.student_id = Student.id
+        WHERE Student.class_id = ? AND Attendance_Student_Agg.total_days > 0
+        ORDER BY Student.id
+    ''', (class_id,)).fetchall()
+    return [{'name': name, 'attendance_percentage': percentage} for name, percentage in rows]
+
+
+def class_monthly(conn, class_id):
+    rows = conn.execute('''
+        SELECT month, present_days, total_days, ROUND(present_days * 100.0 / total_days, 2)
+        FROM Attendance_Class_Month_Agg WHERE class_id = ? AND total_days > 0 ORDER BY month
+    ''', (class_id,)).fetchall()
+    return [{'month': m, 'present_days': p, 'total_days': t, 'attendance_percentage': pct} for m, p, t, pct in rows]
@@ -0,0 +1,368 @@
+# end-to-end benchmark harness: the real Flask app over a synthetic database from fake_record.py
+#
+#   python attendance_system/benchmarks/bench_app.py [--students 2000] [--days 60] [--requests 200]
+#       [--concurrency 8] [--db dataset.db] [--url http://127.0.0.1:10000] [--output run.json] [--compare base.json]
+#
+# without --db a dataset is generated with fake_record.generate() into a temp directory (same seed,
+# same data); with --db the file is copied first, so every run starts from the same state. the app
+# is driven through its test client, or over HTTP with --url against a local gunicorn serving the
+# --db file itself (ATTENDANCE_DB_PATH=dataset.db gunicorn -w 4 app:app); restore that file from a
+# copy between runs.
+# every scenario is run by --concurrency threads, each with its own logged-in session; sessions
+# are logged in before timing starts, and a teacher's requests are for a class of that teacher.
+# per scenario: throughput and p50/p95/p99 latency. --output saves everything as JSON (with the
+# commit) and --compare prints the change against a saved run. the exit status is 1 if any
+# request got an unexpected status, so a run that measured error pages is not taken for a result.
+import argparse
+import datetime
+import http.cookiejar
+import itertools
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_record  # noqa: E402
+
+JOB_TIMEOUT = 300  # seconds to wait for close_IA jobs to finish
+
+
+# ------------------------------------------------------------------ clients
+class TestClientSession:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, url, data=None):
+        response = self.client.open(url, method=method, data=data)
+        body = response.get_data()  # drains streamed CSV responses as well
+        return response.status_code, body
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpSession:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect()
+        )
+
+    def request(self, method, url, data=None):
+        body = urllib.parse.urlencode(data, doseq=True).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + url, data=body, method=method)
+        try:
+            with self.opener.open(req) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+# ------------------------------------------------------------------ fixtures
+class Fixtures:
+    # the ids every scenario needs, read from the dataset before the app touches it
+    def __init__(self, path):
+        conn = sqlite3.connect(path)
+        self.teachers = conn.execute('''
+            SELECT users.id, users.email, TeacherClassSubject.class_id FROM TeacherClassSubject
+            JOIN users ON users.id = TeacherClassSubject.teacher_id ORDER BY users.id
+        ''').fetchall()
+        self.students = conn.execute('''
+            SELECT users.email, Student.roll_number, Student.class_id FROM Student
+            JOIN users ON users.id = Student.user_id ORDER BY Student.id
+        ''').fetchall()
+        self.rosters = {}
+        for student_id, class_id in conn.execute("SELECT id, class_id FROM Student"):
+            self.rosters.setdefault(class_id, []).append(student_id)
+        self.days = [row[0] for row in conn.execute("SELECT DISTINCT date FROM Attendance ORDER BY date")]
+        graded = "SELECT 1 FROM Student_result WHERE Student_result.test_id = Tests.test_id"
+        self.open_tests = conn.execute(
+            f"SELECT test_id, class_id, teacher_id FROM Tests WHERE NOT EXISTS ({graded}) ORDER BY test_id"
+        ).fetchall()
+        self.closed_tests = conn.execute(
+            f"SELECT test_id, class_id, teacher_id FROM Tests WHERE EXISTS ({graded}) ORDER BY test_id"
+        ).fetchall()
+        # open papers nobody has started: what give_IA renders for a student sitting the test
+        self.papers = conn.execute('''
+            SELECT Tests.test_id, Student.roll_number FROM Tests
+            JOIN Student ON Student.class_id = Tests.class_id
+            WHERE NOT EXISTS (SELECT 1 FROM Student_result WHERE Student_result.test_id = Tests.test_id)
+              AND NOT EXISTS (SELECT 1 FROM IA_Submission WHERE IA_Submission.test_id = Tests.test_id
+                              AND IA_Submission.roll = Student.roll_number)
+            ORDER BY Tests.test_id, Student.id
+        ''').fetchall()
+        conn.close()
+
+
+# ------------------------------------------------------------------ scenarios
+# (name, role, limit(fixtures) or None, request(fixtures, i, worker) -> (method, url, form), expected statuses)
+# i numbers the requests of a scenario, worker the thread; a thread's session is logged in as
+# _teacher_of(fx, worker) and the class checks of the routes hold it to that teacher's classes
+def _teacher_of(fx, worker):
+    return fx.teachers[worker % len(fx.teachers)]
+
+
+def _login(fx, i, worker):
+    email = fx.students[i % len(fx.students)][0]
+    return 'POST', '/login', {'email': email, 'password': fake_record.PASSWORD}
+
+
+def _mark_attendance(fx, i, worker):
+    _, _, class_id = _teacher_of(fx, worker)
+    # dates after the generated period, a new one per request
+    date = (datetime.date.fromisoformat(fx.days[-1]) + datetime.timedelta(days=1 + i)).isoformat()
+    form = {'class_id': class_id, 'date': date}
+    form.update({str(student_id): 'on' for n, student_id in enumerate(fx.rosters[class_id]) if (n + i) % 5})
+    return 'POST', '/mark_attendance', form
+
+
+def _view_attendance(fx, i, worker):
+    _, _, class_id = _teacher_of(fx, worker)
+    return 'POST', '/view_attendance', {'class_id': class_id, 'date': fx.days[i % len(fx.days)]}
+
+
+def _attendance_summary(fx, i, worker):
+    return 'GET', f"/attendance_summary/{_teacher_of(fx, i)[2]}", None
+
+
+def _give_IA(fx, i, worker):
+    test_id, roll = fx.papers[i]
+    return 'GET', f"/give_IA/{test_id}/{roll}", None
+
+
+def _close_IA(fx, i, worker):
+    return 'POST', f"/close_IA/{fx.open_tests[i][0]}", None
+
+
+def _download_attendance(fx, i, worker):
+    _, _, class_id = _teacher_of(fx, worker)
+    return 'POST', '/download_attendance', {'class_id': class_id, 'start_date': fx.days[0], 'end_date': fx.days[-1]}
+
+
+def _download_IA_Result(fx, i, worker):
+    return 'GET', f"/download_IA_Result/{fx.closed_tests[i % len(fx.closed_tests)][0]}", None
+
+
+SCENARIOS = [
+    ('login', None, None, _login, {302}),
+    ('mark_attendance', 'teacher', None, _mark_attendance, {302}),
+    ('view_attendance', 'teacher', None, _view_attendance, {200}),
+    ('attendance_summary', None, None, _attendance_summary, {200}),
+    ('give_IA', 'student', lambda fx: len(fx.papers), _give_IA, {200}),
+    ('download_attendance', 'teacher', None, _download_attendance, {200}),
+    ('download_IA_Result', 'teacher', None, _download_IA_Result, {200}),
+    # last: grading jobs run in the background, which would skew everything measured after them
+    ('close_IA', 'teacher', lambda fx: len(fx.open_tests), _close_IA, {200}),
+]
+
+
+# ------------------------------------------------------------------ runner
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else None
+
+
+def summarize(latencies, errors, seconds):
+    latencies = sorted(latencies)
+    ms = lambda v: round(v * 1000, 3) if v is not None else None  # noqa: E731
+    return {
+        'requests': len(latencies), 'errors': errors, 'seconds': round(seconds, 3),
+        'throughput': round(len(latencies) / seconds, 1) if seconds else None,
+        'mean_ms': ms(sum(latencies) / len(latencies)) if latencies else None,
+        'p50_ms': ms(percentile(latencies, 0.50)), 'p95_ms': ms(percentile(latencies, 0.95)),
+        'p99_ms': ms(percentile(latencies, 0.99)), 'max_ms': ms(latencies[-1] if latencies else None),
+    }
+
+
+def login_session(new_session, fx, role, index):
+    session = new_session()
+    if role == 'teacher':
+        email = _teacher_of(fx, index)[1]
+    elif role == 'student':
+        email = fx.students[index % len(fx.students)][0]
+    else:
+        return session
+    status, _ = session.request('POST', '/login', {'email': email, 'password': fake_record.PASSWORD})
+    if status != 302:
+        raise RuntimeError(f"login as {email} failed with {status}")
+    return session
+
+
+def run_scenario(new_session, fx, scenario, requests, concurrency):
+    name, role, limit, build, expected = scenario
+    total = min(requests, limit(fx)) if limit else requests
+    counter = itertools.count()
+    latencies, errors, failures = [], [], []
+
+    def worker(index):
+        # a session per thread logged in with the scenario's role before the clock starts
+        session = None if name == 'login' else login_session(new_session, fx, role, index)
+        barrier.wait()
+        while True:
+            i = next(counter)
+            if i >= total:
+                return
+            method, url, form = build(fx, i, index)
+            if name == 'login':
+                session = new_session()
+            start = time.perf_counter()
+            try:
+                status, _ = session.request(method, url, form)
+            except Exception as e:  # connection errors in --url mode
+                status = repr(e)
+            latencies.append(time.perf_counter() - start)
+            if status not in expected:
+                errors.append(i)
+                if len(failures) < 3:
+                    failures.append(f"{method} {url} -> {status}")
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(min(concurrency, total) or 1)]
+    barrier = threading.Barrier(len(threads) + 1)
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    result = summarize(latencies, len(errors), time.perf_counter() - start)
+    if failures:
+        result['failures'] = failures
+    return result
+
+
+def wait_for_jobs(path, started):
+    # close_IA only enqueues; report how long the grading jobs took from enqueue to done
+    conn = sqlite3.connect(path)
+    deadline = time.time() + JOB_TIMEOUT
+    while time.time() < deadline:
+        pending = conn.execute(
+            "SELECT COUNT(*) FROM Jobs WHERE kind = 'close_ia' AND status IN ('queued', 'running') AND created_at >= ?", (started,)
+        ).fetchone()[0]
+        if not pending:
+            break
+        time.sleep(0.2)
+    rows = conn.execute(
+        "SELECT updated_at - created_at, status FROM Jobs WHERE kind = 'close_ia' AND created_at >= ?", (started,)
+    ).fetchall()
+    conn.close()
+    done = [seconds for seconds, status in rows if status == 'done']
+    if not rows:
+        return None
+    return summarize(done, len(rows) - len(done), max(done) if done else 0)
+
+
+def git_commit():
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root,
+                                    capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+def print_results(results):
+    print(f"{'scenario':>22} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, r in results.items():
+        fmt = lambda v: f"{v:>9.2f}" if v is not None else f"{'-':>9}"  # noqa: E731
+        print(f"{name:>22} {r['requests']:>8} {r['errors']:>6} {r['throughput'] or 0:>8.1f} "
+              f"{fmt(r['p50_ms'])} {fmt(r['p95_ms'])} {fmt(r['p99_ms'])}")
+        for failure in r.get('failures', []):
+            print(f"{'':>24}{failure}")
+
+
+def print_comparison(base, results):
+    print(f"\nagainst {base.get('commit') or 'baseline'}:")
+    print(f"{'scenario':>22} {'p50':>16} {'p95':>16} {'req/s':>16}")
+    change = lambda old, new: f"{(new - old) / old * 100:+.1f}%" if old and new is not None else '-'  # noqa: E731
+    for name, r in results.items():
+        old = base['scenarios'].get(name)
+        if old is None:
+            continue
+        print(f"{name:>22} {change(old['p50_ms'], r['p50_ms']):>16} {change(old['p95_ms'], r['p95_ms']):>16} "
+              f"{change(old['throughput'], r['throughput']):>16}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the app's main routes over a synthetic dataset")
+    parser.add_argument('--db', help="dataset from fake_record.py (copied before the run)")
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--requests', type=int, default=200, help="per scenario")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--scenarios', nargs='+', help="run only these")
+    parser.add_argument('--url', help="drive a running server instead of the test client")
+    parser.add_argument('--output', help="write the results as JSON")
+    parser.add_argument('--compare', help="a previous --output to compare against")
+    args = parser.parse_args()
+
+    if args.url and not args.db:
+        parser.error("--url needs --db, the dataset the server is running on")
+    work = tempfile.mkdtemp(prefix='bench_app_')
+    path = os.path.join(work, 'attendance.db')
+    dataset = {'students': args.students, 'days': args.days, 'seed': args.seed}
+    if args.url:
+        path = args.db
+        dataset = {'source': os.path.abspath(args.db)}
+    elif args.db:
+        shutil.copyfile(args.db, path)
+        dataset = {'source': os.path.abspath(args.db)}
+    else:
+        gen = fake_record.parser().parse_args(['--students', str(args.students), '--days', str(args.days), '--seed', str(args.seed)])
+        dataset['tables'] = fake_record.generate(gen, path)
+    fx = Fixtures(path)
+
+    if args.url:
+        new_session = lambda: HttpSession(args.url)  # noqa: E731
+    else:
+        os.environ['ATTENDANCE_DB_PATH'] = path
+        import app as application
+        new_session = lambda: TestClientSession(application.app)  # noqa: E731
+
+    results = {}
+    for scenario in SCENARIOS:
+        if args.scenarios and scenario[0] not in args.scenarios:
+            continue
+        started = time.time()
+        results[scenario[0]] = run_scenario(new_session, fx, scenario, args.requests, args.concurrency)
+        if scenario[0] == 'close_IA':
+            jobs_result = wait_for_jobs(path, started)
+            if jobs_result:
+                results['close_IA job'] = jobs_result
+    print_results(results)
+
+    commit, dirty = git_commit()
+    report = {
+        'commit': commit, 'dirty': dirty, 'time': datetime.datetime.now().isoformat(timespec='seconds'),
+        'mode': args.url or 'test-client', 'concurrency': args.concurrency, 'requests': args.requests,
+        'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version, 'cpus': os.cpu_count(),
+        'dataset': dataset, 'scenarios': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), results)
+    shutil.rmtree(work, ignore_errors=True)
+    if any(r['errors'] for r in results.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
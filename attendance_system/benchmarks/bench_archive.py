@@ -0,0 +1,115 @@
+# benchmark: the hot database before and after archive.run() moves the old terms out
+#
+#   python attendance_system/benchmarks/bench_archive.py [--students 5000] [--days 500] [--keep-days 365] [--repeat 20]
+#
+# generates a dataset with fake_record.generate() into a temp directory, then reports before and
+# after archiving everything older than --keep-days before the last generated day:
+#   - size: hot file, and the archive file next to it
+#   - backup: sqlite3 backup API copy of the hot file, what a nightly backup costs
+#   - full scan: COUNT(*) of the hot Attendance table
+#   - student history: the view_attendance query for one student, whole history (unions the archive)
+#   - recent range: the same student's rows of the last 30 days (hot table only)
+# plus how long the move and the vacuum took.
+import argparse
+import datetime
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_record  # noqa: E402
+
+HISTORY = '''
+    SELECT Teacher.subject, Attendance.date, Attendance.status FROM {attendance}
+    JOIN Student ON Attendance.student_id = Student.id
+    JOIN TeacherClassSubject ON Student.class_id = TeacherClassSubject.class_id
+    JOIN Teacher ON TeacherClassSubject.teacher_id = Teacher.user_id
+    WHERE Attendance.student_id = ? AND Attendance.date >= ?
+    ORDER BY Attendance.date
+'''
+
+
+def median_ms(fn, n):
+    timings = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def size_mb(conn, schema):
+    pages = conn.execute(f"PRAGMA {schema}.page_count").fetchone()[0]
+    return pages * conn.execute(f"PRAGMA {schema}.page_size").fetchone()[0] / 2**20
+
+
+def backup_ms(conn, tmp):
+    target = os.path.join(tmp, 'backup.db')
+    start = time.perf_counter()
+    copy = sqlite3.connect(target)
+    conn.backup(copy, name='main')
+    copy.close()
+    elapsed = (time.perf_counter() - start) * 1000
+    os.remove(target)
+    return elapsed
+
+
+def measure(conn, archive, tmp, student_id, recent, repeat):
+    history = HISTORY.format(attendance=archive.attendance(conn))
+    recent_rows = HISTORY.format(attendance=archive.attendance(conn, recent))
+    return {
+        'hot MB': size_mb(conn, 'main'),
+        'backup ms': backup_ms(conn, tmp),
+        'full scan ms': median_ms(lambda: conn.execute("SELECT COUNT(*) FROM main.Attendance").fetchone(), repeat),
+        'student history ms': median_ms(lambda: conn.execute(history, (student_id, '')).fetchall(), repeat),
+        'recent range ms': median_ms(lambda: conn.execute(recent_rows, (student_id, recent)).fetchall(), repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the hot database before and after archiving")
+    parser.add_argument('--students', type=int, default=5000)
+    parser.add_argument('--days', type=int, default=500)
+    parser.add_argument('--keep-days', type=int, default=365)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        gen = fake_record.parser().parse_args(['--students', str(args.students), '--days', str(args.days), '--tests', '1'])
+        fake_record.generate(gen, path)
+        os.environ['ATTENDANCE_DB_PATH'] = path
+        os.environ['JOB_WORKER_THREADS'] = '0'
+        import app as attendance_app  # noqa: F401  (attaches the archive, see archive.init_app)
+        import archive
+        import db
+
+        conn = db.connection(path)
+        rows = conn.execute("SELECT COUNT(*) FROM Attendance").fetchone()[0]
+        student_id = conn.execute("SELECT MIN(id) FROM Student").fetchone()[0]
+        last = datetime.date.fromisoformat(gen.end_date)
+        recent = (last - datetime.timedelta(days=30)).isoformat()
+        before = measure(conn, archive, tmp, student_id, recent, args.repeat)
+
+        start = time.perf_counter()
+        moved = archive.move(conn, archive.term_start(last - datetime.timedelta(days=args.keep_days)))
+        moving = time.perf_counter() - start
+        start = time.perf_counter()
+        archive.vacuum(conn)
+        vacuuming = time.perf_counter() - start
+        after = measure(conn, archive, tmp, student_id, recent, args.repeat)
+
+        print(f"{rows:,} attendance rows; archived before {moved['cutoff']}: {moved['attendance_rows']:,} rows "
+              f"in {moving:.2f} s, vacuum {vacuuming:.2f} s, archive file "
+              f"{size_mb(conn, archive.SCHEMA):.1f} MB")
+        print(f"  {'':<20} {'before':>10} {'after':>10}")
+        for key in before:
+            print(f"  {key:<20} {before[key]:10.2f} {after[key]:10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+# benchmark: whole-institution run of the attendance analytics (attendance_analytics.py)
+#
+#   python attendance_system/benchmarks/bench_attendance_analytics.py [--students 10000] [--days 250] [--db PATH]
+#
+# without --db a dataset is generated with fake_record.generate() into a temp directory. reports:
+#   - cold: every class analysed from the database (empty cache), as the analyze-attendance command does
+#   - warm: the same run served from the per-worker cache
+#   - after a mark: one class re-marked through attendance.mark(), only that class is recomputed
+#   - row loop: every Attendance row of each class (with the marking teacher's subject) walked in
+#     Python for overall and 30-day rates, streaks, weekday and subject counts, i.e. the analytics
+#     without the bitmasks and NumPy
+import argparse
+import collections
+import datetime
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import attendance  # noqa: E402
+import attendance_analytics  # noqa: E402
+import fake_record  # noqa: E402
+
+ROW_HISTORY = '''
+    SELECT Student.id, Attendance.date, Attendance.status = 'Present', Teacher.subject
+    FROM Student
+    JOIN Attendance ON Attendance.student_id = Student.id
+    LEFT JOIN TeacherClassSubject ON TeacherClassSubject.class_id = Student.class_id
+                                 AND TeacherClassSubject.teacher_id = Attendance.marked_by
+    LEFT JOIN Teacher ON Teacher.user_id = TeacherClassSubject.teacher_id
+    WHERE Student.class_id = ?
+    ORDER BY Attendance.date
+'''
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def run_all(conn):
+    return [analysis for _, analysis in attendance_analytics.institution(conn)]
+
+
+def row_loop(conn):
+    results = {}
+    for (class_id,) in conn.execute("SELECT DISTINCT class_id FROM Student WHERE class_id IS NOT NULL").fetchall():
+        per_student = collections.defaultdict(lambda: {'present': 0, 'total': 0, 'run': 0, 'longest': 0, 'days': []})
+        weekdays, subjects = collections.Counter(), collections.Counter()
+        rows = conn.execute(ROW_HISTORY, (class_id,)).fetchall()
+        last = max((row[1] for row in rows), default=None)
+        since = (datetime.date.fromisoformat(last) - datetime.timedelta(days=29)).isoformat() if last else None
+        for student_id, date, present, subject in rows:
+            s = per_student[student_id]
+            s['present'] += present
+            s['total'] += 1
+            s['run'] = 0 if present else s['run'] + 1
+            s['longest'] = max(s['longest'], s['run'])
+            if date >= since:
+                s['days'].append(present)
+            weekdays[datetime.date.fromisoformat(date).weekday(), present] += 1
+            subjects[subject or 'unattributed', present] += 1
+        results[class_id] = {
+            student_id: (s['present'] * 100.0 / s['total'], sum(s['days']) * 100.0 / len(s['days']), s['run'], s['longest'])
+            for student_id, s in per_student.items()
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark a whole-institution attendance analytics run")
+    parser.add_argument('--db', help="existing dataset from fake_record.py (read and written)")
+    parser.add_argument('--students', type=int, default=10000)
+    parser.add_argument('--days', type=int, default=250)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db
+        if not path:
+            path = os.path.join(tmp, 'bench.db')
+            gen = fake_record.parser().parse_args(['--students', str(args.students), '--days', str(args.days),
+                                                   '--seed', str(args.seed), '--tests', '0'])
+            _, built = timed(lambda: fake_record.generate(gen, path))
+            print(f"generated {args.students:,} students x {args.days} days in {built:.0f}s")
+        conn = sqlite3.connect(path, isolation_level=None)
+        classes, rows = conn.execute(
+            "SELECT COUNT(DISTINCT class_id), (SELECT COUNT(*) FROM Attendance) FROM Student"
+        ).fetchone()
+        print(f"{classes} classes, {rows:,} attendance rows")
+
+        analyses, cold = timed(lambda: run_all(conn))
+        flagged = sum(len(attendance_analytics.at_risk(a)) for a in analyses)
+        print(f"  cold run          {cold:8.2f} s   ({cold / classes * 1000:.1f} ms per class, {flagged} students at risk)")
+        _, warm = timed(lambda: run_all(conn))
+        print(f"  warm run          {warm:8.3f} s   (cache {attendance_analytics.stats()})")
+
+        class_id, student_id = conn.execute("SELECT class_id, id FROM Student ORDER BY id LIMIT 1").fetchone()
+        attendance.mark(conn, class_id, [(student_id, fake_record.parser().get_default('end_date'), 'Absent')])
+        _, marked = timed(lambda: run_all(conn))
+        print(f"  after one mark    {marked:8.3f} s   (cache {attendance_analytics.stats()})")
+
+        _, loop = timed(lambda: row_loop(conn))
+        print(f"  row loop          {loop:8.2f} s   ({loop / cold:.1f}x the vectorised cold run, no trend)")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
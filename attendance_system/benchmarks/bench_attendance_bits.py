@@ -0,0 +1,146 @@
+# benchmark: Attendance row table vs the Attendance_Bits per-(student, month) bitmasks
+#
+#   python attendance_system/benchmarks/bench_attendance_bits.py [--sizes 1000000 10000000 50000000] [--days 250]
+#
+# builds one database file per size (students = size / days, 60 per class, weekday attendance),
+# fills Attendance_Bits with attendance_bits.RECOMPUTE as the migration does, and reports:
+#   - bytes on disk of Attendance + its unique (student_id, date) index vs Attendance_Bits (dbstat)
+#   - download_attendance: one class over the whole period and over one month, the original
+#     row-table query vs attendance_bits.class_report
+#   - attendance_summary for a date range: present / recorded days and absence streaks per student,
+#     grouped rows + a Python pass vs attendance_bits.class_range_summary
+# latencies are the median of REPEAT warm runs.
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import attendance_bits  # noqa: E402
+import db  # noqa: E402
+
+CLASS_SIZE = 60
+REPEAT = 5
+
+SCHEMA = [
+    "CREATE TABLE Student (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, roll_number TEXT UNIQUE NOT NULL, class_id INTEGER)",
+    "CREATE INDEX idx_student_class ON Student(class_id)",
+    '''CREATE TABLE Attendance (id INTEGER PRIMARY KEY AUTOINCREMENT, student_id INTEGER, date DATE NOT NULL,
+       status TEXT CHECK(status IN ('Present', 'Absent')))''',
+    "CREATE UNIQUE INDEX ux_attendance_student_date ON Attendance(student_id, date)",
+] + attendance_bits.TABLES
+
+ROW_REPORT = '''
+    SELECT Student.roll_number, Student.name, Attendance.date, Attendance.status
+    FROM Attendance JOIN Student ON Student.id = Attendance.student_id
+    WHERE Student.class_id = ? AND Attendance.date BETWEEN ? AND ?
+    ORDER BY Attendance.date
+'''
+ROW_HISTORY = '''
+    SELECT Student.id, Attendance.status = 'Present'
+    FROM Student JOIN Attendance ON Attendance.student_id = Student.id
+    WHERE Student.class_id = ? AND Attendance.date BETWEEN ? AND ?
+    ORDER BY Student.id, Attendance.date
+'''
+
+
+def weekdays(count, end=datetime.date(2025, 3, 31)):
+    days = []
+    day = end
+    while len(days) < count:
+        if day.weekday() < 5:
+            days.append(day.isoformat())
+        day -= datetime.timedelta(days=1)
+    return days[::-1]
+
+
+def build(path, rows, days):
+    rng = random.Random(rows)
+    conn = sqlite3.connect(path)
+    for pragma in db.PRAGMAS:
+        conn.execute(pragma)
+    for sql in SCHEMA:
+        conn.execute(sql)
+    students = max(1, rows // len(days))
+    conn.executemany(
+        "INSERT INTO Student (id, name, roll_number, class_id) VALUES (?, ?, ?, ?)",
+        ((i, f"Student {i}", f"R{i:07d}", (i - 1) // CLASS_SIZE + 1) for i in range(1, students + 1)),
+    )
+    rates = [rng.uniform(0.55, 0.98) for _ in range(students)]
+    conn.executemany(
+        "INSERT INTO Attendance (student_id, date, status) VALUES (?, ?, ?)",
+        ((i + 1, day, 'Present' if rng.random() < rates[i] else 'Absent') for i in range(students) for day in days),
+    )
+    conn.execute("INSERT INTO Attendance_Bits (student_id, month, marked, present) " + attendance_bits.RECOMPUTE.format(attendance="Attendance"))
+    conn.commit()
+    conn.execute("ANALYZE")
+    return conn, students
+
+
+def storage(conn):
+    sizes = dict(conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name").fetchall())
+    return sizes.get('Attendance', 0) + sizes.get('ux_attendance_student_date', 0), sizes.get('Attendance_Bits', 0)
+
+
+def row_summary(conn, class_id, start, end):
+    # what the summary costs without the bitmasks: every row of the range, then a pass per student
+    summary = {}
+    for student_id, present in conn.execute(ROW_HISTORY, (class_id, start, end)):
+        s = summary.setdefault(student_id, [0, 0, 0, 0])   # present, total, current run, longest run
+        s[0] += present
+        s[1] += 1
+        s[2] = 0 if present else s[2] + 1
+        s[3] = max(s[3], s[2])
+    return summary
+
+
+def median_ms(fn, *args):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the attendance bitmasks against the row table")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000000, 10000000, 50000000])
+    parser.add_argument('--days', type=int, default=250, help="weekdays per student")
+    args = parser.parse_args()
+    days = weekdays(args.days)
+    month = [d for d in days if d.startswith(days[-1][:7])]
+
+    for rows in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            conn, students = build(os.path.join(tmp, 'bench.db'), rows, days)
+            built = time.perf_counter() - start
+            class_id = (students // CLASS_SIZE) // 2 + 1
+            row_bytes, bit_bytes = storage(conn)
+            print(f"\n{rows:,} attendance rows ({students:,} students x {len(days)} days, built in {built:.0f}s)")
+            print(f"  storage     rows + index {row_bytes / 2**20:9.1f} MB   bitmasks {bit_bytes / 2**20:9.1f} MB   "
+                  f"{row_bytes / bit_bytes:6.1f}x smaller")
+            cases = [
+                ('download, whole period', lambda c: c.execute(ROW_REPORT, (class_id, days[0], days[-1])).fetchall(),
+                 lambda c: list(attendance_bits.class_report(c, class_id, days[0], days[-1]))),
+                ('download, one month', lambda c: c.execute(ROW_REPORT, (class_id, month[0], month[-1])).fetchall(),
+                 lambda c: list(attendance_bits.class_report(c, class_id, month[0], month[-1]))),
+                ('summary + streaks', lambda c: row_summary(c, class_id, days[0], days[-1]),
+                 lambda c: attendance_bits.class_range_summary(c, class_id, days[0], days[-1])),
+            ]
+            for label, by_rows, by_bits in cases:
+                row_ms = median_ms(by_rows, conn)
+                bit_ms = median_ms(by_bits, conn)
+                print(f"  {label:<24} rows {row_ms:9.2f} ms   bitmasks {bit_ms:9.2f} ms   {row_ms / bit_ms:6.1f}x")
+            conn.close()
+
+
+if __name__ == '__main__':
+    main()
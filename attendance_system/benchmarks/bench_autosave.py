@@ -0,0 +1,114 @@
+# load test: IA answer autosave with per-worker write coalescing vs one transaction per answer
+#
+#   python attendance_system/benchmarks/bench_autosave.py [--students 500] [--questions 20] [--think-ms 20]
+#
+# every simulated student is a thread answering each question of the paper once, with a random
+# think time in between, against a fresh WAL database built by migrations.migrate(). "direct" writes
+# each answer in its own BEGIN IMMEDIATE transaction, the way a plain per-request write would;
+# "coalesced" hands it to ia_autosave and lets the flusher batch it. reported: answers durable per
+# second over the whole run, per-call latency percentiles, and writer-lock failures.
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+
+import db  # noqa: E402
+import ia_autosave  # noqa: E402
+import migrations  # noqa: E402
+
+TEST_ID = 'bench-test'
+
+
+def direct(conn, roll, qid, answer):
+    params = {'test_id': TEST_ID, 'roll': roll, 'qid': qid, 'answer': answer}
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(ia_autosave.IN_PROGRESS, params)
+        conn.execute(ia_autosave.AUTOSAVE, params)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def coalesced(conn, roll, qid, answer):
+    ia_autosave.record(TEST_ID, roll, [(qid, answer)])
+
+
+def student(mode, roll, questions, think, latencies, errors, barrier):
+    conn = db.connection()
+    rng = random.Random(roll)
+    barrier.wait()
+    for qid in range(1, questions + 1):
+        time.sleep(rng.uniform(0, 2 * think))
+        start = time.perf_counter()
+        try:
+            mode(conn, roll, str(qid), rng.choice('ABCD'))
+        except sqlite3.OperationalError:
+            errors.append(roll)
+        latencies.append(time.perf_counter() - start)
+
+
+def run(mode, students, questions, think):
+    latencies, errors = [], []
+    flushed = ia_autosave.stats()['flushed']
+    barrier = threading.Barrier(students + 1)
+    threads = [
+        threading.Thread(target=student, args=(mode, f"R{i:04d}", questions, think, latencies, errors, barrier))
+        for i in range(students)
+    ]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    if mode is coalesced:
+        # durable means committed by the flusher, not just buffered
+        while ia_autosave.stats()['flushed'] - flushed < students * questions:
+            time.sleep(0.005)
+    elapsed = time.perf_counter() - start
+    stored = db.connection().execute("SELECT COUNT(*) FROM Test_Response WHERE test_id = ?", (TEST_ID,)).fetchone()[0]
+    return elapsed, stored, sorted(latencies), len(errors)
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test IA answer autosave")
+    parser.add_argument('--students', type=int, default=500)
+    parser.add_argument('--questions', type=int, default=20)
+    parser.add_argument('--think-ms', type=float, default=20, help="mean pause between two answers of a student")
+    args = parser.parse_args()
+
+    print(f"{args.students} students x {args.questions} questions, mean think time {args.think_ms} ms")
+    print(f"{'mode':>10} {'seconds':>8} {'answers/s':>10} {'stored':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'locked':>7}")
+    for name, mode in (('direct', direct), ('coalesced', coalesced)):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.db')
+            db.init_app(Flask(__name__), path)
+            migrations.migrate(db.connection())
+            db.connection().execute(
+                "INSERT INTO Tests (test_id, teacher_id, class_id, subject, test_name, ia_date) VALUES (?, 1, 1, 'DBMS', 'bench', '2025-01-01')",
+                (TEST_ID,),
+            )
+            db.connection().commit()
+            elapsed, stored, latencies, locked = run(mode, args.students, args.questions, args.think_ms / 1000)
+            print(f"{name:>10} {elapsed:>8.2f} {stored / elapsed:>10.0f} {stored:>7} {percentile(latencies, 0.5):>8.2f} "
+                  f"{percentile(latencies, 0.95):>8.2f} {percentile(latencies, 0.99):>8.2f} {locked:>7}")
+    stats = ia_autosave.stats()
+    print(f"coalesced: {stats['flushes']} flush transactions, {stats['flushed'] / max(stats['flushes'], 1):.0f} answers per flush")
+
+
+if __name__ == '__main__':
+    main()
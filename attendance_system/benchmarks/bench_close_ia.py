@@ -0,0 +1,130 @@
+# benchmark: set-based close_IA grading vs the old per-student / per-question loop
+#
+#   python attendance_system/benchmarks/bench_close_ia.py [--sizes 1000 10000 100000] [--questions 40]
+#
+# each size is the number of Test_Response rows; the class is sized so that every student
+# answers every question, with ~10% of the roster absent.
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import grading  # noqa: E402
+import migrations  # noqa: E402
+
+TEST_ID = 'bench-test'
+
+
+def legacy_grade(conn, test_id):
+    # the loop close_IA used before grading.grade_test
+    cursor = conn.cursor()
+    cursor.execute("SELECT class_id FROM Tests WHERE test_id = ?", (test_id,))
+    for class_id in cursor.fetchall():
+        cursor.execute("SELECT roll_number FROM Student WHERE class_id = ?", (class_id[0],))
+        rolls = cursor.fetchall()
+        cursor.execute("SELECT roll FROM Test_Response WHERE test_id = ?", (test_id,))
+        ia_given_rolls = cursor.fetchall()
+        for roll_tuple in rolls:
+            roll = roll_tuple[0]
+            markes = 0
+            total_markes = cursor.execute("SELECT count(qid) FROM Test_Questions WHERE test_id = ?", (test_id,)).fetchone()[0]
+            if roll in [r[0] for r in ia_given_rolls]:
+                qids = cursor.execute("SELECT qid FROM Test_Questions WHERE test_id = ?", (test_id,)).fetchall()
+                for qid_tuple in qids:
+                    qid = qid_tuple[0]
+                    answer = cursor.execute(
+                        "SELECT answer FROM Test_Questions WHERE test_id = ? AND qid = ?", (test_id, qid)
+                    ).fetchone()
+                    response_ans = cursor.execute(
+                        "SELECT answer FROM Test_Response WHERE roll = ? AND qid = ? AND test_id = ?", (roll, qid, test_id)
+                    ).fetchone()
+                    if response_ans == answer:
+                        markes += 1
+            cursor.execute(
+                "INSERT INTO Student_Result (roll, class_id, test_id, markes, total_markes) VALUES (?, ?, ?, ?, ?)",
+                (roll, class_id[0], test_id, markes, total_markes,)
+            )
+            conn.commit()
+    cursor.execute("DELETE FROM Test_Response WHERE test_id = ?", (test_id,))
+    cursor.execute("DELETE FROM Test_Questions WHERE test_id = ?", (test_id,))
+    conn.commit()
+
+
+def build_db(path, responses, questions):
+    conn = sqlite3.connect(path)
+    for pragma in db.PRAGMAS:
+        conn.execute(pragma)
+    migrations.migrate(conn)
+    rng = random.Random(42)
+    answering = max(1, responses // questions)
+    roster = answering + answering // 10
+
+    conn.execute("INSERT INTO Class (id, name, department_id) VALUES (1, 'Division 1', 1)")
+    conn.execute("INSERT INTO Tests (test_id, teacher_id, class_id, subject, test_name, ia_date) VALUES (?, 1, 1, 'DBMS', 'IA 1', '2025-01-01')", (TEST_ID,))
+    conn.executemany(
+        "INSERT INTO Student (name, email, password, roll_number, class_id, user_id) VALUES (?, ?, 'x', ?, 1, ?)",
+        [(f"Student {i}", f"s{i}@example.com", f"R{i:06d}", i) for i in range(roster)],
+    )
+    key = {qid: rng.choice('ABCD') for qid in range(1, questions + 1)}
+    conn.executemany(
+        "INSERT INTO Test_Questions (test_id, qid, answer) VALUES (?, ?, ?)",
+        [(TEST_ID, str(qid), ans) for qid, ans in key.items()],
+    )
+    conn.executemany(
+        "INSERT INTO Test_Response (roll, qid, answer, test_id) VALUES (?, ?, ?, ?)",
+        ((f"R{i:06d}", str(qid), rng.choice('ABCD'), TEST_ID) for i in range(answering) for qid in key),
+    )
+    conn.commit()
+    return conn
+
+
+def results(conn):
+    return conn.execute("SELECT roll, markes, total_markes FROM Student_result ORDER BY roll").fetchall()
+
+
+def run(responses, questions, skip_legacy):
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = build_db(os.path.join(tmp, 'new.db'), responses, questions)
+        start = time.perf_counter()
+        grading.grade_test(conn, TEST_ID)
+        new_time = time.perf_counter() - start
+        new_results = results(conn)
+        conn.close()
+
+        legacy_time = None
+        if not skip_legacy:
+            conn = build_db(os.path.join(tmp, 'legacy.db'), responses, questions)
+            start = time.perf_counter()
+            legacy_grade(conn, TEST_ID)
+            legacy_time = time.perf_counter() - start
+            assert results(conn) == new_results, "set-based grading disagrees with the legacy loop"
+            conn.close()
+    return new_time, legacy_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark set-based close_IA grading")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--questions', type=int, default=40)
+    parser.add_argument('--skip-legacy-above', type=int, default=None,
+                        help='do not run the legacy loop for sizes above this many responses')
+    args = parser.parse_args()
+
+    print(f"{'responses':>10} {'legacy (s)':>12} {'set-based (s)':>14} {'speedup':>9}")
+    for size in args.sizes:
+        skip = args.skip_legacy_above is not None and size > args.skip_legacy_above
+        new_time, legacy_time = run(size, args.questions, skip)
+        if legacy_time is None:
+            print(f"{size:>10} {'-':>12} {new_time:>14.4f} {'-':>9}")
+        else:
+            print(f"{size:>10} {legacy_time:>12.4f} {new_time:>14.4f} {legacy_time / new_time:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
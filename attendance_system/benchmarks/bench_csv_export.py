@@ -0,0 +1,73 @@
+# benchmark: streamed CSV export vs building the whole report in memory
+#
+#   python attendance_system/benchmarks/bench_csv_export.py [--sizes 10000 100000 1000000]
+#
+# reports peak Python memory (tracemalloc) and time to the first chunk for both approaches.
+import argparse
+import os
+import sqlite3
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import csv_export  # noqa: E402
+
+HEADER = ['Roll Number', 'Student Name', 'Date', 'Status']
+QUERY = "SELECT roll_number, name, date, status FROM report ORDER BY date"
+
+
+def build_db(rows):
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE report (roll_number TEXT, name TEXT, date TEXT, status TEXT)")
+    conn.executemany(
+        "INSERT INTO report VALUES (?, ?, ?, ?)",
+        ((f"CS{i % 500:03d}", f"Student {i % 500}", f"2025-{1 + i // 500 % 12:02d}-{1 + i % 28:02d}",
+          'Present' if i % 3 else 'Absent') for i in range(rows)),
+    )
+    return conn
+
+
+def legacy(conn):
+    # what download_attendance did before csv_export
+    records = conn.execute(QUERY).fetchall()
+    output = [HEADER] + [[r[0], r[1], r[2], r[3]] for r in records]
+    yield '\n'.join([','.join(map(str, row)) for row in output])
+
+
+def streamed(conn):
+    yield from csv_export.iter_csv(HEADER, conn.execute(QUERY))
+
+
+def measure(fn, conn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    first = None
+    size = 0
+    for chunk in fn(conn):
+        if first is None:
+            first = time.perf_counter() - start
+        size += len(chunk)
+    total = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return first, total, peak, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streamed CSV exports")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'variant':>9} {'first byte (ms)':>16} {'total (s)':>10} {'peak MB':>9}")
+    for rows in args.sizes:
+        conn = build_db(rows)
+        for name, fn in (('legacy', legacy), ('streamed', streamed)):
+            first, total, peak, _ = measure(fn, conn)
+            print(f"{rows:>9} {name:>9} {first * 1000:>16.2f} {total:>10.3f} {peak / 2**20:>9.2f}")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# benchmark: attendance heatmaps served from the disk cache vs rendered per request
+#
+#   python attendance_system/benchmarks/bench_heatmaps.py [--students 2000] [--days 250] [--requests 200]
+#
+# generates a dataset with fake_record.generate() into a temp directory and, for one class:
+#   - render: what the background job spends on the class heatmap and one student calendar (PNG + JSON)
+#   - 200: GET /heatmap/... through the Flask test client, served from the cached file
+#   - 304: the same GET with If-None-Match, what a dashboard reload costs
+# rendering on the request path would cost every request the render time instead.
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_record  # noqa: E402
+
+
+def median_ms(fn, n):
+    timings = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cached attendance heatmaps")
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=250)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        gen = fake_record.parser().parse_args(['--students', str(args.students), '--days', str(args.days), '--tests', '0'])
+        fake_record.generate(gen, path)
+        os.environ['ATTENDANCE_DB_PATH'] = path
+        os.environ['JOB_WORKER_THREADS'] = '0'
+        import app as attendance_app
+        import db
+        import heatmaps
+
+        app = attendance_app.app
+        conn = db.connection(path)
+        teacher_id, class_id = conn.execute("SELECT teacher_id, class_id FROM TeacherClassSubject ORDER BY class_id LIMIT 1").fetchone()
+        student_id, size = conn.execute("SELECT MIN(id), COUNT(*) FROM Student WHERE class_id = ?", (class_id,)).fetchone()
+        print(f"class {class_id}: {size} students x {args.days} days")
+
+        for target, target_id in (('class', class_id), ('student', student_id)):
+            start = time.perf_counter()
+            heatmaps.render(conn, target, target_id)
+            rendered = (time.perf_counter() - start) * 1000
+            png = os.path.getsize(heatmaps.path(target, target_id, heatmaps.version(conn, class_id), 'png'))
+
+            client = app.test_client()
+            with client.session_transaction() as session:
+                session['user_id'], session['role'], session['_user_id'] = teacher_id, 'teacher', str(teacher_id)
+            url = f"/heatmap/{target}/{target_id}.png"
+            tag = client.get(url).headers['ETag']
+            full = median_ms(lambda: client.get(url).close(), args.requests)
+            revalidated = median_ms(lambda: client.get(url, headers={'If-None-Match': tag}).close(), args.requests)
+            print(f"  {target:<8} render {rendered:8.1f} ms ({png / 1024:.0f} KB png)   "
+                  f"200 {full:6.2f} ms   304 {revalidated:6.2f} ms   ({rendered / revalidated:.0f}x)")
+
+
+if __name__ == '__main__':
+    main()
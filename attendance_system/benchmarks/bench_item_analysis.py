@@ -0,0 +1,127 @@
+# benchmark: what the item analysis (question_stats.record) adds to closing an IA
+#
+#   python attendance_system/benchmarks/bench_item_analysis.py [--students 1000] [--questions 40] [--repeat 5]
+#
+# builds a migrated database with one class, a question bank and a test every student of the class
+# has answered (about 5% of questions skipped), then closes copies of it with grading.grade_test
+# and reports the median of:
+#   - grade: grading and purge with the item analysis left out
+#   - grade + stats: grading.grade_test as the close_IA job runs it
+#   - stats alone: question_stats.record inside a transaction
+# question 1 has no answer key in the test; the run fails if it is credited with correct answers.
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import grading  # noqa: E402
+import migrations  # noqa: E402
+import question_stats  # noqa: E402
+
+TEST_ID = 'bench-test'
+
+
+def build(path, students, questions):
+    rng = random.Random(students * questions)
+    conn = sqlite3.connect(path, isolation_level=None)
+    migrations.migrate(conn)
+    conn.execute("BEGIN")
+    conn.execute("INSERT INTO Class (id, name) VALUES (1, 'Bench')")
+    conn.executemany(
+        '''INSERT INTO Question_Database (qid, question, option_A, option_B, option_C, option_D, ans, difficulty, subject)
+           VALUES (?, ?, 'a', 'b', 'c', 'd', ?, 'Medium', 'DBMS')''',
+        ((q, f"Question {q}", rng.choice('ABCD')) for q in range(1, questions + 1)),
+    )
+    conn.execute('''INSERT INTO Tests (test_id, subject, test_name, teacher_id, class_id, ia_date)
+                    VALUES (?, 'DBMS', 'Bench', 1, 1, '2025-03-01')''', (TEST_ID,))
+    conn.execute("INSERT INTO Test_Questions (test_id, qid, answer) SELECT ?, qid, ans FROM Question_Database", (TEST_ID,))
+    conn.execute("UPDATE Test_Questions SET answer = NULL WHERE test_id = ? AND qid = '1'", (TEST_ID,))
+    key = dict(conn.execute("SELECT qid, ans FROM Question_Database").fetchall())
+    rows = []
+    for s in range(students):
+        roll = f"R{s:05d}"
+        conn.execute("INSERT INTO Student (name, email, password, roll_number, class_id) VALUES (?, ?, 'x', ?, 1)",
+                     (roll, f"{roll}@example.edu", roll))
+        conn.execute("INSERT INTO IA_Submission (test_id, roll, status) VALUES (?, ?, 'submitted')", (TEST_ID, roll))
+        ability = rng.random()
+        for qid, answer in key.items():
+            if rng.random() < 0.05:
+                continue
+            rows.append((roll, str(qid), answer if rng.random() < 0.3 + 0.6 * ability else rng.choice('ABCD'), TEST_ID))
+    conn.executemany("INSERT INTO Test_Response (roll, qid, answer, test_id) VALUES (?, ?, ?, ?)", rows)
+    conn.execute("COMMIT")
+    conn.close()
+    return len(rows)
+
+
+def timed(template, tmp, fn, repeat):
+    timings = []
+    for i in range(repeat):
+        path = os.path.join(tmp, f"run{i}.db")
+        shutil.copyfile(template, path)
+        conn = sqlite3.connect(path, isolation_level=None)
+        start = time.perf_counter()
+        fn(conn)
+        timings.append(time.perf_counter() - start)
+        conn.close()
+        os.remove(path)
+    return statistics.median(timings) * 1000
+
+
+def stats_only(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    question_stats.record(conn, TEST_ID)
+    conn.execute("COMMIT")
+
+
+def check_unknown_key(template, tmp):
+    # the responses to question 1 still carry letters; without a key none of them is correct
+    path = os.path.join(tmp, 'check.db')
+    shutil.copyfile(template, path)
+    conn = sqlite3.connect(path, isolation_level=None)
+    stats_only(conn)
+    row = conn.execute("SELECT correct, p_value, discrimination FROM Question_Stats WHERE qid = 1").fetchone()
+    conn.close()
+    os.remove(path)
+    if row != (0, None, None):
+        sys.exit(f"question without a key: correct, p-value, discrimination = {row}, expected (0, None, None)")
+
+
+def grade_without_stats(conn):
+    record = question_stats.record
+    question_stats.record = lambda conn, test_id: 0
+    try:
+        grading.grade_test(conn, TEST_ID)
+    finally:
+        question_stats.record = record
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the item analysis at IA close")
+    parser.add_argument('--students', type=int, default=1000)
+    parser.add_argument('--questions', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        template = os.path.join(tmp, 'template.db')
+        responses = build(template, args.students, args.questions)
+        print(f"{args.students} students x {args.questions} questions, {responses:,} responses")
+        check_unknown_key(template, tmp)
+        plain = timed(template, tmp, grade_without_stats, args.repeat)
+        full = timed(template, tmp, lambda conn: grading.grade_test(conn, TEST_ID), args.repeat)
+        alone = timed(template, tmp, stats_only, args.repeat)
+        print(f"  grade            {plain:8.1f} ms")
+        print(f"  grade + stats    {full:8.1f} ms   (+{full - plain:.1f} ms)")
+        print(f"  stats alone      {alone:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
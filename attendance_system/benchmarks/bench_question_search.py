@@ -0,0 +1,111 @@
+# benchmark: FTS5 keyword search vs LIKE '%term%' scans over the question bank
+#
+#   python attendance_system/benchmarks/bench_question_search.py [--sizes 10000 100000 1000000]
+#
+# builds a synthetic Question_Database per size, indexes it with question_search.TABLES/TRIGGERS,
+# and reports the median time of a first page (50 rows plus the total count) for a common, a rare
+# and a two-word term.
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pagination  # noqa: E402
+import question_search  # noqa: E402
+
+SCHEMA = '''
+CREATE TABLE Question_Database (
+    qid INTEGER PRIMARY KEY AUTOINCREMENT,
+    question TEXT NOT NULL,
+    option_A TEXT NOT NULL,
+    option_B TEXT NOT NULL,
+    option_C TEXT NOT NULL,
+    option_D TEXT NOT NULL,
+    ans TEXT NOT NULL,
+    difficulty TEXT NOT NULL,
+    subject TEXT NOT NULL)
+'''
+
+WORDS = (
+    "algorithm complexity sort merge quick heap graph tree binary search hash table queue stack "
+    "pointer recursion dynamic programming greedy shortest path spanning minimum maximum flow network "
+    "database index transaction normal form relation join query schema key lock deadlock process thread "
+    "memory cache page virtual scheduling kernel file system protocol packet router layer encryption"
+).split()
+RARE = "kruskal"
+TERMS = [('common', 'algorithm'), ('rare', RARE), ('two words', 'binary tree')]
+REPEAT = 5
+
+
+def sentence(rng, n):
+    return ' '.join(rng.choice(WORDS) for _ in range(n))
+
+
+def build_db(rows):
+    rng = random.Random(rows)
+    conn = sqlite3.connect(':memory:')
+    conn.execute(SCHEMA)
+    conn.executemany(
+        "INSERT INTO Question_Database (question, option_A, option_B, option_C, option_D, ans, difficulty, subject) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        ((sentence(rng, 12) + (f" {RARE}" if i % 5000 == 0 else ''), sentence(rng, 3), sentence(rng, 3),
+          sentence(rng, 3), sentence(rng, 3), rng.choice('ABCD'), rng.choice(('Easy', 'Medium', 'Hard')),
+          rng.choice(('DAA', 'DBMS', 'OS', 'CN'))) for i in range(rows)),
+    )
+    for sql in question_search.TABLES + question_search.TRIGGERS:
+        conn.execute(sql)
+    conn.execute(question_search.REBUILD)
+    conn.commit()
+    return conn
+
+
+def like_search(conn, text):
+    # the LIKE equivalent of a first page: every word in any text column, plus the total for the pager.
+    # there is no relevance order to give, so it pages by qid.
+    clauses = []
+    params = []
+    for word in text.split():
+        clauses.append("(question LIKE ? OR option_A LIKE ? OR option_B LIKE ? OR option_C LIKE ? OR option_D LIKE ?)")
+        params += [f"%{word}%"] * 5
+    where = " WHERE " + " AND ".join(clauses)
+    total = conn.execute("SELECT COUNT(*) FROM Question_Database" + where, params).fetchone()[0]
+    rows = conn.execute("SELECT qid, question FROM Question_Database" + where + " ORDER BY qid LIMIT 50", params).fetchall()
+    return total, rows
+
+
+def fts_search(conn, text):
+    return question_search.search(conn, text, limit=50).rows
+
+
+def median_ms(fn, conn, text):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn(conn, text)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FTS5 question search against LIKE scans")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+    pagination.COUNT_TTL = 0  # time the total count on every run, as a first page would
+
+    print(f"{'rows':>9} {'term':>10} {'LIKE (ms)':>10} {'FTS5 (ms)':>10} {'speedup':>8}")
+    for rows in args.sizes:
+        conn = build_db(rows)
+        for label, text in TERMS:
+            like = median_ms(like_search, conn, text)
+            fts = median_ms(fts_search, conn, text)
+            print(f"{rows:>9} {label:>10} {like:>10.2f} {fts:>10.2f} {like / fts:>7.1f}x")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
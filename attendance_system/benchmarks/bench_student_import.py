@@ -0,0 +1,96 @@
+# benchmark: bulk student import pipeline vs the old per-row iterrows() loop
+#
+#   python attendance_system/benchmarks/bench_student_import.py [--rows 3000] [--rounds 12] [--workers N]
+#
+# bcrypt dominates at the default cost (12), so the speedup of the pipeline is roughly the number
+# of cores; run with a low --rounds to see the database side on its own.
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import migrations  # noqa: E402
+import student_import  # noqa: E402
+
+DEPARTMENTS = ["Computer Science and Engineering", "Bachelor of Computer Applications"]
+CLASSES = ["Division 1", "Division 2", "Division 3"]
+
+
+def legacy_import(conn, filepath, rounds):
+    # the loop add_students_from_excel used before student_import
+    df = pd.read_excel(filepath)
+    cursor = conn.cursor()
+    for _, row in df.iterrows():
+        password = student_import._hash_password(str(row['Password']), rounds)
+        cursor.execute("SELECT id FROM Department WHERE name = ?", (row['Department Name'],))
+        department_id = cursor.fetchone()[0]
+        cursor.execute("SELECT id FROM Class WHERE name = ? and department_id = ?", (row['Class Name'], department_id))
+        class_id = cursor.fetchone()[0]
+        cursor.execute("INSERT INTO users (email, password, role) VALUES (?, ?, 'student')", (row['Email'], password))
+        user_id = cursor.lastrowid
+        cursor.execute("INSERT INTO Student (user_id, name, roll_number, class_id, email, password) VALUES (?, ?, ?, ?, ?, ?)",
+                       (user_id, row['Name'], row['Roll Number'], class_id, row['Email'], password))
+    conn.commit()
+
+
+def build_db(path):
+    conn = sqlite3.connect(path)
+    for pragma in db.PRAGMAS:
+        conn.execute(pragma)
+    migrations.migrate(conn)
+    for dept_id, dept in enumerate(DEPARTMENTS, start=1):
+        conn.execute("INSERT INTO Department (id, name, school_id) VALUES (?, ?, 1)", (dept_id, dept))
+        for name in CLASSES:
+            conn.execute("INSERT INTO Class (name, department_id) VALUES (?, ?)", (name, dept_id))
+    conn.commit()
+    return conn
+
+
+def build_sheet(path, rows):
+    rng = random.Random(7)
+    data = [[f"Student {i}", f"student{i}@example.com", str(rng.randint(100, 999)), f"R{i:06d}",
+             rng.choice(CLASSES), rng.choice(DEPARTMENTS)] for i in range(rows)]
+    pd.DataFrame(data, columns=student_import.COLUMNS).to_excel(path, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the bulk student import pipeline")
+    parser.add_argument('--rows', type=int, default=3000)
+    parser.add_argument('--rounds', type=int, default=12, help='bcrypt cost factor')
+    parser.add_argument('--workers', type=int, default=None, help='hashing threads (default: all cores)')
+    parser.add_argument('--skip-legacy', action='store_true')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sheet = os.path.join(tmp, 'students.xlsx')
+        build_sheet(sheet, args.rows)
+
+        conn = build_db(os.path.join(tmp, 'pipeline.db'))
+        start = time.perf_counter()
+        summary = student_import.import_students(conn, sheet, rounds=args.rounds, workers=args.workers)
+        pipeline = time.perf_counter() - start
+        conn.close()
+
+        print(f"rows={args.rows} bcrypt rounds={args.rounds} cores={os.cpu_count()} workers={args.workers or os.cpu_count()}")
+        print(f"pipeline: {pipeline:8.2f} s  {args.rows / pipeline:8.1f} rows/s  stages={summary['seconds']}")
+
+        if not args.skip_legacy:
+            conn = build_db(os.path.join(tmp, 'legacy.db'))
+            start = time.perf_counter()
+            legacy_import(conn, sheet, args.rounds)
+            legacy = time.perf_counter() - start
+            conn.close()
+            print(f"legacy:   {legacy:8.2f} s  {args.rows / legacy:8.1f} rows/s")
+            print(f"speedup:  {legacy / pipeline:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
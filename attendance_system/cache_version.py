@@ -0,0 +1,40 @@
+# cross-worker cache invalidation
+# every in-process cache is tagged with a named version counter stored in the Cache_Version table.
+# a write that changes cached data bumps the counter in its own transaction; other gunicorn workers
+# notice on their next check and drop their copy. workers re-read the (tiny) table at most once
+# per CHECK_INTERVAL, so a cache hit normally costs no database round trip at all.
+import threading
+import time
+
+CHECK_INTERVAL = 1.0  # seconds a worker trusts its last read of Cache_Version
+
+_versions = {}
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def versions(conn):
+    global _versions, _checked_at
+    now = time.monotonic()
+    if now - _checked_at > CHECK_INTERVAL:
+        fresh = dict(conn.execute("SELECT name, version FROM Cache_Version").fetchall())
+        with _lock:
+            _versions = fresh
+            _checked_at = now
+    return _versions
+
+
+def get(conn, name):
+    return versions(conn).get(name, 0)
+
+
+def bump(conn, name):
+    # call inside the transaction that changes the data; the caller commits
+    global _checked_at
+    conn.execute(
+        "INSERT INTO Cache_Version (name, version) VALUES (?, 1) "
+        "ON CONFLICT(name) DO UPDATE SET version = version + 1",
+        (name,),
+    )
+    with _lock:
+        _checked_at = 0.0  # this worker re-reads on its next check
@@ -0,0 +1,55 @@
+# streaming CSV exports
+# rows are pulled from the cursor with fetchmany() (or from any iterable of rows) and written through csv.writer a chunk at a time,
+# so memory stays flat and the first bytes go out before the report is complete. when the client
+# accepts it, the stream is gzip-compressed on the fly.
+import csv
+import io
+import itertools
+import zlib
+
+from flask import Response, current_app, request, stream_with_context
+
+CHUNK_ROWS = 1000
+
+
+def iter_csv(header, cursor, chunk_rows=CHUNK_ROWS):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    if hasattr(cursor, 'fetchmany'):
+        fetch = lambda: cursor.fetchmany(chunk_rows)  # noqa: E731
+    else:
+        rows_iter = iter(cursor)
+        fetch = lambda: list(itertools.islice(rows_iter, chunk_rows))  # noqa: E731
+    while True:
+        rows = fetch()
+        if rows:
+            writer.writerows(rows)
+        if buf.tell():
+            yield buf.getvalue().encode('utf-8')
+            buf.seek(0)
+            buf.truncate(0)
+        if not rows:
+            break
+
+
+def gzip_stream(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def wants_gzip():
+    return current_app.config.get('CSV_GZIP', True) and 'gzip' in request.headers.get('Accept-Encoding', '')
+
+
+def csv_response(header, cursor, filename):
+    chunks = iter_csv(header, cursor)
+    headers = {"Content-Disposition": f"attachment; filename={filename}", "Vary": "Accept-Encoding"}
+    if wants_gzip():
+        chunks = gzip_stream(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return Response(stream_with_context(chunks), mimetype="text/csv", headers=headers)
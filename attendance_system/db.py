@@ -0,0 +1,104 @@
+# shared database access layer
+# every route gets its connection from get_db() instead of calling sqlite3.connect(DB_PATH) itself.
+# each gunicorn worker keeps one long-lived connection per thread, configured once when it is opened,
+# and the connection is bound to the Flask app context through `g`.
+import os
+import sqlite3
+import threading
+import time
+
+from flask import g
+
+# PRAGMAs applied once when a connection is opened
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA mmap_size = 268435456",    # 256 MB
+    "PRAGMA cache_size = -65536",      # 64 MB (negative value = KiB)
+    "PRAGMA busy_timeout = 5000",      # ms
+    "PRAGMA temp_store = MEMORY",
+)
+
+_local = threading.local()
+_lock = threading.Lock()
+_open_connections = 0
+_db_path = None
+_factory = sqlite3.Connection
+_attached = {}            # schema name -> path, ATTACHed to every per-thread connection
+
+
+def _connect(path):
+    global _open_connections
+    conn = sqlite3.connect(path, timeout=5, factory=_factory)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    with _lock:
+        _open_connections += 1
+    return conn
+
+
+def connection(path=None):
+    # per-thread connection; re-opened after a fork so workers never share the master's handle
+    path = path or _db_path
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.pid != os.getpid() or _local.path != path:
+        conn = _connect(path)
+        _local.conn = conn
+        _local.pid = os.getpid()
+        _local.path = path
+        _local.attached = set()
+    if len(_local.attached) != len(_attached):
+        # also catches up a connection opened before attach() was called (e.g. by fake_record.py)
+        for name in _attached.keys() - _local.attached:
+            conn.execute(f"ATTACH DATABASE ? AS {name}", (_attached[name],))
+            _local.attached.add(name)
+    return conn
+
+
+def set_connection_factory(factory):
+    # sqlite3.Connection subclass for connections opened from now on (profiling.ProfiledConnection)
+    global _factory
+    _factory = factory
+
+
+def attach(name, path):
+    # a second database file reachable as name.Table from every connection (archive.py)
+    _attached[name] = path
+
+
+def get_db():
+    if 'db' not in g:
+        start = time.perf_counter()
+        g.db = connection()
+        g.db_checkout_ms = (time.perf_counter() - start) * 1000
+    return g.db
+
+
+def close_db(exc=None):
+    # the connection stays open for the next request, only a half-finished transaction is discarded
+    conn = g.pop('db', None)
+    if conn is not None and conn.in_transaction:
+        conn.rollback()
+
+
+def pool_stats():
+    return {
+        'open_connections': _open_connections,
+        'pid': os.getpid(),
+        'checkout_ms': g.get('db_checkout_ms'),
+    }
+
+
+def init_app(app, path):
+    global _db_path
+    _db_path = path
+    app.config.setdefault('DB_POOL_STATS', os.environ.get('DB_POOL_STATS') == '1')
+    app.teardown_appcontext(close_db)
+
+    @app.after_request
+    def add_pool_stats(response):
+        # opt-in: expose checkout time and open connection count on every response
+        if app.config['DB_POOL_STATS'] and 'db_checkout_ms' in g:
+            response.headers['X-DB-Checkout-Ms'] = f"{g.db_checkout_ms:.3f}"
+            response.headers['X-DB-Open-Connections'] = str(_open_connections)
+        return response
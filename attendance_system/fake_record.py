@@ -1,56 +1,269 @@
-# create fake record 
-import pandas as pd
+# create fake records
+# a reproducible synthetic dataset at a chosen scale, for load tests and benchmarks:
+#
+#   python attendance_system/fake_record.py --db /tmp/bench.db --students 5000 --days 120
+#   python attendance_system/fake_record.py --excel student_records.xlsx --students 100
+#
+# --db builds a fresh database through migrations.migrate() and fills every table the app reads:
+# schools, departments, classes, teachers and their TeacherClassSubject assignments, students,
+# weekday Attendance, a question bank per subject, and IA tests per class with variants and the
+# responses of the students who submitted. the last test of every class is graded (closed) with
+# grading.grade_test, the others stay open for give_IA / close_IA. every login uses PASSWORD.
+# --excel writes students in the upload_students format instead (the original use of this file).
+# the same arguments and --seed always produce the same data.
+import argparse
+import datetime
+import os
 import random
-from faker import Faker
-
-# Initialize Faker
-fake = Faker()
-
-# Define parameters
-departments = {
-    "Computer Science and Engineering": "CS",
-    "Bachelor of Computer Applications": "BCA"
-}
-classes = ["Division 1", "Division 2", "Division 3"]
-num_records = 100
-students_per_division = num_records // len(classes)  # Approximate distribution
-password = "456"
-
-# Roll number counters
-roll_number_counters = {"CS": 1, "BCA": 1}
-division_ranges = {"CS": {}, "BCA": {}}
-data = []
-unique_emails = set()
-
-# Assign divisions based on roll number range
-for dept_short in roll_number_counters.keys():
-    count = 1
-    for division in classes:
-        division_ranges[dept_short][division] = list(range(count, count + students_per_division // 2))
-        count += students_per_division // 2
-
-# Generate data
-for dept_name, dept_short in departments.items():
-    for division, roll_numbers in division_ranges[dept_short].items():
-        for roll_num in roll_numbers:
-            roll_number = f"{dept_short}{roll_num:03d}"
-            
-            # Generate a realistic name
-            name = fake.first_name() + " " + fake.last_name()
-            
-            # Ensure unique email
-            email = f"{name.lower().replace(' ', '.')}{random.randint(100,999)}@gmail.com"
-            while email in unique_emails:
-                email = f"{name.lower().replace(' ', '.')}{random.randint(100,999)}@gmail.com"
-            unique_emails.add(email)
-
-            data.append([name, email, password, roll_number, division, dept_name])
-
-# Create DataFrame
-df = pd.DataFrame(data, columns=["Name", "Email", "Password", "Roll Number", "Class Name", "Department Name"])
-
-# Save to Excel
-file_path = "student_records.xlsx"
-df.to_excel(file_path, index=False)
-
-print(f"Excel file saved as {file_path}")
+import sys
+import uuid
+
+import bcrypt
+import pandas as pd
+
+import db
+import grading
+import ia_papers
+import migrations
+import question_import
+
+PASSWORD = "123"
+ADMIN_EMAIL = "admin@example.com"
+SUBJECTS = ['DBMS', 'DAA', 'OS', 'CN']
+DIFFICULTIES = ['Easy', 'Medium', 'Hard']
+SCHOOLS = ["School of Engineering", "School of Computing", "School of Sciences", "School of Management"]
+DEPARTMENTS = [
+    ("Computer Science and Engineering", "CS"), ("Bachelor of Computer Applications", "BCA"),
+    ("Information Technology", "IT"), ("Electronics and Communication", "EC"),
+    ("Mechanical Engineering", "ME"), ("Civil Engineering", "CE"),
+]
+FIRST_NAMES = (
+    "Aarav Vivaan Aditya Vihaan Arjun Sai Reyansh Ayaan Krishna Ishaan Ananya Diya Saanvi Aadhya Kiara "
+    "Myra Aarohi Anika Navya Pari Rohan Kabir Meera Nisha Priya Rahul Sneha Tanvi Varun Zoya"
+).split()
+LAST_NAMES = (
+    "Shah Patel Trivedi Mehta Desai Joshi Iyer Nair Reddy Gupta Sharma Verma Rao Kulkarni Pandey "
+    "Chopra Bhatt Menon Pillai Kapoor"
+).split()
+WORDS = (
+    "algorithm complexity sort merge heap graph tree binary search hash table queue stack pointer "
+    "recursion dynamic programming greedy path spanning flow network database index transaction normal "
+    "form relation join query schema key lock deadlock process thread memory cache page virtual "
+    "scheduling kernel file system protocol packet router layer"
+).split()
+
+
+def hash_password(rounds):
+    # one hash shared by every generated account; hashing each one would dominate the run time
+    return bcrypt.hashpw(PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _name(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def _weekdays(end, count):
+    days = []
+    day = end
+    while len(days) < count:
+        if day.weekday() < 5:
+            days.append(day.isoformat())
+        day -= datetime.timedelta(days=1)
+    return days[::-1]
+
+
+def _layout(args):
+    # [(school, [(department, code, [class names])])] sized from the arguments
+    layout = []
+    index = 0
+    for s in range(args.schools):
+        school = SCHOOLS[s % len(SCHOOLS)] + (f" {s // len(SCHOOLS) + 1}" if s >= len(SCHOOLS) else '')
+        departments = []
+        for _ in range(args.departments):
+            name, code = DEPARTMENTS[index % len(DEPARTMENTS)]
+            if index >= len(DEPARTMENTS):
+                name, code = f"{name} {index // len(DEPARTMENTS) + 1}", f"{code}{index // len(DEPARTMENTS) + 1}"
+            departments.append((name, code, [f"Division {c + 1}" for c in range(args.classes)]))
+            index += 1
+        layout.append((school, departments))
+    return layout
+
+
+def student_rows(args, rng):
+    # [(name, email, roll, class name, department name, department code)], spread over the classes
+    classes = [(dept, code, cls) for _, departments in _layout(args) for dept, code, names in departments for cls in names]
+    counters = {}
+    rows = []
+    for i in range(args.students):
+        dept, code, cls = classes[i % len(classes)]
+        counters[code] = counters.get(code, 0) + 1
+        roll = f"{code}{counters[code]:05d}"
+        rows.append((_name(rng), f"{roll.lower()}@students.example.edu", roll, cls, dept, code))
+    return rows
+
+
+def write_excel(args, path):
+    rng = random.Random(args.seed)
+    data = [[name, email, PASSWORD, roll, cls, dept] for name, email, roll, cls, dept, _ in student_rows(args, rng)]
+    df = pd.DataFrame(data, columns=["Name", "Email", "Password", "Roll Number", "Class Name", "Department Name"])
+    df.to_excel(path, index=False)
+    return len(df)
+
+
+def _question_bank(conn, args, rng):
+    rows = []
+    for subject in SUBJECTS:
+        for i in range(args.questions):
+            question = f"{subject} Q{i + 1}: " + ' '.join(rng.choice(WORDS) for _ in range(10)) + '?'
+            options = [' '.join(rng.choice(WORDS) for _ in range(3)) for _ in range(4)]
+            rows.append((question, *options, rng.choice('ABCD'), DIFFICULTIES[i % 3], subject,
+                         question_import.question_hash(subject, question)))
+    conn.executemany(question_import.UPSERT, rows)
+
+
+def _tests(conn, args, rng, classes, days):
+    # per class: args.tests IAs over the attendance period, the last one graded afterwards
+    closed = []
+    bank = {}
+    for subject in SUBJECTS:
+        bank[subject] = conn.execute("SELECT qid, ans FROM Question_Database WHERE subject = ?", (subject,)).fetchall()
+    for class_id, teacher_id, subject in classes:
+        students = [row[0] for row in conn.execute("SELECT roll_number FROM Student WHERE class_id = ? ORDER BY id", (class_id,))]
+        ability = {roll: rng.uniform(0.3, 0.95) for roll in students}
+        for t in range(args.tests):
+            test_id = str(uuid.UUID(int=rng.getrandbits(128)))
+            ia_date = days[(t + 1) * len(days) // (args.tests + 1)]
+            conn.execute(
+                "INSERT INTO Tests (test_id, subject, test_name, teacher_id, class_id, ia_date) VALUES (?, ?, ?, ?, ?, ?)",
+                (test_id, subject, f"IA {t + 1}", teacher_id, class_id, ia_date),
+            )
+            picked = rng.sample(bank[subject], min(args.questions_per_test, len(bank[subject])))
+            conn.executemany("INSERT INTO Test_Questions (test_id, qid, answer) VALUES (?, ?, ?)",
+                             [(test_id, qid, ans) for qid, ans in picked])
+            ia_papers.generate(conn, test_id)
+            responses = []
+            submitted = []
+            for roll in students:
+                if rng.random() >= args.submitted:
+                    continue
+                submitted.append((test_id, roll))
+                for qid, ans in picked:
+                    answer = ans if rng.random() < ability[roll] else rng.choice('ABCD')
+                    responses.append((roll, qid, answer, test_id))
+            conn.executemany("INSERT INTO Test_Response (roll, qid, answer, test_id) VALUES (?, ?, ?, ?)", responses)
+            conn.executemany("INSERT INTO IA_Submission (test_id, roll, status) VALUES (?, ?, 'submitted')", submitted)
+            if t == args.tests - 1:
+                closed.append(test_id)
+    return closed
+
+
+def generate(args, path):
+    # builds the database at path; returns the row count of every table filled
+    if os.path.exists(path):
+        if not args.overwrite:
+            raise FileExistsError(f"{path} exists, pass --overwrite to replace it")
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    rng = random.Random(args.seed)
+    password = hash_password(args.rounds)
+    conn = db.connection(path)
+    migrations.migrate(conn)
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("INSERT INTO users (email, password, role) VALUES (?, ?, 'admin')", (ADMIN_EMAIL, password))
+        class_ids = {}
+        for school, departments in _layout(args):
+            school_id = conn.execute("INSERT INTO School (name) VALUES (?)", (school,)).lastrowid
+            for dept, code, names in departments:
+                dept_id = conn.execute("INSERT INTO Department (name, school_id) VALUES (?, ?)", (dept, school_id)).lastrowid
+                for cls in names:
+                    class_ids[(dept, cls)] = conn.execute(
+                        "INSERT INTO Class (name, department_id) VALUES (?, ?)", (cls, dept_id)
+                    ).lastrowid
+
+        # one teacher per class by default, each teaching one subject
+        teachers = []
+        for i in range(args.teachers or len(class_ids)):
+            email = f"teacher{i + 1}@example.edu"
+            user_id = conn.execute("INSERT INTO users (email, password, role) VALUES (?, ?, 'teacher')", (email, password)).lastrowid
+            subject = SUBJECTS[i % len(SUBJECTS)]
+            conn.execute("INSERT INTO Teacher (name, email, password, user_id, subject) VALUES (?, ?, ?, ?, ?)",
+                         (_name(rng), email, password, user_id, subject))
+            teachers.append((user_id, subject))
+        classes = []
+        for i, class_id in enumerate(class_ids.values()):
+            teacher_id, subject = teachers[i % len(teachers)]
+            conn.execute("INSERT INTO TeacherClassSubject (teacher_id, class_id) VALUES (?, ?)", (teacher_id, class_id))
+            classes.append((class_id, teacher_id, subject))
+
+        for name, email, roll, cls, dept, _ in student_rows(args, rng):
+            user_id = conn.execute("INSERT INTO users (email, password, role) VALUES (?, ?, 'student')", (email, password)).lastrowid
+            conn.execute("INSERT INTO Student (name, email, password, roll_number, class_id, user_id) VALUES (?, ?, ?, ?, ?, ?)",
+                         (name, email, password, roll, class_ids[(dept, cls)], user_id))
+
+        # weekday attendance; every student has their own attendance rate
+        days = _weekdays(datetime.date.fromisoformat(args.end_date), args.days)
+        # marked by the class's teacher
+        teacher_of = {class_id: teacher_id for class_id, teacher_id, _ in classes}
+        students = conn.execute("SELECT id, class_id FROM Student ORDER BY id").fetchall()
+        rates = {student_id: rng.uniform(0.55, 0.98) for student_id, _ in students}
+        markers = {student_id: teacher_of[class_id] for student_id, class_id in students}
+        conn.executemany(
+            "INSERT INTO Attendance (student_id, date, status, marked_by) VALUES (?, ?, ?, ?)",
+            ((student_id, day, 'Present' if rng.random() < rate else 'Absent', markers[student_id])
+             for day in days for student_id, rate in rates.items()),
+        )
+
+        _question_bank(conn, args, rng)
+        closed = _tests(conn, args, rng, classes, days)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    for test_id in closed:
+        grading.grade_test(conn, test_id)
+    conn.execute("ANALYZE")
+    conn.commit()
+    tables = ['School', 'Department', 'Class', 'Teacher', 'TeacherClassSubject', 'Student', 'Attendance',
+              'Question_Database', 'Tests', 'Test_Questions', 'Test_Response', 'Student_result']
+    return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in tables}
+
+
+def parser():
+    p = argparse.ArgumentParser(description="Generate a synthetic attendance/IA dataset")
+    p.add_argument('--db', help="database file to create")
+    p.add_argument('--excel', help="write the students as an upload_students sheet instead")
+    p.add_argument('--overwrite', action='store_true', help="replace an existing --db file")
+    p.add_argument('--seed', type=int, default=1)
+    p.add_argument('--schools', type=int, default=2)
+    p.add_argument('--departments', type=int, default=2, help="per school")
+    p.add_argument('--classes', type=int, default=3, help="per department")
+    p.add_argument('--teachers', type=int, default=0, help="default: one per class")
+    p.add_argument('--students', type=int, default=100)
+    p.add_argument('--days', type=int, default=60, help="weekdays of attendance")
+    p.add_argument('--end-date', default='2025-03-31')
+    p.add_argument('--questions', type=int, default=300, help="per subject")
+    p.add_argument('--tests', type=int, default=3, help="per class; the last one is graded")
+    p.add_argument('--questions-per-test', type=int, default=20)
+    p.add_argument('--submitted', type=float, default=0.8, help="fraction of a class that submitted each IA")
+    p.add_argument('--rounds', type=int, default=12, help="bcrypt rounds of the shared password hash")
+    return p
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    if args.excel or not args.db:
+        path = args.excel or "student_records.xlsx"
+        print(f"Excel file saved as {path} ({write_excel(args, path)} students)")
+    if args.db:
+        counts = generate(args, args.db)
+        for table, count in counts.items():
+            print(f"{table:>20} {count}")
+        print(f"logins: {ADMIN_EMAIL}, teacher1@example.edu, <roll>@students.example.edu; password {PASSWORD}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,46 @@
+# set-based IA grading
+# one aggregate join of Test_Response against Test_Questions, grouped by roll, feeds a single
+# INSERT ... SELECT into Student_result. students of the class with no responses are filled in
+# with 0 marks by the LEFT JOIN from Student, and everything runs in one write transaction.
+# the item analysis (question_stats.py) is taken in the same transaction, before the responses go.
+import question_stats
+
+GRADE_SQL = '''
+    INSERT INTO Student_result (roll, class_id, test_id, markes, total_markes)
+    SELECT Student.roll_number, Student.class_id, :test_id, COALESCE(scores.markes, 0), :total_markes
+    FROM Student
+    LEFT JOIN (
+        SELECT Test_Response.roll AS roll, COUNT(*) AS markes
+        FROM Test_Response
+        JOIN Test_Questions ON Test_Questions.test_id = Test_Response.test_id
+                           AND Test_Questions.qid = Test_Response.qid
+        WHERE Test_Response.test_id = :test_id AND Test_Response.answer = Test_Questions.answer
+        GROUP BY Test_Response.roll
+    ) AS scores ON scores.roll = Student.roll_number
+    WHERE Student.class_id = :class_id
+'''
+
+
+def grade_test(conn, test_id, purge=True):
+    # returns the number of Student_result rows written, or None if the test does not exist
+    row = conn.execute("SELECT class_id FROM Tests WHERE test_id = ?", (test_id,)).fetchone()
+    if row is None:
+        return None
+    class_id = row[0]
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        total_markes = conn.execute("SELECT count(qid) FROM Test_Questions WHERE test_id = ?", (test_id,)).fetchone()[0]
+        graded = conn.execute(GRADE_SQL, {'test_id': test_id, 'class_id': class_id, 'total_markes': total_markes}).rowcount
+        question_stats.record(conn, test_id)
+        if purge:
+            conn.execute("DELETE FROM Test_Response WHERE test_id = ?", (test_id,))
+            conn.execute("DELETE FROM Test_Questions WHERE test_id = ?", (test_id,))
+            conn.execute("DELETE FROM Test_Variants WHERE test_id = ?", (test_id,))
+            # Student_result now answers "already submitted" for this test
+            conn.execute("DELETE FROM IA_Submission WHERE test_id = ?", (test_id,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return graded
@@ -0,0 +1,209 @@
+# attendance heatmaps, rendered off the request path and cached on disk
+# a class heatmap (student x day) and a per-student calendar (weekday x week), each as a PNG drawn
+# with matplotlib's Agg backend and as JSON with the same cells. files are named after the target
+# and the class's attendance Cache_Version (bumped by attendance.mark()), so a file on disk is valid
+# until the next mark and can be served with a fixed ETag; a request never renders. marking a class
+# queues a render of its heatmap; a student calendar, or a class heatmap that isn't there yet, is
+# queued by the first request for it, which gets 202 until the job has written the file.
+import calendar
+import datetime
+import glob
+import io
+import json
+import os
+import threading
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.colors import ListedColormap
+from matplotlib.figure import Figure
+
+import attendance
+import attendance_analytics
+import cache_version
+import jobs
+
+FORMATS = {'png': 'image/png', 'json': 'application/json'}
+MAX_RENDERS = 3            # re-renders when the attendance changes while a render is in progress
+CELLS = '.AP'              # cell codes: not recorded, absent, present
+COLORS = ListedColormap(['#eeeeee', '#d73027', '#1a9850'])
+DPI = 100
+
+_dir = None
+_render_lock = threading.Lock()   # one savefig at a time per worker: figures are pyplot-free, font caches are shared
+_stats = {'hits': 0, 'misses': 0, 'rendered': 0}
+
+
+def init_app(app, directory):
+    global _dir
+    _dir = directory
+    os.makedirs(directory, exist_ok=True)
+    app.config.setdefault('HEATMAP_DIR', directory)
+
+
+def path(target, target_id, version, fmt):
+    return os.path.join(_dir, f"{target}-{int(target_id)}-v{version}.{fmt}")
+
+
+def etag(target, target_id, version):
+    return f"{target}-{int(target_id)}-v{version}"
+
+
+def class_of(conn, target, target_id):
+    # the class whose attendance the heatmap shows, None if there is no such class/student
+    if target == 'class':
+        row = conn.execute("SELECT id FROM Class WHERE id = ?", (target_id,)).fetchone()
+    else:
+        row = conn.execute("SELECT class_id FROM Student WHERE id = ?", (target_id,)).fetchone()
+    return row[0] if row and row[0] is not None else None
+
+
+def version(conn, class_id):
+    # read from the table rather than cache_version.get(), whose copy may be a second old
+    row = conn.execute("SELECT version FROM Cache_Version WHERE name = ?", (attendance.version_name(class_id),)).fetchone()
+    return row[0] if row else 0
+
+
+def cached(conn, class_id, target, target_id, fmt):
+    # (path, etag) of the file for the current version, None if it hasn't been rendered yet
+    current = cache_version.get(conn, attendance.version_name(class_id))
+    filename = path(target, target_id, current, fmt)
+    if not os.path.exists(filename):
+        _stats['misses'] += 1
+        return None
+    _stats['hits'] += 1
+    return filename, etag(target, target_id, current)
+
+
+def schedule(conn, target, target_id):
+    return jobs.enqueue(conn, 'render_heatmap', {'target': target, 'id': int(target_id)},
+                        dedupe_key=f"heatmap:{target}:{int(target_id)}")
+
+
+def _write(filename, data):
+    # atomic, so a request never serves a half-written file
+    tmp = f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, filename)
+
+
+def _prune(target, target_id, keep):
+    # older versions of the same target; in-flight .tmp files don't match
+    current = {path(target, target_id, keep, fmt) for fmt in FORMATS}
+    for fmt in FORMATS:
+        for old in glob.glob(os.path.join(_dir, f"{target}-{int(target_id)}-v*.{fmt}")):
+            if old not in current:
+                try:
+                    os.remove(old)
+                except FileNotFoundError:
+                    pass
+
+
+def _png(fig):
+    FigureCanvasAgg(fig)
+    buffer = io.BytesIO()
+    with _render_lock:
+        fig.savefig(buffer, format='png', dpi=DPI)
+    return buffer.getvalue()
+
+
+def _class_figure(title, students, days, cells):
+    n, d = cells.shape
+    fig = Figure(figsize=(min(4 + d * 0.04, 30), min(2 + n * 0.15, 40)), layout='constrained')
+    ax = fig.add_subplot()
+    ax.imshow(cells, aspect='auto', interpolation='nearest', cmap=COLORS, vmin=0, vmax=2)
+    starts = [i for i, day in enumerate(days) if day.day == 1 or i == 0]
+    ax.set_xticks(starts, [days[i].strftime('%b %Y') for i in starts], rotation=45, ha='right')
+    if n <= 80:
+        ax.set_yticks(range(n), [roll for _, roll, _ in students], fontsize=7)
+    else:
+        ax.set_yticks([])
+        ax.set_ylabel(f"{n} students")
+    ax.set_title(title)
+    return fig
+
+
+def _calendar(days, row):
+    # (7, weeks) grid from Monday of the first week; -1 outside the period
+    offset = days[0].weekday()
+    weeks = (offset + len(days) + 6) // 7
+    grid = np.full(7 * weeks, -1, dtype=np.int8)
+    grid[offset:offset + len(days)] = row
+    return grid.reshape(weeks, 7).T, offset
+
+
+def _student_figure(title, days, grid):
+    weeks = grid.shape[1]
+    fig = Figure(figsize=(max(3, 1.5 + weeks * 0.22), 2.4), layout='constrained')
+    ax = fig.add_subplot()
+    ax.imshow(np.ma.masked_less(grid, 0), aspect='equal', interpolation='nearest', cmap=COLORS, vmin=0, vmax=2)
+    monday = days[0] - datetime.timedelta(days=days[0].weekday())
+    firsts = sorted({(monday + datetime.timedelta(weeks=w)).replace(day=1) for w in range(weeks)})
+    ticks = [((first - monday).days // 7, first.strftime('%b')) for first in firsts if first >= monday]
+    ax.set_xticks([w for w, _ in ticks], [label for _, label in ticks], fontsize=7)
+    ax.set_yticks(range(7), [name[:3] for name in calendar.day_name], fontsize=7)
+    ax.set_title(title, fontsize=9)
+    return fig
+
+
+def _render_class(conn, class_id, current):
+    students, days, marked, present = attendance_analytics.load(conn, class_id)
+    cells = marked.astype(np.int8) + present
+    name = conn.execute("SELECT name FROM Class WHERE id = ?", (class_id,)).fetchone()
+    title = f"{name[0] if name else f'Class {class_id}'}: attendance"
+    document = {
+        'class_id': class_id, 'version': current, 'dates': [day.isoformat() for day in days],
+        'students': [
+            {'student_id': student_id, 'roll_number': roll, 'name': student_name,
+             'cells': ''.join(CELLS[c] for c in cells[i].tolist())}
+            for i, (student_id, roll, student_name) in enumerate(students)
+        ],
+    }
+    _write(path('class', class_id, current, 'json'), json.dumps(document).encode())
+    fig = _class_figure(title, students, days, cells) if students and days else Figure(figsize=(3, 1))
+    _write(path('class', class_id, current, 'png'), _png(fig))
+
+
+def _render_student(conn, student_id, class_id, current):
+    students, days, marked, present = attendance_analytics.load(conn, class_id)
+    rows = [i for i, (sid, _, _) in enumerate(students) if sid == student_id]
+    document = {'student_id': student_id, 'class_id': class_id, 'version': current, 'weeks': []}
+    fig = Figure(figsize=(3, 1))
+    if rows and days:
+        i = rows[0]
+        _, roll, name = students[i]
+        grid, offset = _calendar(days, marked[i].astype(np.int8) + present[i])
+        monday = days[0] - datetime.timedelta(days=offset)
+        document.update(roll_number=roll, name=name, weeks=[
+            {'week_of': (monday + datetime.timedelta(weeks=w)).isoformat(),
+             'cells': ''.join(CELLS[c] if c >= 0 else ' ' for c in grid[:, w].tolist())}
+            for w in range(grid.shape[1])
+        ])
+        fig = _student_figure(f"{roll} {name}", days, grid)
+    _write(path('student', student_id, current, 'json'), json.dumps(document).encode())
+    _write(path('student', student_id, current, 'png'), _png(fig))
+
+
+def render(conn, target, target_id):
+    # renders the current version unless it is already on disk; returns it. the version is
+    # checked again afterwards so a mark that lands mid-render still gets its own files.
+    class_id = class_of(conn, target, target_id)
+    if class_id is None:
+        raise LookupError(f"no {target} {target_id}")
+    for _ in range(MAX_RENDERS):
+        current = version(conn, class_id)
+        if not all(os.path.exists(path(target, target_id, current, fmt)) for fmt in FORMATS):
+            if target == 'class':
+                _render_class(conn, class_id, current)
+            else:
+                _render_student(conn, target_id, class_id, current)
+            _stats['rendered'] += 1
+            _prune(target, target_id, current)
+        if version(conn, class_id) == current:
+            break
+    return current
+
+
+def stats():
+    return dict(_stats)
@@ -0,0 +1,143 @@
+# incremental answer autosave for give_IA
+# answer deltas from the browser land in a per-worker buffer (last write per question wins) and a
+# background thread flushes the buffer every FLUSH_INTERVAL in one write transaction with an
+# executemany upsert. at exam start hundreds of students answer in the same minute; coalescing
+# turns their thousands of tiny writes into a few transactions per second for SQLite's single writer.
+# the final submit then only flips IA_Submission to 'submitted' (see ia_session.submit).
+import atexit
+import os
+import sqlite3
+import threading
+import time
+
+import db
+
+FLUSH_INTERVAL = 0.25  # seconds
+
+# a late flush can never overwrite a paper that is already submitted or graded
+AUTOSAVE = '''
+    INSERT INTO Test_Response (roll, qid, answer, test_id)
+    SELECT :roll, :qid, :answer, :test_id
+    WHERE NOT EXISTS (SELECT 1 FROM IA_Submission WHERE test_id = :test_id AND roll = :roll AND status = 'submitted')
+      AND NOT EXISTS (SELECT 1 FROM Student_result WHERE test_id = :test_id AND roll = :roll)
+    ON CONFLICT(roll, qid, test_id) DO UPDATE SET answer = excluded.answer
+    WHERE Test_Response.answer IS NOT excluded.answer
+'''
+
+IN_PROGRESS = '''
+    INSERT OR IGNORE INTO IA_Submission (test_id, roll, status)
+    SELECT :test_id, :roll, 'in_progress'
+    WHERE NOT EXISTS (SELECT 1 FROM Student_result WHERE test_id = :test_id AND roll = :roll)
+'''
+
+_buffer = {}            # (test_id, roll, qid) -> canonical answer
+_lock = threading.Lock()
+_flush_lock = threading.Lock()  # one flush at a time, so an explicit flush waits for the flusher's
+_started_pid = None
+_stats = {'buffered': 0, 'flushed': 0, 'flushes': 0, 'retries': 0}
+
+
+def record(test_id, roll, answers):
+    # answers: [(qid, canonical letter)]; returns immediately, the write happens on the next flush
+    _start()
+    with _lock:
+        for qid, answer in answers:
+            _buffer[(test_id, roll, str(qid))] = answer
+        _stats['buffered'] += len(answers)
+
+
+def take(test_id, roll):
+    # removes and returns this student's unflushed answers, for the final submit to write itself
+    with _lock:
+        keys = [key for key in _buffer if key[0] == test_id and key[1] == roll]
+        return {key[2]: _buffer.pop(key) for key in keys}
+
+
+def pending(test_id, roll):
+    with _lock:
+        return {key[2]: answer for key, answer in _buffer.items() if key[0] == test_id and key[1] == roll}
+
+
+def flush(conn):
+    # writes everything buffered so far in one transaction; returns the number of answers written
+    with _flush_lock:
+        return _flush(conn)
+
+
+def _flush(conn):
+    global _buffer
+    with _lock:
+        batch, _buffer = _buffer, {}
+    if not batch:
+        return 0
+    rows = [{'test_id': t, 'roll': r, 'qid': q, 'answer': a} for (t, r, q), a in batch.items()]
+    students = [{'test_id': t, 'roll': r} for t, r in {(t, r) for t, r, _ in batch}]
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(IN_PROGRESS, students)
+            conn.executemany(AUTOSAVE, rows)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    except Exception as exc:
+        # put the batch back under anything newer; a busy writer (past busy_timeout) is retried next tick
+        with _lock:
+            for key, answer in batch.items():
+                _buffer.setdefault(key, answer)
+            _stats['retries'] += 1
+        if isinstance(exc, sqlite3.OperationalError):
+            return 0
+        raise
+    with _lock:
+        _stats['flushed'] += len(rows)
+        _stats['flushes'] += 1
+    return len(rows)
+
+
+def _flush_forever():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush(db.connection())
+        except Exception:
+            # never let the flusher die; a failed batch stays buffered
+            pass
+
+
+def _start():
+    # one flusher thread per worker process, started on first use
+    global _started_pid
+    if _started_pid == os.getpid():
+        return
+    with _lock:
+        if _started_pid == os.getpid():
+            return
+        _started_pid = os.getpid()
+    threading.Thread(target=_flush_forever, name="ia-autosave", daemon=True).start()
+
+
+@atexit.register
+def _flush_at_exit():
+    if _buffer and _started_pid == os.getpid():
+        try:
+            flush(db.connection())
+        except Exception:
+            pass
+
+
+def saved_answers(conn, test_id, roll):
+    # qid -> canonical answer as the student left it: stored rows overlaid with this worker's buffer
+    answers = {
+        str(qid): answer for qid, answer in conn.execute(
+            "SELECT qid, answer FROM Test_Response WHERE test_id = ? AND roll = ?", (test_id, roll)
+        )
+    }
+    answers.update(pending(test_id, roll))
+    return answers
+
+
+def stats():
+    with _lock:
+        return dict(_stats, pending=len(_buffer))
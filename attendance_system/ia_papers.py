@@ -0,0 +1,141 @@
+# precomputed IA paper variants
+# when a test's questions are saved, K variants are generated once: each has its own question
+# order and its own option order per question, plus the answer key in displayed letters. a variant
+# is stored compactly as one Test_Variants row: [[qid, "CADB"], ...] where "CADB" says which
+# canonical option is shown as A, B, C, D. the question text itself stays in the shared
+# ia_session cache. a student is assigned crc32(test_id:roll) % K, so any worker serves the same
+# paper without storing anything per student. answers are mapped back to canonical letters on
+# submit, so Test_Response and the set-based grading in grading.py are unchanged.
+import json
+import random
+import threading
+import time
+import zlib
+
+import ia_session
+
+VARIANTS = 4
+DIFFICULTIES = ('Easy', 'Medium', 'Hard')
+LETTERS = 'ABCD'
+OPTION_LETTERS = tuple(LETTERS)
+OPTION_FIELDS = ['option_A', 'option_B', 'option_C', 'option_D']
+
+_local = {}
+_lock = threading.Lock()
+
+
+def pick_questions(conn, subject, counts, test_id=None):
+    # blueprint -> qids, e.g. counts={'Easy': 10, 'Medium': 10, 'Hard': 5}, leaving out questions
+    # test_id already has; raises ValueError if the bank is short of any difficulty
+    picked = []
+    for difficulty in DIFFICULTIES:
+        wanted = int(counts.get(difficulty) or 0)
+        if wanted <= 0:
+            continue
+        rows = conn.execute(
+            '''SELECT qid, ans FROM Question_Database
+               WHERE subject = ? AND difficulty = ?
+                 AND qid NOT IN (SELECT CAST(qid AS INTEGER) FROM Test_Questions WHERE test_id = ?)
+               ORDER BY random() LIMIT ?''',
+            (subject, difficulty, test_id, wanted),
+        ).fetchall()
+        if len(rows) < wanted:
+            raise ValueError(f"only {len(rows)} {difficulty} questions available for {subject}, {wanted} requested")
+        picked += rows
+    if not picked:
+        raise ValueError("the blueprint asks for no questions")
+    return picked
+
+
+def add_questions(conn, test_id, subject, counts):
+    # fills a test from a blueprint; the caller generates variants and commits
+    picked = pick_questions(conn, subject, counts, test_id)
+    conn.executemany(
+        "INSERT OR IGNORE INTO Test_Questions (test_id, qid, answer) VALUES (?, ?, ?)",
+        [(test_id, qid, answer) for qid, answer in picked],
+    )
+    return len(picked)
+
+
+def generate(conn, test_id, variants=VARIANTS):
+    # (re)builds every variant of a test from its Test_Questions; the caller commits
+    questions = conn.execute(
+        "SELECT qid, answer FROM Test_Questions WHERE test_id = ? ORDER BY test_qid", (test_id,)
+    ).fetchall()
+    conn.execute("DELETE FROM Test_Variants WHERE test_id = ?", (test_id,))
+    rows = []
+    for variant in range(variants if questions else 0):
+        rng = random.Random(f"{test_id}:variant:{variant}")
+        order = list(questions)
+        rng.shuffle(order)
+        layout = []
+        key = []
+        for qid, answer in order:
+            perm = list(LETTERS)
+            rng.shuffle(perm)
+            layout.append([int(qid), ''.join(perm)])
+            key.append(LETTERS[perm.index(answer)] if answer in perm else '?')
+        rows.append((test_id, variant, json.dumps(layout, separators=(',', ':')), ''.join(key)))
+    conn.executemany("INSERT INTO Test_Variants (test_id, variant, layout, answer_key) VALUES (?, ?, ?, ?)", rows)
+    with _lock:
+        _local.pop(test_id, None)
+    return len(rows)
+
+
+def load_variants(conn, test_id):
+    # every variant of a test in one primary-key range read, kept per worker like ia_session
+    now = time.time()
+    with _lock:
+        entry = _local.get(test_id)
+    if entry and entry[0] > now:
+        return entry[1]
+    variants = [
+        (json.loads(layout), answer_key)
+        for layout, answer_key in conn.execute(
+            "SELECT layout, answer_key FROM Test_Variants WHERE test_id = ? ORDER BY variant", (test_id,)
+        )
+    ]
+    if variants:
+        with _lock:
+            _local[test_id] = (now + ia_session.LOCAL_TTL, variants)
+    return variants
+
+
+def variant_index(test_id, roll, count):
+    return zlib.crc32(f"{test_id}:{roll}".encode('utf-8')) % count
+
+
+def paper_for_student(conn, test_id, roll):
+    # the student's variant as give_IA renders it: options already in displayed order. each entry
+    # also carries 'perm' so canonical_answers() can map the displayed letters back.
+    variants = load_variants(conn, test_id)
+    if not variants:
+        # tests saved before variants existed: per-student order, options as stored
+        return [dict(q, perm=LETTERS) for q in ia_session.questions_for_student(conn, test_id, roll)]
+    layout, _ = variants[variant_index(test_id, roll, len(variants))]
+    by_qid = {q['qid']: q for q in ia_session.load_questions(conn, test_id)}
+    paper = []
+    for qid, perm in layout:
+        question = by_qid.get(qid)
+        if question is None:
+            continue
+        entry = {'qid': qid, 'question': question['question'], 'perm': perm}
+        for field, letter in zip(OPTION_FIELDS, perm):
+            entry[field] = question['option_' + letter]
+        paper.append(entry)
+    return paper
+
+
+def canonical(question, shown):
+    # displayed letter -> the letter stored in Question_Database / Test_Questions
+    return question['perm'][LETTERS.index(shown)] if shown in OPTION_LETTERS else None
+
+
+def displayed(question, answer):
+    # the inverse, for putting a saved answer back on the student's paper
+    return LETTERS[question['perm'].index(answer)] if answer in OPTION_LETTERS else None
+
+
+def canonical_answers(paper, form):
+    # [(qid, canonical letter or None)] from the answer_<qid> fields of the submitted form
+    return [(question['qid'], canonical(question, form.get(f"answer_{question['qid']}"))) for question in paper]
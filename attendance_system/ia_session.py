@@ -0,0 +1,131 @@
+# shared cache of in-progress IA question sets
+# the question list of a test is built once with a single join, stored in IA_Question_Cache
+# (shared by every gunicorn worker) with a TTL, and mirrored in a short-lived per-worker dict.
+# each student gets their own order, derived from (test_id, roll), so nothing is stored per student.
+# IA_Submission holds one row per (test_id, roll), 'in_progress' once answers are autosaved (see
+# ia_autosave.py) and 'submitted' after the final submit, so "already submitted" is a primary-key lookup.
+import json
+import random
+import threading
+import time
+
+CACHE_TTL = 3 * 60 * 60     # shared entry lifetime, long enough for one sitting
+LOCAL_TTL = 30              # per-worker copy, re-checked against the shared table after this
+
+FIELDS = ["qid", "question", "option_A", "option_B", "option_C", "option_D"]
+
+_local = {}
+_lock = threading.Lock()
+_stats = {'hits': 0, 'shared_hits': 0, 'misses': 0}
+
+
+def _build(conn, test_id):
+    rows = conn.execute('''
+        SELECT Question_Database.qid, Question_Database.question, Question_Database.option_A,
+               Question_Database.option_B, Question_Database.option_C, Question_Database.option_D
+        FROM Test_Questions
+        JOIN Question_Database ON Question_Database.qid = Test_Questions.qid
+        WHERE Test_Questions.test_id = ?
+        ORDER BY Test_Questions.test_qid
+    ''', (test_id,)).fetchall()
+    return [dict(zip(FIELDS, row)) for row in rows]
+
+
+def load_questions(conn, test_id):
+    # canonical (unshuffled) question list of a test
+    now = time.time()
+    with _lock:
+        entry = _local.get(test_id)
+        if entry and entry[0] > now:
+            _stats['hits'] += 1
+            return entry[1]
+
+    row = conn.execute(
+        "SELECT payload, expires_at FROM IA_Question_Cache WHERE test_id = ? AND expires_at > ?", (test_id, now)
+    ).fetchone()
+    if row is not None:
+        questions = json.loads(row[0])
+        tier = 'shared_hits'
+    else:
+        questions = _build(conn, test_id)
+        tier = 'misses'
+        if questions:
+            conn.execute("DELETE FROM IA_Question_Cache WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "INSERT OR REPLACE INTO IA_Question_Cache (test_id, payload, expires_at) VALUES (?, ?, ?)",
+                (test_id, json.dumps(questions), now + CACHE_TTL),
+            )
+            conn.commit()
+
+    with _lock:
+        _stats[tier] += 1
+        if questions:
+            # drop the expired copies, or the dict keeps every test this worker ever served
+            for expired in [key for key, (expires_at, _) in _local.items() if expires_at <= now]:
+                del _local[expired]
+            _local[test_id] = (now + LOCAL_TTL, questions)
+    return questions
+
+
+def questions_for_student(conn, test_id, roll):
+    # deterministic per-student order: same roll always sees the same paper on any worker
+    questions = list(load_questions(conn, test_id))
+    random.Random(f"{test_id}:{roll}").shuffle(questions)
+    return questions
+
+
+def stats():
+    # hits: this worker's copy, shared_hits: IA_Question_Cache, misses: rebuilt with the join
+    with _lock:
+        return dict(_stats)
+
+
+def invalidate(conn, test_id):
+    # drop the shared and local copies; the caller commits
+    conn.execute("DELETE FROM IA_Question_Cache WHERE test_id = ?", (test_id,))
+    with _lock:
+        _local.pop(test_id, None)
+
+
+# ---------------------------------------------submissions-------------------------------------------------------------
+def has_submitted(conn, test_id, roll):
+    # indexed existence check; a graded (closed) IA counts as submitted too
+    return conn.execute('''
+        SELECT EXISTS(SELECT 1 FROM IA_Submission WHERE test_id = ? AND roll = ? AND status = 'submitted')
+            OR EXISTS(SELECT 1 FROM Student_result WHERE roll = ? AND test_id = ?)
+    ''', (test_id, roll, roll, test_id)).fetchone()[0] == 1
+
+
+SUBMIT = '''
+    INSERT INTO IA_Submission (test_id, roll, status, submitted_at) VALUES (?, ?, 'submitted', ?)
+    ON CONFLICT(test_id, roll) DO UPDATE SET status = 'submitted', submitted_at = excluded.submitted_at
+    WHERE IA_Submission.status = 'in_progress'
+'''
+
+ANSWER = '''
+    INSERT INTO Test_Response (roll, qid, answer, test_id) VALUES (?, ?, ?, ?)
+    ON CONFLICT(roll, qid, test_id) DO UPDATE SET answer = excluded.answer
+    WHERE Test_Response.answer IS NOT excluded.answer
+'''
+
+
+def submit(conn, test_id, roll, answers):
+    # flips the submission to 'submitted' and upserts any answers not autosaved yet, in one
+    # transaction; returns False if the student had already submitted, so give_IA and
+    # auto_submit_IA can't both write responses. unanswered (None) never overwrites a saved answer.
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        flipped = conn.execute(SUBMIT, (test_id, roll, now)).rowcount
+        if not flipped:
+            conn.rollback()
+            return False
+        conn.executemany(
+            ANSWER,
+            [(roll, qid, answer, test_id) for qid, answer in answers if answer is not None],
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return True
@@ -0,0 +1,295 @@
+# durable background job queue
+# jobs live in the Jobs table (migration 3), so they survive a worker restart. every gunicorn worker
+# runs a small pool of threads that claim queued jobs one at a time; a dedicated process can do the
+# same with `flask run-jobs`. a failed job is retried exactly once (MAX_ATTEMPTS = 2), and a job
+# left 'running' by a dead worker is handed back to the queue and counts as one attempt. while a
+# handler runs, a per-process thread keeps its heartbeat fresh, so a long job is never mistaken for
+# an abandoned one.
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+from db import connection, get_db
+
+MAX_ATTEMPTS = 2          # first run + one retry
+RETRY_DELAY = 5           # seconds before the retry becomes eligible
+LEASE_SECONDS = 600       # a running job without a heartbeat for this long is considered abandoned
+HEARTBEAT_INTERVAL = 60   # how often the heartbeat thread touches the jobs running in this process
+POLL_INTERVAL = 1.0
+REAP_INTERVAL = 60        # how often a worker looks for jobs abandoned by other workers
+
+_handlers = {}
+_started_pid = None
+_start_lock = threading.Lock()
+_artifact_dir = None
+_stats = {'busy': 0}
+_running = {}             # job id -> owner, jobs of this process the heartbeat thread keeps alive
+_running_lock = threading.Lock()
+_heartbeat_pid = None
+
+
+def handler(kind):
+    # register a job function: fn(job) -> dict result (json serialisable) or None
+    def register(fn):
+        _handlers[kind] = fn
+        return fn
+    return register
+
+
+class Job:
+    def __init__(self, row):
+        self.id = row['id']
+        self.kind = row['kind']
+        self.payload = json.loads(row['payload'])
+        self.attempts = row['attempts']
+        self.owner = row['owner']
+        self.artifact = None
+
+    def progress(self, fraction, message=None):
+        # also acts as the heartbeat for long jobs
+        conn = get_db()
+        now = time.time()
+        conn.execute(
+            "UPDATE Jobs SET progress = ?, message = COALESCE(?, message), heartbeat = ?, updated_at = ? WHERE id = ?",
+            (min(max(fraction, 0.0), 1.0), message, now, now, self.id),
+        )
+        conn.commit()
+
+    def artifact_path(self, filename):
+        # where a job writes its downloadable output; recorded on the job when it finishes, if the
+        # file was actually written
+        directory = os.path.join(_artifact_dir, self.id)
+        os.makedirs(directory, exist_ok=True)
+        self.artifact = os.path.join(directory, filename)
+        return self.artifact
+
+
+def _owner():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def _row_factory(cursor, row):
+    return {col[0]: row[idx] for idx, col in enumerate(cursor.description)}
+
+
+def _fetch(conn, sql, params=()):
+    cursor = conn.cursor()
+    cursor.row_factory = _row_factory
+    return cursor.execute(sql, params).fetchone()
+
+
+def enqueue(conn, kind, payload, created_by=None, dedupe_key=None, run_after=None):
+    # returns the job id; with a dedupe_key an already queued/running job is returned instead
+    job_id = str(uuid.uuid4())
+    now = time.time()
+    try:
+        conn.execute(
+            '''INSERT INTO Jobs (id, kind, payload, dedupe_key, created_by, run_after, created_at, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+            (job_id, kind, json.dumps(payload), dedupe_key, created_by, run_after or now, now, now),
+        )
+        conn.commit()
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        existing = conn.execute(
+            "SELECT id FROM Jobs WHERE dedupe_key = ? AND status IN ('queued', 'running')", (dedupe_key,)
+        ).fetchone()
+        if existing is None:
+            raise
+        return existing[0]
+    return job_id
+
+
+def get(conn, job_id):
+    job = _fetch(conn, "SELECT * FROM Jobs WHERE id = ?", (job_id,))
+    if job is None:
+        return None
+    job['payload'] = json.loads(job['payload'])
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+
+def queue_depths(conn):
+    return dict(conn.execute("SELECT status, COUNT(*) FROM Jobs GROUP BY status").fetchall())
+
+
+def stats():
+    return dict(_stats)
+
+
+def _local_owner(owner):
+    return owner.split(':', 1)[0] == socket.gethostname()
+
+
+def _pid_alive(owner):
+    host, pid, _ = owner.split(':', 2)
+    if host != socket.gethostname():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except (ProcessLookupError, ValueError):
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def requeue_abandoned(conn):
+    # jobs whose worker died go back to the queue, or are failed for good once they have used up
+    # their attempts. on this host that is decided by the pid alone; the lease only judges owners
+    # on other hosts, whose pids can't be checked
+    now = time.time()
+    rows = conn.execute("SELECT id, owner, heartbeat FROM Jobs WHERE status = 'running'").fetchall()
+    abandoned = [job_id for job_id, owner, heartbeat in rows
+                 if not _pid_alive(owner or '::')
+                 or (not _local_owner(owner or '') and (heartbeat or 0) < now - LEASE_SECONDS)]
+    for job_id in abandoned:
+        conn.execute(
+            '''UPDATE Jobs SET status = CASE WHEN attempts < ? THEN 'queued' ELSE 'failed' END,
+                   error = 'worker stopped while the job was running', owner = NULL, run_after = ?, updated_at = ?
+               WHERE id = ? AND status = 'running'
+            ''',
+            (MAX_ATTEMPTS, now, now, job_id),
+        )
+    conn.commit()
+    return len(abandoned)
+
+
+def claim(conn):
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = _fetch(
+            conn,
+            "SELECT * FROM Jobs WHERE status = 'queued' AND run_after <= ? ORDER BY run_after LIMIT 1",
+            (now,),
+        )
+        if row is not None:
+            conn.execute(
+                '''UPDATE Jobs SET status = 'running', attempts = attempts + 1, owner = ?, heartbeat = ?, updated_at = ?
+                   WHERE id = ?''',
+                (_owner(), now, now, row['id']),
+            )
+            row['attempts'] += 1
+            row['owner'] = _owner()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return Job(row) if row is not None else None
+
+
+def _heartbeat_loop():
+    while True:
+        time.sleep(HEARTBEAT_INTERVAL)
+        with _running_lock:
+            running = list(_running.items())
+        if not running:
+            continue
+        try:
+            conn = connection()
+            now = time.time()
+            conn.executemany("UPDATE Jobs SET heartbeat = ? WHERE id = ? AND owner = ?",
+                             [(now, job_id, owner) for job_id, owner in running])
+            conn.commit()
+        except sqlite3.OperationalError:
+            _stats['busy'] += 1
+
+
+def _start_heartbeat():
+    # once per process, like the worker threads; also covers `flask run-jobs`
+    global _heartbeat_pid
+    with _running_lock:
+        if _heartbeat_pid == os.getpid():
+            return
+        _heartbeat_pid = os.getpid()
+    threading.Thread(target=_heartbeat_loop, name="job-heartbeat", daemon=True).start()
+
+
+def run_one(conn):
+    # claims and runs a single job; returns False when the queue had nothing eligible
+    job = claim(conn)
+    if job is None:
+        return False
+    _start_heartbeat()
+    with _running_lock:
+        _running[job.id] = job.owner
+    try:
+        fn = _handlers.get(job.kind)
+        if fn is None:
+            raise LookupError(f"no handler registered for job kind {job.kind!r}")
+        result = fn(job)
+    except Exception:
+        if conn.in_transaction:
+            conn.rollback()
+        now = time.time()
+        # owner: a run that was requeued in the meantime must not overwrite its successor
+        conn.execute(
+            '''UPDATE Jobs SET status = CASE WHEN attempts < ? THEN 'queued' ELSE 'failed' END,
+                   error = ?, owner = NULL, run_after = ?, updated_at = ? WHERE id = ? AND owner = ?''',
+            (MAX_ATTEMPTS, traceback.format_exc(limit=5), now + RETRY_DELAY, now, job.id, job.owner),
+        )
+        conn.commit()
+        return True
+    finally:
+        with _running_lock:
+            _running.pop(job.id, None)
+    now = time.time()
+    artifact = job.artifact if job.artifact and os.path.exists(job.artifact) else None
+    conn.execute(
+        '''UPDATE Jobs SET status = 'done', progress = 1, result = ?, artifact = ?, error = NULL, owner = NULL,
+               updated_at = ? WHERE id = ? AND owner = ?''',
+        (json.dumps(result), artifact, now, job.id, job.owner),
+    )
+    conn.commit()
+    return True
+
+
+def work_forever(app, stop=None):
+    stop = stop or threading.Event()
+    last_reap = time.time()
+    while not stop.is_set():
+        with app.app_context():
+            try:
+                if time.time() - last_reap > REAP_INTERVAL:
+                    requeue_abandoned(get_db())
+                    last_reap = time.time()
+                ran = run_one(get_db())
+            except sqlite3.OperationalError:
+                # database busy beyond busy_timeout, try again on the next tick
+                _stats['busy'] += 1
+                ran = False
+        if not ran:
+            stop.wait(POLL_INTERVAL)
+
+
+def start_workers(app):
+    # once per process: recover abandoned jobs, then start the in-process worker threads
+    global _started_pid
+    threads = app.config['JOB_WORKER_THREADS']
+    if threads <= 0 or _started_pid == os.getpid():
+        return
+    with _start_lock:
+        if _started_pid == os.getpid():
+            return
+        _started_pid = os.getpid()
+        requeue_abandoned(get_db())
+        for i in range(threads):
+            threading.Thread(target=work_forever, args=(app,), name=f"job-worker-{i}", daemon=True).start()
+
+
+def init_app(app, artifact_dir):
+    global _artifact_dir
+    _artifact_dir = artifact_dir
+    os.makedirs(artifact_dir, exist_ok=True)
+    app.config.setdefault('JOB_WORKER_THREADS', int(os.environ.get('JOB_WORKER_THREADS', 2)))
+
+    # started lazily on the first request so CLI commands don't spin up worker threads
+    @app.before_request
+    def ensure_workers():
+        start_workers(app)
@@ -0,0 +1,341 @@
+# Prometheus text-format metrics, aggregated across gunicorn workers
+# every worker keeps its counters, histograms and gauges in memory and writes them, together with
+# the samples of the registered collectors, to <METRICS_DIR>/<pid>-<start>.json every WRITE_INTERVAL
+# (and on exit), <start> being the process start time, so a new process that reuses a dead worker's
+# pid gets a file of its own. a scrape of /metrics on any worker writes its own file first, then sums
+# every file: counters and histograms over all files, so a restarted worker's totals are kept, and
+# gauges only over workers that are still alive (same pid, same start time). a scrape folds the
+# counters and histograms of exited workers into RETIRED and deletes their files, so the directory
+# holds one file per live worker plus RETIRED. other workers' numbers are at most WRITE_INTERVAL old.
+# scrape with `curl -H "Authorization: Bearer $METRICS_TOKEN" localhost:10000/metrics`; nothing here
+# needs a network service.
+import atexit
+import fcntl
+import glob
+import hmac
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from flask import g, request
+
+PREFIX = 'attendance_'
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+WRITE_INTERVAL = 5.0  # seconds
+RETIRED = 'retired.json'   # counters and histograms of the workers that have exited
+
+# name -> (type, help)
+METRICS = {
+    'http_requests_total': ('counter', 'HTTP requests by route, method and status'),
+    'http_request_duration_seconds': ('histogram', 'HTTP request latency by route and method'),
+    'http_requests_in_flight': ('gauge', 'HTTP requests being served'),
+    'sqlite_locked_total': ('counter', 'Operations that hit "database is locked" after busy_timeout, by source'),
+    'cache_hits_total': ('counter', 'Cache lookups answered from cache'),
+    'cache_misses_total': ('counter', 'Cache lookups that went to the database'),
+    'cache_hit_ratio': ('gauge', 'cache_hits_total / (cache_hits_total + cache_misses_total) over all workers'),
+    'queue_depth': ('gauge', 'Background work waiting or running, by queue and status'),
+}
+
+_lock = threading.Lock()
+_counters = {}     # (name, labels) -> value
+_histograms = {}   # (name, labels) -> [count per bucket..., +Inf bucket, sum]
+_gauges = {}       # (name, labels) -> value
+_collectors = []   # fn() -> [(name, labels dict, value)], sampled into this worker's file
+_scrape_collectors = []  # fn(conn) -> [(name, labels dict, value)], global state read once per scrape
+_dir = None
+_started_pid = None
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def add(name, value, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = _gauges.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    key = _key(name, labels)
+    with _lock:
+        buckets = _histograms.get(key)
+        if buckets is None:
+            buckets = _histograms[key] = [0] * (len(BUCKETS) + 2)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                break
+        else:
+            i = len(BUCKETS)
+        buckets[i] += 1
+        buckets[-1] += seconds
+
+
+def collector(fn):
+    # per-worker samples, e.g. counters kept by a cache module; counters are reported as totals
+    _collectors.append(fn)
+    return fn
+
+
+def scrape_collector(fn):
+    # samples of shared state (the database), taken by whichever worker serves the scrape
+    _scrape_collectors.append(fn)
+    return fn
+
+
+def _start_time(pid):
+    # start of the process in clock ticks since boot (field 22 of /proc/<pid>/stat); None where
+    # there is no /proc or the process is gone
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    return int(stat[stat.rindex(')') + 2:].split()[19])
+
+
+def _encode(series):
+    return [[name, list(labels), value] for (name, labels), value in series.items()]
+
+
+def _snapshot():
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: list(value) for key, value in _histograms.items()}
+        gauges = dict(_gauges)
+    for fn in _collectors:
+        for name, labels, value in fn():
+            target = gauges if METRICS[name][0] == 'gauge' else counters
+            target[_key(name, labels)] = value
+    return {'pid': os.getpid(), 'start': _start_time(os.getpid()), 'time': time.time(), 'counters': _encode(counters),
+            'histograms': _encode(histograms), 'gauges': _encode(gauges)}
+
+
+def write():
+    # atomically replace this worker's file
+    if _dir is None:
+        return
+    pid = os.getpid()
+    path = os.path.join(_dir, f"{pid}-{_start_time(pid) or 0}.json")
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(_snapshot(), f, separators=(',', ':'))
+    os.replace(tmp, path)
+
+
+def _alive(pid, start):
+    if pid == os.getpid():
+        return start == _start_time(pid)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    # the pid may have been reused by a process started later
+    return start is None or start == _start_time(pid)
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None  # replaced or removed while we were reading it
+
+
+def _decode(series):
+    return [((name, tuple(map(tuple, labels))), value) for name, labels, value in series]
+
+
+def _add(counters, histograms, data):
+    # data: a worker file or RETIRED
+    _sum(counters, histograms, _decode(data['counters']), _decode(data['histograms']))
+
+
+def _sum(counters, histograms, counter_items, histogram_items):
+    for key, value in counter_items:
+        counters[key] = counters.get(key, 0) + value
+    for key, value in histogram_items:
+        total = histograms.setdefault(key, [0] * len(value))
+        for i, v in enumerate(value):
+            total[i] += v
+
+
+def aggregate():
+    # under an exclusive lock, so two scrapes never fold the same file: the files of dead workers
+    # are added to RETIRED and removed, which keeps the directory at one file per live worker.
+    # RETIRED lists the files it holds until the next fold, in case one was not removed.
+    counters, histograms, gauges = {}, {}, {}
+    retired_path = os.path.join(_dir, RETIRED)
+    with open(os.path.join(_dir, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        retired = _read(retired_path) or {'counters': [], 'histograms': [], 'folded': []}
+        retired_counters, retired_histograms = {}, {}
+        _add(retired_counters, retired_histograms, retired)
+        dead = []
+        for path in glob.glob(os.path.join(_dir, '*.json')):
+            name = os.path.basename(path)
+            if name == RETIRED:
+                continue
+            if name in retired['folded']:
+                os.remove(path)
+                continue
+            data = _read(path)
+            if data is None:
+                continue
+            if _alive(data['pid'], data.get('start')):
+                _add(counters, histograms, data)
+                for key, value in _decode(data['gauges']):
+                    gauges[key] = gauges.get(key, 0) + value
+            else:
+                _add(retired_counters, retired_histograms, data)
+                dead.append(path)
+        if dead:
+            tmp = f"{retired_path}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump({'counters': _encode(retired_counters), 'histograms': _encode(retired_histograms),
+                           'folded': [os.path.basename(path) for path in dead]}, f, separators=(',', ':'))
+            os.replace(tmp, retired_path)
+            for path in dead:
+                os.remove(path)
+    _sum(counters, histograms, retired_counters.items(), retired_histograms.items())
+    return counters, histograms, gauges
+
+
+def _ratios(counters):
+    ratios = {}
+    for (name, labels), hits in counters.items():
+        if name != 'cache_hits_total':
+            continue
+        lookups = hits + counters.get(('cache_misses_total', labels), 0)
+        if lookups:
+            ratios[('cache_hit_ratio', labels)] = hits / lookups
+    return ratios
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def authorized(token):
+    # the request carries `Authorization: Bearer <token>`; always False when no token is configured
+    if not token:
+        return False
+    header = request.headers.get('Authorization', '')
+    return hmac.compare_digest(header.encode(), f"Bearer {token}".encode())
+
+
+def render(conn):
+    # the exposition text of every series, summed over all workers
+    write()
+    counters, histograms, gauges = aggregate()
+    gauges.update(_ratios(counters))
+    for fn in _scrape_collectors:
+        for name, labels, value in fn(conn):
+            gauges[_key(name, labels)] = value
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        series = {'counter': counters, 'gauge': gauges, 'histogram': histograms}[kind]
+        samples = sorted((labels, value) for (n, labels), value in series.items() if n == name)
+        lines.append(f"# HELP {PREFIX}{name} {help_text}")
+        lines.append(f"# TYPE {PREFIX}{name} {kind}")
+        for labels, value in samples:
+            if kind != 'histogram':
+                lines.append(f"{PREFIX}{name}{_labels(labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (float('inf'),), value[:-1]):
+                cumulative += count
+                lines.append(f"{PREFIX}{name}_bucket{_labels(labels, [('le', _number(float(bound)))])} {cumulative}")
+            lines.append(f"{PREFIX}{name}_sum{_labels(labels)} {_number(float(value[-1]))}")
+            lines.append(f"{PREFIX}{name}_count{_labels(labels)} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+
+def _write_forever():
+    while True:
+        time.sleep(WRITE_INTERVAL)
+        try:
+            write()
+        except OSError:
+            pass
+
+
+def _start():
+    # one writer thread per worker process, started on its first request
+    global _started_pid
+    if _started_pid == os.getpid():
+        return
+    with _lock:
+        if _started_pid == os.getpid():
+            return
+        _started_pid = os.getpid()
+    threading.Thread(target=_write_forever, name="metrics-writer", daemon=True).start()
+
+
+@atexit.register
+def _write_at_exit():
+    if _started_pid == os.getpid():
+        try:
+            write()
+        except OSError:
+            pass
+
+
+def init_app(app, directory):
+    global _dir
+    app.config.setdefault('METRICS', os.environ.get('METRICS', '1') == '1')
+    # bearer token a scraper sends; without one only an admin session can read /metrics
+    app.config.setdefault('METRICS_TOKEN', os.environ.get('METRICS_TOKEN'))
+    if not app.config['METRICS']:
+        return
+    _dir = os.environ.get('METRICS_DIR', directory)
+    os.makedirs(_dir, exist_ok=True)
+
+    @app.before_request
+    def start_request():
+        _start()
+        g.metrics_start = time.perf_counter()
+        add('http_requests_in_flight', 1)
+
+    @app.after_request
+    def record_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def finish_request(exc=None):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return
+        add('http_requests_in_flight', -1)
+        # the rule, not the path, so /give_IA/<test_id>/<roll> is one series
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        status = g.pop('metrics_status', 500)
+        inc('http_requests_total', method=request.method, route=route, status=str(status))
+        observe('http_request_duration_seconds', time.perf_counter() - start, method=request.method, route=route)
+        if isinstance(exc, sqlite3.OperationalError) and 'locked' in str(exc):
+            inc('sqlite_locked_total', source='request')
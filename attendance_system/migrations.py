@@ -0,0 +1,438 @@
+# versioned schema migrations
+# the schema version lives in the database header (PRAGMA user_version); every migration
+# newer than it is applied in order inside one write transaction, so running this at the
+# start of every gunicorn worker is safe and idempotent.
+import ast
+import os
+import re
+
+import attendance_bits
+import attendance_stats
+import ia_papers
+import question_import
+import question_search
+import question_stats
+
+# version 1: the base schema (previously create_tables() plus the ad-hoc SQL kept in
+# database/Untitled-1.sqlite3-query). IF NOT EXISTS keeps it a no-op on existing databases.
+BASE_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS School (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS Department (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        school_id INTEGER,
+        FOREIGN KEY (school_id) REFERENCES School(id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS Class (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        department_id INTEGER,
+        FOREIGN KEY (department_id) REFERENCES Department(id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS Teacher (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        user_id INTEGER,
+        subject TEXT,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS Student (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        roll_number TEXT UNIQUE NOT NULL,
+        class_id INTEGER,
+        user_id INTEGER,
+        FOREIGN KEY (class_id) REFERENCES Class(id)
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS Attendance (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        student_id INTEGER,
+        date DATE NOT NULL,
+        status TEXT CHECK(status IN ('Present', 'Absent')),
+        FOREIGN KEY (student_id) REFERENCES Student(id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        role TEXT CHECK(role IN ('admin', 'teacher', 'student')) NOT NULL DEFAULT 'student'
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS TeacherClassSubject (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        teacher_id INTEGER,
+        class_id INTEGER,
+        FOREIGN KEY (teacher_id) REFERENCES Teacher(user_id),
+        FOREIGN KEY (class_id) REFERENCES Class(id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS Tests (
+        test_id TEXT PRIMARY KEY,
+        teacher_id INTEGER,
+        class_id INTEGER,
+        subject TEXT NOT NULL,
+        test_name TEXT NOT NULL,
+        ia_date DATE NOT NULL,
+        FOREIGN KEY (teacher_id) REFERENCES Teacher(id),
+        FOREIGN KEY (class_id) REFERENCES Class(id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS Question_Database (
+        qid INTEGER PRIMARY KEY AUTOINCREMENT,
+        question TEXT NOT NULL,
+        option_A TEXT NOT NULL,
+        option_B TEXT NOT NULL,
+        option_C TEXT NOT NULL,
+        option_D TEXT NOT NULL,
+        ans TEXT CHECK(ans IN ('A', 'B', 'C', 'D')) NOT NULL,
+        difficulty TEXT CHECK(difficulty IN ('Easy', 'Medium', 'Hard')) NOT NULL,
+        subject TEXT NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS Test_Questions (
+        test_qid INTEGER PRIMARY KEY AUTOINCREMENT,
+        qid TEXT NOT NULL,
+        answer TEXT,
+        test_id TEXT NOT NULL,
+        FOREIGN KEY (qid) REFERENCES Question_Database(qid),
+        FOREIGN KEY (test_id) REFERENCES Tests(test_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS Test_Response (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        roll TEXT NOT NULL,
+        qid TEXT NOT NULL,
+        answer TEXT,
+        test_id TEXT NOT NULL REFERENCES Tests(test_id),
+        UNIQUE (roll, qid, test_id),
+        FOREIGN KEY (qid) REFERENCES Question_Database(qid),
+        FOREIGN KEY (roll) REFERENCES Student(roll_number)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS Student_result (
+        roll TEXT NOT NULL,
+        class_id INT NOT NULL,
+        test_id TEXT NOT NULL,
+        markes INT,
+        total_markes INT,
+        PRIMARY KEY (roll, test_id),
+        FOREIGN KEY (class_id) REFERENCES Class(id),
+        FOREIGN KEY (roll) REFERENCES Student(roll_number),
+        FOREIGN KEY (test_id) REFERENCES Tests(test_id)
+    )
+    ''',
+]
+
+# version 2: indexes for every column used in a hot WHERE / JOIN.
+# the wider ones are covering indexes so the listed queries never touch the table b-tree.
+HOT_PATH_INDEXES = [
+    # view_attendance, download_attendance, attendance_summary
+    "CREATE INDEX IF NOT EXISTS idx_attendance_student_date ON Attendance(student_id, date, status)",
+    # roster lookups by class (mark_attendance, close_IA, manage_students)
+    "CREATE INDEX IF NOT EXISTS idx_student_class ON Student(class_id, roll_number, name)",
+    # available_IA and the student-side joins
+    "CREATE INDEX IF NOT EXISTS idx_student_user ON Student(user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_teacher_user ON Teacher(user_id)",
+    # teacher -> classes and class -> teachers
+    "CREATE INDEX IF NOT EXISTS idx_tcs_teacher ON TeacherClassSubject(teacher_id, class_id)",
+    "CREATE INDEX IF NOT EXISTS idx_tcs_class ON TeacherClassSubject(class_id, teacher_id)",
+    # IA taking and grading
+    "CREATE INDEX IF NOT EXISTS idx_test_response_test_roll ON Test_Response(test_id, roll, qid, answer)",
+    "CREATE INDEX IF NOT EXISTS idx_test_questions_test ON Test_Questions(test_id, qid, answer)",
+    "CREATE INDEX IF NOT EXISTS idx_tests_teacher ON Tests(teacher_id)",
+    "CREATE INDEX IF NOT EXISTS idx_tests_class_date ON Tests(class_id, ia_date)",
+    "CREATE INDEX IF NOT EXISTS idx_student_result_test ON Student_result(test_id)",
+    "CREATE INDEX IF NOT EXISTS idx_question_subject_difficulty ON Question_Database(subject, difficulty)",
+    # hierarchy joins
+    "CREATE INDEX IF NOT EXISTS idx_department_school ON Department(school_id)",
+    "CREATE INDEX IF NOT EXISTS idx_class_department ON Class(department_id)",
+    "ANALYZE",
+]
+
+# version 3: durable background job queue, see jobs.py
+JOB_QUEUE = [
+    '''
+    CREATE TABLE IF NOT EXISTS Jobs (
+        id TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        status TEXT CHECK(status IN ('queued', 'running', 'done', 'failed')) NOT NULL DEFAULT 'queued',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        progress REAL NOT NULL DEFAULT 0,
+        message TEXT,
+        result TEXT,
+        artifact TEXT,
+        error TEXT,
+        dedupe_key TEXT,
+        owner TEXT,
+        created_by INTEGER,
+        run_after REAL NOT NULL,
+        heartbeat REAL,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_jobs_status_run_after ON Jobs(status, run_after)",
+    # at most one live job per dedupe key (e.g. closing the same IA twice)
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_dedupe ON Jobs(dedupe_key) WHERE status IN ('queued', 'running')",
+]
+
+# version 4: question sets of running IAs, shared by all workers (see ia_session.py)
+IA_QUESTION_CACHE = [
+    '''
+    CREATE TABLE IF NOT EXISTS IA_Question_Cache (
+        test_id TEXT PRIMARY KEY,
+        payload TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    )
+    ''',
+]
+
+# version 5: one row per (test_id, roll) once a student has submitted an IA
+IA_SUBMISSIONS = [
+    '''
+    CREATE TABLE IF NOT EXISTS IA_Submission (
+        test_id TEXT NOT NULL,
+        roll TEXT NOT NULL,
+        status TEXT CHECK(status IN ('in_progress', 'submitted')) NOT NULL DEFAULT 'submitted',
+        submitted_at REAL,
+        PRIMARY KEY (test_id, roll)
+    ) WITHOUT ROWID
+    ''',
+    # students who already have responses in an open IA
+    "INSERT OR IGNORE INTO IA_Submission (test_id, roll, status) SELECT DISTINCT test_id, roll, 'submitted' FROM Test_Response",
+]
+
+# version 6: trigger-maintained attendance aggregates, backfilled from the row table
+ATTENDANCE_AGGREGATES = attendance_stats.TABLES + attendance_stats.TRIGGERS + [attendance_stats.recompute]
+
+# version 7: one Attendance row per student per day. duplicates from re-submitted forms are collapsed
+# to the latest row, then the aggregates are recomputed since they had counted the duplicates.
+ATTENDANCE_UNIQUE_DAY = [
+    "DELETE FROM Attendance WHERE id NOT IN (SELECT MAX(id) FROM Attendance GROUP BY student_id, date)",
+    "DROP INDEX IF EXISTS idx_attendance_student_date",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_attendance_student_date ON Attendance(student_id, date)",
+    attendance_stats.recompute,
+]
+
+# version 8: named version counters for cross-worker cache invalidation (see cache_version.py)
+CACHE_VERSION = [
+    '''
+    CREATE TABLE IF NOT EXISTS Cache_Version (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    ''',
+]
+
+# version 9: list_IA pages a teacher's tests newest first by (ia_date, test_id)
+TESTS_BY_TEACHER_DATE = [
+    "CREATE INDEX IF NOT EXISTS idx_tests_teacher_date ON Tests(teacher_id, ia_date, test_id)",
+    "DROP INDEX IF EXISTS idx_tests_teacher",
+]
+
+# version 10: FTS5 keyword index over the question bank, kept in sync by triggers
+QUESTION_SEARCH = question_search.TABLES + question_search.TRIGGERS + [question_search.REBUILD]
+
+# version 11: normalised question hash for de-duplicating imports; existing duplicates are folded
+QUESTION_HASH = [question_import.backfill_hashes]
+
+# version 12: precomputed IA paper variants (see ia_papers.py). tests already open keep serving
+# their per-student order, so nobody's paper changes mid-sitting.
+TEST_VARIANTS = [
+    '''
+    CREATE TABLE IF NOT EXISTS Test_Variants (
+        test_id TEXT NOT NULL,
+        variant INTEGER NOT NULL,
+        layout TEXT NOT NULL,
+        answer_key TEXT NOT NULL,
+        PRIMARY KEY (test_id, variant)
+    ) WITHOUT ROWID
+    ''',
+]
+
+# version 13: per (student, month) attendance bitmasks, kept in sync by triggers (see attendance_bits.py)
+ATTENDANCE_BITS = attendance_bits.TABLES + attendance_bits.TRIGGERS + [attendance_bits.recompute]
+
+# version 14: who marked each attendance record, for the per-subject analytics (attendance_analytics.py).
+# existing records are attributed only where the class has a single assigned teacher.
+ATTENDANCE_MARKED_BY = [
+    "ALTER TABLE Attendance ADD COLUMN marked_by INTEGER REFERENCES users(id)",
+    '''
+    UPDATE Attendance SET marked_by = (
+        SELECT MIN(TeacherClassSubject.teacher_id)
+        FROM Student JOIN TeacherClassSubject ON TeacherClassSubject.class_id = Student.class_id
+        WHERE Student.id = Attendance.student_id
+        HAVING COUNT(DISTINCT TeacherClassSubject.teacher_id) = 1
+    )
+    ''',
+]
+
+# version 15: per-question item analysis, accumulated at grading time (see question_stats.py)
+QUESTION_STATS = question_stats.TABLES
+
+# version 16: a question appears at most once per test. duplicates (a paper generated twice, or mixed
+# with hand-picked questions) are dropped, keeping the first, and the affected tests get new variants
+def _dedupe_test_questions(conn):
+    tests = [row[0] for row in conn.execute(
+        "SELECT DISTINCT test_id FROM Test_Questions GROUP BY test_id, CAST(qid AS INTEGER) HAVING COUNT(*) > 1"
+    )]
+    conn.execute('''
+        DELETE FROM Test_Questions WHERE test_qid NOT IN (
+            SELECT MIN(test_qid) FROM Test_Questions GROUP BY test_id, CAST(qid AS INTEGER)
+        )
+    ''')
+    for test_id in tests:
+        variants = conn.execute("SELECT COUNT(*) FROM Test_Variants WHERE test_id = ?", (test_id,)).fetchone()[0]
+        ia_papers.generate(conn, test_id, variants or ia_papers.VARIANTS)
+
+
+TEST_QUESTIONS_UNIQUE = [
+    _dedupe_test_questions,
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_test_questions_test_qid ON Test_Questions(test_id, qid)",
+]
+
+# version 17: deleted attendance rows leave the aggregates too; recomputed in case rows were
+# removed before the trigger existed
+ATTENDANCE_AGG_DELETE = [attendance_stats.DELETE_TRIGGER, attendance_stats.recompute]
+
+# version 18: databases migrated before the fix have marked_by referencing Teacher(user_id), which is
+# not unique, so every Attendance write would fail once foreign keys are enforced. SQLite can't alter
+# a constraint: the table is rebuilt from its own stored SQL with users(id), and its indexes and
+# triggers are re-created from theirs after the copy so the aggregates aren't counted twice
+def _fix_marked_by_reference(conn):
+    (table_sql,) = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'Attendance'").fetchone()
+    if 'REFERENCES Teacher(user_id)' not in table_sql:
+        return
+    dependents = [sql for (sql,) in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = 'Attendance' AND type IN ('index', 'trigger') AND sql IS NOT NULL"
+    )]
+    conn.execute(re.sub(r'(?i)^\s*CREATE TABLE IF NOT EXISTS Attendance\b|^\s*CREATE TABLE Attendance\b',
+                        'CREATE TABLE Attendance_rebuilt', table_sql, count=1)
+                 .replace('REFERENCES Teacher(user_id)', 'REFERENCES users(id)'))
+    conn.execute("INSERT INTO Attendance_rebuilt (id, student_id, date, status, marked_by) "
+                 "SELECT id, student_id, date, status, marked_by FROM Attendance")
+    conn.execute("DROP TABLE Attendance")
+    conn.execute("ALTER TABLE Attendance_rebuilt RENAME TO Attendance")
+    for sql in dependents:
+        conn.execute(sql)
+
+
+ATTENDANCE_MARKED_BY_USERS = [_fix_marked_by_reference]
+
+# (version, name, steps); a step is either an SQL string or a callable taking the connection
+MIGRATIONS = [
+    (1, 'base schema', BASE_SCHEMA),
+    (2, 'hot path indexes', HOT_PATH_INDEXES),
+    (3, 'job queue', JOB_QUEUE),
+    (4, 'IA question cache', IA_QUESTION_CACHE),
+    (5, 'IA submissions', IA_SUBMISSIONS),
+    (6, 'attendance aggregates', ATTENDANCE_AGGREGATES),
+    (7, 'unique attendance per day', ATTENDANCE_UNIQUE_DAY),
+    (8, 'cache versions', CACHE_VERSION),
+    (9, 'tests by teacher and date', TESTS_BY_TEACHER_DATE),
+    (10, 'question search', QUESTION_SEARCH),
+    (11, 'question hash', QUESTION_HASH),
+    (12, 'IA paper variants', TEST_VARIANTS),
+    (13, 'attendance bitmasks', ATTENDANCE_BITS),
+    (14, 'attendance marked by', ATTENDANCE_MARKED_BY),
+    (15, 'question statistics', QUESTION_STATS),
+    (16, 'unique test questions', TEST_QUESTIONS_UNIQUE),
+    (17, 'attendance aggregate delete trigger', ATTENDANCE_AGG_DELETE),
+    (18, 'attendance marked_by references users', ATTENDANCE_MARKED_BY_USERS),
+]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    # BEGIN IMMEDIATE takes the write lock first, so when several workers boot together only
+    # one applies the migrations and the others see the new version once they get the lock
+    conn.execute("BEGIN IMMEDIATE")
+    applied = []
+    try:
+        current = schema_version(conn)
+        for version, name, steps in MIGRATIONS:
+            if version <= current:
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(f"PRAGMA user_version = {version}")
+            applied.append((version, name))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return applied
+
+
+# ---------------------------------------------query plan report-------------------------------------------------------
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def collect_queries(source_dir=SOURCE_DIR):
+    # every literal SQL string passed to execute()/executemany() in the app's modules
+    queries = []
+    for filename in sorted(os.listdir(source_dir)):
+        if not filename.endswith('.py'):
+            continue
+        path = os.path.join(source_dir, filename)
+        with open(path, encoding='utf-8') as f:
+            tree = ast.parse(f.read(), filename=path)
+        for node in ast.walk(tree):
+            if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)):
+                continue
+            if node.func.attr not in ('execute', 'executemany') or not node.args:
+                continue
+            arg = node.args[0]
+            if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+                sql = ' '.join(arg.value.split())
+                if re.match(r'(?i)(SELECT|INSERT|UPDATE|DELETE|REPLACE|WITH)\b', sql):
+                    queries.append((filename, node.lineno, sql))
+    return [(f"{filename}:{lineno}", sql) for filename, lineno, sql in sorted(queries)]
+
+
+def explain_queries(conn, source_dir=SOURCE_DIR):
+    # yields (location, sql, plan rows, full table scans)
+    for location, sql in collect_queries(source_dir):
+        params = [None] * sql.count('?')
+        try:
+            plan = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+        except Exception as e:
+            yield location, sql, [f"error: {e}"], []
+            continue
+        details = [row[3] for row in plan]
+        scans = [d for d in details if d.startswith('SCAN ') and 'USING' not in d]
+        yield location, sql, details, scans
@@ -0,0 +1,104 @@
+# keyset (cursor) pagination for the manage_* / list_IA listings
+# a page is fetched with "WHERE (sort keys) > (last row's keys) ORDER BY keys LIMIT n+1", so every
+# page costs the same index range scan no matter how deep it is. the cursor handed to the client is
+# an opaque token holding the last row's keys plus the total count, which is computed once on the
+# first page (and cached briefly per worker) instead of on every page.
+import base64
+import json
+import threading
+import time
+
+PER_PAGE = 50
+MAX_PER_PAGE = 500
+COUNT_TTL = 30  # seconds a first-page total is reused for the same query and filters
+
+_counts = {}
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+class Page:
+    def __init__(self, rows, total, next_cursor, per_page):
+        self.rows = rows
+        self.total = total
+        self.next = next_cursor
+        self.per_page = per_page
+
+
+def per_page(args, default=PER_PAGE):
+    try:
+        value = int(args.get('per_page', default))
+    except (TypeError, ValueError):
+        value = default
+    return max(1, min(value, MAX_PER_PAGE))
+
+
+def encode_cursor(keys, total):
+    raw = json.dumps({'k': list(keys), 'n': total}, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, key_count):
+    # raises ValueError on anything malformed; callers turn that into a 400
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        keys, total = data['k'], data['n']
+    except Exception as exc:
+        raise ValueError("invalid cursor") from exc
+    if not isinstance(keys, list) or len(keys) != key_count:
+        raise ValueError("invalid cursor")
+    return keys, total
+
+
+def count(conn, from_sql, filters, params):
+    sql = f"SELECT COUNT(*) {from_sql}" + (" WHERE " + " AND ".join(filters) if filters else "")
+    key = (sql, tuple(params))
+    now = time.monotonic()
+    with _lock:
+        cached = _counts.get(key)
+        if cached and cached[0] > now:
+            _stats['hits'] += 1
+            return cached[1]
+        _stats['misses'] += 1
+    total = conn.execute(sql, params).fetchone()[0]
+    with _lock:
+        if len(_counts) > 1024:
+            _counts.clear()
+        _counts[key] = (now + COUNT_TTL, total)
+    return total
+
+
+def stats():
+    with _lock:
+        return dict(_stats)
+
+
+def fetch(conn, columns, from_sql, keys, filters=(), params=(), after=None, limit=PER_PAGE, descending=False):
+    # columns: the SELECT list; keys: (expression, index in columns) pairs forming a unique sort
+    filters = list(filters)
+    params = list(params)
+    if after:
+        last, total = decode_cursor(after, len(keys))
+    else:
+        last, total = None, count(conn, from_sql, filters, params)
+
+    where = list(filters)
+    where_params = list(params)
+    if last is not None:
+        expressions = ", ".join(expr for expr, _ in keys)
+        marks = ", ".join("?" * len(keys))
+        where.append(f"({expressions}) {'<' if descending else '>'} ({marks})")
+        where_params += last
+
+    direction = " DESC" if descending else ""
+    sql = f"SELECT {columns} {from_sql}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY " + ", ".join(expr + direction for expr, _ in keys) + " LIMIT ?"
+    rows = conn.execute(sql, where_params + [limit + 1]).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][index] for _, index in keys], total)
+    return Page(rows, total, next_cursor, limit)
@@ -0,0 +1,203 @@
+# opt-in request profiling and SQL instrumentation (PROFILE=1)
+# when enabled, db.py opens its connections with ProfiledConnection, whose cursors time every
+# execute()/executemany() and report it to the recorder of the request running on that thread.
+# per request we log the route, wall time, statement count, total SQL time, the slowest statements
+# and N+1 suspects: the same statement shape (literals and IN lists folded) run more than
+# PROFILE_N_PLUS_ONE times. records are JSON lines appended to one log shared by every gunicorn
+# worker; /profile summarises its tail. the handler reopens the file when it is moved, so rotation
+# is left to logrotate (a RotatingFileHandler per process would rotate the file under the others).
+# SQL time is the time spent in execute(), which for SQLite includes producing the first row.
+# threads without a request (job workers, the autosave flusher) are not recorded.
+import heapq
+import json
+import logging
+import logging.handlers
+import os
+import re
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+from flask import request
+
+import db
+
+N_PLUS_ONE = 10            # same statement shape more often than this in one request is flagged
+SLOWEST = 5                # statements kept per request
+LOG_TAIL_BYTES = 5 * 1024 * 1024   # of the log read by recent()
+
+_local = threading.local()
+_logger = logging.getLogger('attendance_system.profile')
+_log_path = None
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def shape(sql):
+    # "SELECT * FROM t WHERE id IN (1, 2, 3) AND name = 'x'" -> "SELECT * FROM t WHERE id IN (?, ...) AND name = ?"
+    text = _SPACE.sub(' ', sql).strip()
+    text = _NUMBER.sub('?', _STRING.sub('?', text))
+    return _IN_LIST.sub('(?, ...)', text)
+
+
+class Recorder:
+    def __init__(self, n_plus_one=N_PLUS_ONE):
+        self.start = time.perf_counter()
+        self.n_plus_one = n_plus_one
+        self.statements = {}   # sql -> [count, total seconds, slowest seconds]
+        self.status = 500
+
+    def add(self, sql, elapsed):
+        entry = self.statements.get(sql)
+        if entry is None:
+            self.statements[sql] = [1, elapsed, elapsed]
+        else:
+            entry[0] += 1
+            entry[1] += elapsed
+            if elapsed > entry[2]:
+                entry[2] = elapsed
+
+    def finish(self):
+        wall = time.perf_counter() - self.start
+        by_shape = {}
+        for sql, (count, total, _) in self.statements.items():
+            entry = by_shape.setdefault(shape(sql), [0, 0.0])
+            entry[0] += count
+            entry[1] += total
+        slowest = heapq.nlargest(SLOWEST, self.statements.items(), key=lambda item: item[1][2])
+        return {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'pid': os.getpid(),
+            'method': request.method,
+            'route': request.url_rule.rule if request.url_rule else request.path,
+            'path': request.path,
+            'status': self.status,
+            'wall_ms': round(wall * 1000, 3),
+            'sql_count': sum(entry[0] for entry in self.statements.values()),
+            'sql_ms': round(sum(entry[1] for entry in self.statements.values()) * 1000, 3),
+            'slowest': [
+                {'statement': shape(sql), 'ms': round(slow * 1000, 3), 'count': count}
+                for sql, (count, _, slow) in slowest
+            ],
+            'n_plus_one': [
+                {'statement': statement, 'count': count, 'ms': round(total * 1000, 3)}
+                for statement, (count, total) in sorted(by_shape.items(), key=lambda item: -item[1][0])
+                if count > self.n_plus_one
+            ],
+        }
+
+
+def _timed(method, sql, *args):
+    recorder = getattr(_local, 'recorder', None)
+    if recorder is None:
+        return method(sql, *args)
+    start = time.perf_counter()
+    try:
+        return method(sql, *args)
+    finally:
+        recorder.add(sql, time.perf_counter() - start)
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        return _timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return _timed(super().executemany, sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return _timed(super().executescript, sql_script)
+
+
+class ProfiledConnection(sqlite3.Connection):
+    # Connection.execute() does not go through cursor(), so both are routed explicitly
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+def recent(limit=200):
+    # the newest records from the log, across every worker writing to it
+    if not _log_path or not os.path.exists(_log_path):
+        return []
+    with open(_log_path, 'rb') as f:
+        size = f.seek(0, 2)
+        f.seek(max(0, size - LOG_TAIL_BYTES))
+        lines = f.read().splitlines()
+    records = []
+    for line in lines[-limit:]:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue  # the line cut by the seek, or a concurrent write
+    return records
+
+
+def summary(records):
+    # per route: request count, mean and max wall time, mean statement count, requests with N+1 suspects
+    routes = {}
+    for record in records:
+        key = f"{record['method']} {record['route']}"
+        entry = routes.setdefault(key, {'requests': 0, 'wall_ms': 0.0, 'max_wall_ms': 0.0, 'sql_count': 0, 'sql_ms': 0.0, 'n_plus_one': 0})
+        entry['requests'] += 1
+        entry['wall_ms'] += record['wall_ms']
+        entry['max_wall_ms'] = max(entry['max_wall_ms'], record['wall_ms'])
+        entry['sql_count'] += record['sql_count']
+        entry['sql_ms'] += record['sql_ms']
+        entry['n_plus_one'] += bool(record['n_plus_one'])
+    for entry in routes.values():
+        n = entry['requests']
+        entry['wall_ms'] = round(entry['wall_ms'] / n, 3)
+        entry['sql_count'] = round(entry['sql_count'] / n, 1)
+        entry['sql_ms'] = round(entry['sql_ms'] / n, 3)
+    return dict(sorted(routes.items(), key=lambda item: -item[1]['wall_ms']))
+
+
+def init_app(app, log_path):
+    global _log_path
+    app.config.setdefault('PROFILE', os.environ.get('PROFILE') == '1')
+    app.config.setdefault('PROFILE_N_PLUS_ONE', int(os.environ.get('PROFILE_N_PLUS_ONE', N_PLUS_ONE)))
+    if not app.config['PROFILE']:
+        return
+    _log_path = log_path
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    handler = logging.handlers.WatchedFileHandler(log_path)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    _logger.addHandler(handler)
+    _logger.setLevel(logging.INFO)
+    _logger.propagate = False
+    db.set_connection_factory(ProfiledConnection)
+
+    @app.before_request
+    def start_profile():
+        if request.endpoint != 'static':
+            _local.recorder = Recorder(app.config['PROFILE_N_PLUS_ONE'])
+
+    @app.after_request
+    def record_status(response):
+        recorder = getattr(_local, 'recorder', None)
+        if recorder is not None:
+            recorder.status = response.status_code
+        return response
+
+    @app.teardown_request
+    def finish_profile(exc=None):
+        recorder = getattr(_local, 'recorder', None)
+        if recorder is None:
+            return
+        _local.recorder = None
+        record = recorder.finish()
+        _logger.log(logging.WARNING if record['n_plus_one'] else logging.INFO, json.dumps(record, separators=(',', ':')))
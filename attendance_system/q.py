@@ -1,34 +1,26 @@
-import sqlite3
-import pandas as pd
-
-# Load the Excel file (change filename for DAA)
-file_path = "attendance_system/questions.xlsx"  # Use "DAA_Questions.xlsx" for DAA
-df = pd.read_excel(file_path)
-
-# Map correct answer to just 'A', 'B', 'C', 'D'
-df["Correct Answer"] = df["Correct Answer"].str[0]  
-
-# Assign difficulty level (Example: First 33 -> Easy, Next 33 -> Medium, Last 34 -> Hard)
-difficulty_levels = ["Easy"] * 33 + ["Medium"] * 33 + ["Hard"] * 34
-df["Difficulty"] = difficulty_levels[:len(df)]
-
-# Connect to SQLite Database
-conn = sqlite3.connect("database/attendance.db")  # Updated database path
-cursor = conn.cursor()
-
-# Insert query
-insert_query = """
-INSERT INTO Question_Database (question, option_A, option_B, option_C, option_D, ans, difficulty, subject)
-VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-"""
-
-# Insert each row into the database
-for _, row in df.iterrows():
-    cursor.execute(insert_query, (row["Question"], row["Option_A"], row["Option_B"], row["Option_C"], row["Option_D"], row["Correct Answer"], row["Difficulty"], row["Subject"]))
-
-# Commit and close connection
-conn.commit()
-cursor.close()
-conn.close()
-
-print("Data inserted successfully into SQLite3!")
+# one-off question loader, kept for the old workflow:
+#
+#   python attendance_system/q.py [file] [--difficulty Easy|Medium|Hard] [--subject NAME]
+#
+# the real work (chunked reading, validation, de-duplication, upsert) lives in question_import.py;
+# this is the same as `flask --app attendance_system/app.py import-questions`.
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import app  # noqa: E402
+import db  # noqa: E402
+import question_import  # noqa: E402
+
+parser = argparse.ArgumentParser(description="Import questions into the question bank")
+parser.add_argument('path', nargs='?', default="attendance_system/questions.xlsx")
+parser.add_argument('--difficulty', choices=question_import.DIFFICULTIES)
+parser.add_argument('--subject')
+args = parser.parse_args()
+
+summary = question_import.import_questions(
+    db.connection(app.DB_PATH), args.path, default_difficulty=args.difficulty, default_subject=args.subject,
+)
+print(summary)
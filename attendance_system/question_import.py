@@ -0,0 +1,254 @@
+# bulk question-bank import pipeline (Excel / CSV), superseding q.py
+# 1. stream the file in chunks (pandas for CSV, openpyxl read-only for xlsx) so memory stays
+#    bounded by the chunk size, not the file size
+# 2. normalise column names and values per chunk with vectorised pandas: "Option A" / option_A / A,
+#    "B) O(log n)" answers, "A) ..." option prefixes, difficulty capitalisation
+# 3. dedupe on a hash of the normalised subject + question text, both within the file and against
+#    the bank (the unique index on Question_Database.question_hash)
+# 4. upsert every chunk with executemany inside one transaction; the FTS index follows via triggers
+import csv
+import hashlib
+import os
+import re
+
+import pandas as pd
+
+COLUMNS = ['question', 'option_A', 'option_B', 'option_C', 'option_D', 'ans', 'difficulty', 'subject']
+QUESTIONBANK_COLUMNS = ['qid'] + COLUMNS  # database/questionbank.csv has no header row
+OPTIONS = ['option_A', 'option_B', 'option_C', 'option_D']
+DIFFICULTIES = ('Easy', 'Medium', 'Hard')
+CHUNK_ROWS = 10000
+CHUNK = 500  # max host parameters per IN (...) lookup
+
+# header spellings seen in our sheets, compared lowercased with non-alphanumerics removed
+ALIASES = {
+    'question': 'question', 'questiontext': 'question',
+    'optiona': 'option_A', 'a': 'option_A',
+    'optionb': 'option_B', 'b': 'option_B',
+    'optionc': 'option_C', 'c': 'option_C',
+    'optiond': 'option_D', 'd': 'option_D',
+    'ans': 'ans', 'answer': 'ans', 'correctanswer': 'ans', 'correctoption': 'ans',
+    'difficulty': 'difficulty', 'level': 'difficulty',
+    'subject': 'subject',
+    'qid': 'qid', 'id': 'qid',
+}
+
+UPSERT = '''
+    INSERT INTO Question_Database (question, option_A, option_B, option_C, option_D, ans, difficulty, subject, question_hash)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(question_hash) DO UPDATE SET
+        question = excluded.question, option_A = excluded.option_A, option_B = excluded.option_B,
+        option_C = excluded.option_C, option_D = excluded.option_D, ans = excluded.ans,
+        difficulty = excluded.difficulty, subject = excluded.subject
+'''
+
+
+def _canonical(name):
+    return ALIASES.get(re.sub(r'[^0-9a-z]', '', str(name).lower()))
+
+
+def normalize(text):
+    return re.sub(r'\s+', ' ', str(text)).strip().casefold()
+
+
+def question_hash(subject, question):
+    return hashlib.sha1(f"{normalize(subject)}\x1f{normalize(question)}".encode('utf-8')).hexdigest()
+
+
+def _has_header(cells):
+    return any(_canonical(cell) == 'question' for cell in cells)
+
+
+def _frame(rows, columns, first_row):
+    df = pd.DataFrame(rows, columns=columns, dtype=object)
+    df = df.rename(columns={c: _canonical(c) for c in df.columns if _canonical(c)})
+    df = df.loc[:, ~df.columns.duplicated()]
+    df.insert(0, 'row', range(first_row, first_row + len(df)))
+    return df
+
+
+def iter_chunks(filepath, chunk_rows=CHUNK_ROWS):
+    # yields (DataFrame, fraction of the file read); 'row' is the line/row number in the file
+    if filepath.lower().endswith('.csv'):
+        with open(filepath, newline='', encoding='utf-8-sig') as f:
+            first = next(csv.reader(f), [])
+            f.seek(0)
+            header = _has_header(first)
+            names = None if header else (QUESTIONBANK_COLUMNS if len(first) == len(QUESTIONBANK_COLUMNS) else COLUMNS)
+            size = max(1, f.seek(0, 2))
+            f.seek(0)
+            start = 2 if header else 1
+            reader = pd.read_csv(f, header=0 if header else None, names=names, dtype=str,
+                                 keep_default_na=False, chunksize=chunk_rows)
+            for chunk in reader:
+                df = _frame(chunk.values.tolist(), list(chunk.columns), start)
+                start += len(df)
+                yield df, min(f.tell() / size, 1.0)
+        return
+
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        total = max(1, sheet.max_row or 1)
+        rows = sheet.iter_rows(values_only=True)
+        first = list(next(rows, []))
+        header = _has_header(first)
+        if header:
+            columns, start, batch = first, 2, []
+        else:
+            columns = QUESTIONBANK_COLUMNS if len(first) == len(QUESTIONBANK_COLUMNS) else COLUMNS
+            start, batch = 1, [first]
+        for values in rows:
+            batch.append(values)
+            if len(batch) >= chunk_rows:
+                yield _frame(batch, columns, start), min((start + len(batch)) / total, 1.0)
+                start += len(batch)
+                batch = []
+        if batch:
+            yield _frame(batch, columns, start), 1.0
+    finally:
+        workbook.close()
+
+
+def prepare(df, default_difficulty=None, default_subject=None):
+    # vectorised clean-up; missing or unusable values become NaN for validate()
+    df = df.copy()
+    if 'difficulty' not in df.columns:
+        df['difficulty'] = default_difficulty
+    if 'subject' not in df.columns:
+        df['subject'] = default_subject
+    for column in COLUMNS:
+        if column not in df.columns:
+            df[column] = None
+        df[column] = df[column].astype('string').str.strip().replace('', pd.NA)
+
+    # "A) Database Management System" -> "Database Management System"
+    for column in OPTIONS:
+        df[column] = df[column].str.replace(rf'^{column[-1]}\s*[\).:]\s*', '', regex=True, case=False)
+    # "B", "b", "B) O(log n)" -> "B"; anything else is not an answer key
+    df['ans'] = df['ans'].str.extract(r'^([A-Da-d])(?:\s*[\).:].*)?$', expand=False).str.upper()
+    df['difficulty'] = df['difficulty'].str.capitalize()
+    if default_difficulty:
+        df['difficulty'] = df['difficulty'].fillna(default_difficulty)
+    if default_subject:
+        df['subject'] = df['subject'].fillna(default_subject)
+
+    present = df['question'].notna() & df['subject'].notna()
+    df['question_hash'] = pd.Series(pd.NA, index=df.index, dtype='string')
+    df.loc[present, 'question_hash'] = [
+        question_hash(s, q) for s, q in zip(df.loc[present, 'subject'], df.loc[present, 'question'])
+    ]
+    return df
+
+
+def validate(df, seen):
+    # returns (valid rows, error rows); seen holds the hashes accepted from earlier chunks
+    checks = [
+        (df['question'].isna(), 'missing question'),
+        (df['subject'].isna(), 'missing subject'),
+        (df[OPTIONS].isna().any(axis=1), 'missing option'),
+        (df['ans'].isna(), 'answer must be A, B, C or D'),
+        (~df['difficulty'].isin(DIFFICULTIES), 'difficulty must be Easy, Medium or Hard'),
+        (df['question_hash'].duplicated(keep='first'), 'duplicate question in file'),
+        (df['question_hash'].isin(seen), 'duplicate question in file'),
+    ]
+    df = df.copy()
+    df['error'] = None
+    for mask, message in checks:
+        df.loc[mask.fillna(False).astype(bool) & df['error'].isna(), 'error'] = message
+    return df[df['error'].isna()], df[df['error'].notna()]
+
+
+def _current(conn, hashes):
+    # question_hash -> the stored (question, options..., ans, difficulty, subject)
+    found = {}
+    for i in range(0, len(hashes), CHUNK):
+        chunk = hashes[i:i + CHUNK]
+        placeholders = ','.join('?' * len(chunk))
+        for row in conn.execute(
+            f"SELECT question_hash, {', '.join(COLUMNS)} FROM Question_Database WHERE question_hash IN ({placeholders})",
+            chunk,
+        ):
+            found[row[0]] = tuple(row[1:])
+    return found
+
+
+def upsert(conn, valid):
+    # inside the caller's transaction; only new or changed questions are written.
+    # returns (inserted, updated, unchanged)
+    rows = list(valid[COLUMNS + ['question_hash']].itertuples(index=False, name=None))
+    current = _current(conn, [row[-1] for row in rows])
+    changed = [row for row in rows if current.get(row[-1]) != row[:-1]]
+    conn.executemany(UPSERT, changed)
+    inserted = sum(1 for row in changed if row[-1] not in current)
+    return inserted, len(changed) - inserted, len(rows) - len(changed)
+
+
+def import_questions(conn, filepath, error_path=None, default_difficulty=None, default_subject=None,
+                     chunk_rows=CHUNK_ROWS, progress=None):
+    # returns a summary dict; rejected rows are written to error_path (if given) as they are found
+    summary = {'rows': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0, 'rejected': 0}
+    seen = set()
+    error_file = open(error_path, 'w', newline='') if error_path else None
+    try:
+        writer = csv.writer(error_file) if error_file else None
+        if writer:
+            writer.writerow(['Row', 'Question', 'Error'])
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for chunk, fraction in iter_chunks(filepath, chunk_rows):
+                df = prepare(chunk, default_difficulty, default_subject)
+                valid, errors = validate(df, seen)
+                seen.update(valid['question_hash'])
+                summary['rows'] += len(df)
+                summary['rejected'] += len(errors)
+                if writer and len(errors):
+                    writer.writerows(errors[['row', 'question', 'error']].fillna('').itertuples(index=False, name=None))
+                if len(valid):
+                    inserted, updated, unchanged = upsert(conn, valid)
+                    summary['inserted'] += inserted
+                    summary['updated'] += updated
+                    summary['unchanged'] += unchanged
+                if progress:
+                    progress(0.95 * fraction, f"{summary['rows']} rows read")
+            # merge the FTS segments written by the triggers during the import
+            conn.execute("INSERT INTO Question_FTS (Question_FTS) VALUES ('optimize')")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    finally:
+        if error_file:
+            error_file.close()
+            if not summary['rejected']:
+                os.remove(error_path)
+    summary['error_file'] = error_path if error_path and summary['rejected'] else None
+    return summary
+
+
+def backfill_hashes(conn):
+    # migration step: hash the existing bank, fold duplicate questions onto the lowest qid
+    # (repointing tests and responses), then enforce uniqueness. the caller owns the transaction.
+    conn.execute("ALTER TABLE Question_Database ADD COLUMN question_hash TEXT")
+    rows = conn.execute("SELECT qid, subject, question FROM Question_Database").fetchall()
+    conn.executemany(
+        "UPDATE Question_Database SET question_hash = ? WHERE qid = ?",
+        ((question_hash(subject, question), qid) for qid, subject, question in rows),
+    )
+    duplicates = conn.execute('''
+        SELECT q.qid, keep.qid FROM Question_Database AS q
+        JOIN (SELECT question_hash, MIN(qid) AS qid FROM Question_Database GROUP BY question_hash) AS keep
+          ON keep.question_hash = q.question_hash
+        WHERE q.qid != keep.qid
+    ''').fetchall()
+    if duplicates:
+        remap = [(keep, dup) for dup, keep in duplicates]
+        conn.executemany("UPDATE Test_Questions SET qid = ? WHERE qid = ?", remap)
+        conn.execute("DELETE FROM Test_Questions WHERE test_qid NOT IN (SELECT MIN(test_qid) FROM Test_Questions GROUP BY test_id, qid)")
+        conn.executemany("UPDATE OR IGNORE Test_Response SET qid = ? WHERE qid = ?", remap)
+        conn.executemany("DELETE FROM Test_Response WHERE qid = ?", ((dup,) for dup, _ in duplicates))
+        conn.executemany("DELETE FROM Question_Database WHERE qid = ?", ((dup,) for dup, _ in duplicates))
+        conn.execute("DELETE FROM IA_Question_Cache")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_question_hash ON Question_Database(question_hash)")
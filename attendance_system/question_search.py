@@ -0,0 +1,84 @@
+# keyword search over Question_Database
+# Question_FTS is an external-content FTS5 index over the question and option text; it stores only
+# the inverted index and reads the text back from Question_Database. the triggers below keep it in
+# step with every insert/update/delete, so no caller has to remember to reindex.
+import re
+
+import pagination
+
+TABLES = [
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS Question_FTS USING fts5(
+        question, option_A, option_B, option_C, option_D,
+        content='Question_Database', content_rowid='qid',
+        tokenize='porter unicode61'
+    )
+    ''',
+]
+
+TRIGGERS = [
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_question_fts_insert AFTER INSERT ON Question_Database BEGIN
+        INSERT INTO Question_FTS (rowid, question, option_A, option_B, option_C, option_D)
+        VALUES (new.qid, new.question, new.option_A, new.option_B, new.option_C, new.option_D);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_question_fts_delete AFTER DELETE ON Question_Database BEGIN
+        INSERT INTO Question_FTS (Question_FTS, rowid, question, option_A, option_B, option_C, option_D)
+        VALUES ('delete', old.qid, old.question, old.option_A, old.option_B, old.option_C, old.option_D);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_question_fts_update
+    AFTER UPDATE OF question, option_A, option_B, option_C, option_D ON Question_Database BEGIN
+        INSERT INTO Question_FTS (Question_FTS, rowid, question, option_A, option_B, option_C, option_D)
+        VALUES ('delete', old.qid, old.question, old.option_A, old.option_B, old.option_C, old.option_D);
+        INSERT INTO Question_FTS (rowid, question, option_A, option_B, option_C, option_D)
+        VALUES (new.qid, new.question, new.option_A, new.option_B, new.option_C, new.option_D);
+    END
+    ''',
+]
+
+REBUILD = "INSERT INTO Question_FTS (Question_FTS) VALUES ('rebuild')"
+
+# bm25 column weights: a hit in the question text counts more than one in an option
+RANK = "bm25(Question_FTS, 4.0, 1.0, 1.0, 1.0, 1.0)"
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def fts_query(text):
+    # every word must match, the last one as a prefix so results narrow while typing.
+    # words are quoted, so FTS5 syntax in user input (AND, NEAR, column:, *) is taken literally.
+    words = _TOKEN.findall(text or '')
+    if not words:
+        return None
+    quoted = ['"' + word.replace('"', '""') + '"' for word in words]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def search(conn, text, subject=None, difficulty=None, after=None, limit=pagination.PER_PAGE):
+    # best match first, keyset-paged on (score, qid); raises ValueError for a bad cursor
+    match = fts_query(text)
+    if match is None:
+        return pagination.Page([], 0, None, limit)
+    filters = []
+    params = [match]
+    if subject:
+        filters.append("subject = ?")
+        params.append(subject)
+    if difficulty:
+        filters.append("difficulty = ?")
+        params.append(difficulty)
+    hits = f'''FROM (
+        SELECT q.qid, q.question, q.option_A, q.option_B, q.option_C, q.option_D, q.subject, q.difficulty,
+               {RANK} AS score
+        FROM Question_FTS JOIN Question_Database AS q ON q.qid = Question_FTS.rowid
+        WHERE Question_FTS MATCH ?
+    ) AS hits'''
+    return pagination.fetch(
+        conn, "qid, question, option_A, option_B, option_C, option_D, subject, difficulty, score", hits,
+        [('score', 8), ('qid', 0)], filters, params, after=after, limit=limit,
+    )
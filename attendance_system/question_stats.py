@@ -0,0 +1,197 @@
+# item analysis of the question bank, computed when an IA is graded
+# grading.grade_test() calls record() in its write transaction, before Test_Response is purged.
+# the responses of the test become an examinee x question matrix of choices (0 omitted, 1-4 for
+# A-D) and every statistic is a column operation on it:
+#   - difficulty index (p-value): share of examinees who answered correctly
+#   - discrimination index: p-value of the top 27% by score minus that of the bottom 27%
+#   - distractor counts: how often each option was chosen, and how often the question was skipped
+# Question_Stats keeps one row per qid: raw counts summed over every test, plus p-value and
+# discrimination averaged over tests weighted by examinees and halved every HALF_LIFE_DAYS of test
+# date, so the figures follow how a question performs now rather than years ago.
+import datetime
+
+import numpy as np
+
+LETTERS = 'ABCD'
+GROUP = 0.27               # upper/lower group share for the discrimination index
+MIN_DISCRIMINATION_N = 4   # fewer examinees leave the groups overlapping
+HALF_LIFE_DAYS = 365
+
+TABLES = [
+    '''
+    CREATE TABLE IF NOT EXISTS Question_Stats (
+        qid INTEGER PRIMARY KEY REFERENCES Question_Database(qid),
+        tests INTEGER NOT NULL DEFAULT 0,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        correct INTEGER NOT NULL DEFAULT 0,
+        choice_a INTEGER NOT NULL DEFAULT 0,
+        choice_b INTEGER NOT NULL DEFAULT 0,
+        choice_c INTEGER NOT NULL DEFAULT 0,
+        choice_d INTEGER NOT NULL DEFAULT 0,
+        omitted INTEGER NOT NULL DEFAULT 0,
+        p_value REAL,
+        discrimination REAL,
+        weight REAL NOT NULL DEFAULT 0,
+        discrimination_weight REAL NOT NULL DEFAULT 0,
+        as_of TEXT
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_question_stats_p_value ON Question_Stats(p_value)",
+]
+
+UPSERT = '''
+    INSERT INTO Question_Stats (qid, tests, attempts, correct, choice_a, choice_b, choice_c, choice_d, omitted,
+                                p_value, discrimination, weight, discrimination_weight, as_of)
+    VALUES (?, 1, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(qid) DO UPDATE SET
+        tests = tests + 1, attempts = attempts + excluded.attempts, correct = correct + excluded.correct,
+        choice_a = choice_a + excluded.choice_a, choice_b = choice_b + excluded.choice_b,
+        choice_c = choice_c + excluded.choice_c, choice_d = choice_d + excluded.choice_d,
+        omitted = omitted + excluded.omitted, p_value = excluded.p_value, discrimination = excluded.discrimination,
+        weight = excluded.weight, discrimination_weight = excluded.discrimination_weight, as_of = excluded.as_of
+'''
+
+# per examinee: answer count, qids and answer letters in matching order
+RESPONSES = '''
+    SELECT roll, COUNT(*), group_concat(CAST(qid AS INTEGER)), group_concat(answer, '')
+    FROM Test_Response
+    WHERE test_id = ? AND answer IN ('A', 'B', 'C', 'D')
+    GROUP BY roll
+'''
+
+
+def analyse(choices, key):
+    # choices: (examinees, questions) int8, 0 omitted / 1-4; key: (questions,) 1-4, 0 if unknown
+    # -> p-values, discrimination (NaN below MIN_DISCRIMINATION_N), correct counts, (5, questions) choice counts.
+    # a question with an unknown key gets NaN figures and no correct answers: an omitted answer (0)
+    # would otherwise match it
+    n = choices.shape[0]
+    known = key > 0
+    correct = (choices == key) & known
+    p_values = np.where(known, correct.mean(axis=0), np.nan)
+    discrimination = np.full(choices.shape[1], np.nan)
+    if n >= MIN_DISCRIMINATION_N:
+        group = max(1, int(round(GROUP * n)))
+        order = np.argsort(correct.sum(axis=1), kind='stable')
+        discrimination = correct[order[-group:]].mean(axis=0) - correct[order[:group]].mean(axis=0)
+        discrimination[~known] = np.nan
+    counts = np.stack([(choices == c).sum(axis=0) for c in range(5)])
+    return p_values, discrimination, correct.sum(axis=0), counts
+
+
+def _decayed(old, old_weight, new, new_weight, old_factor, new_factor):
+    # weighted mean of the stored and the new figure; a missing figure contributes nothing
+    old_weight = np.where(np.isnan(old), 0.0, old_weight * old_factor)
+    new_weight = np.where(np.isnan(new), 0.0, new_weight * new_factor)
+    total = old_weight + new_weight
+    mean = np.divide(np.nan_to_num(old) * old_weight + np.nan_to_num(new) * new_weight, total,
+                     out=np.full(total.shape, np.nan), where=total > 0)
+    return mean, total
+
+
+def _iso_date(value):
+    try:
+        return datetime.date.fromisoformat(str(value)).isoformat()
+    except ValueError:
+        return datetime.date.today().isoformat()
+
+
+def record(conn, test_id):
+    # folds one test's responses into Question_Stats; caller owns the transaction. returns the
+    # number of questions updated
+    test = conn.execute("SELECT ia_date FROM Tests WHERE test_id = ?", (test_id,)).fetchone()
+    questions = conn.execute(
+        "SELECT CAST(qid AS INTEGER), MIN(answer) FROM Test_Questions WHERE test_id = ? GROUP BY 1 ORDER BY 1", (test_id,)
+    ).fetchall()
+    if test is None or not questions:
+        return 0
+    qids = np.array([qid for qid, _ in questions], dtype=np.int64)
+    key = np.array([LETTERS.index(answer) + 1 if answer and answer in LETTERS else 0 for _, answer in questions], dtype=np.int8)
+
+    # one row per examinee with their answers packed into two strings, unpacked with NumPy:
+    # far cheaper than fetching a Python tuple per response
+    per_roll = conn.execute(RESPONSES, (test_id,)).fetchall()
+    answered_rolls = {roll for roll, _, _, _ in per_roll}
+    # examinees: everyone who submitted, with or without answers
+    blank = sum(1 for (roll,) in conn.execute(
+        "SELECT roll FROM IA_Submission WHERE test_id = ? AND status = 'submitted'", (test_id,)
+    ) if roll not in answered_rolls)
+    examinees = len(per_roll) + blank
+    if not examinees:
+        return 0
+    choices = np.zeros((examinees, len(qids)), dtype=np.int8)
+    if per_roll:
+        _, answer_counts, qid_lists, answer_lists = zip(*per_roll)
+        rows = np.repeat(np.arange(len(per_roll)), answer_counts)
+        answered = np.fromstring(','.join(qid_lists), dtype=np.int64, sep=',')
+        letters = np.frombuffer(''.join(answer_lists).encode('ascii'), dtype=np.uint8) - (ord('A') - 1)
+        columns = np.searchsorted(qids, answered)
+        known = (columns < len(qids)) & (qids[np.minimum(columns, len(qids) - 1)] == answered)
+        choices[rows[known], columns[known]] = letters[known]
+    p_values, discrimination, correct, counts = analyse(choices, key)
+
+    # time weighting against what is already stored
+    date = _iso_date(test[0])
+    stored = {row[0]: row[1:] for row in conn.execute(
+        f"SELECT qid, p_value, weight, discrimination, discrimination_weight, as_of FROM Question_Stats "
+        f"WHERE qid IN ({','.join('?' * len(qids))})", qids.tolist()
+    )}
+    old = np.array([stored.get(qid, (None, 0.0, None, 0.0, None))[:4] for qid in qids.tolist()], dtype=float)
+    as_of = [stored.get(qid, (None,) * 5)[4] or date for qid in qids.tolist()]
+    age = np.array([(datetime.date.fromisoformat(date) - datetime.date.fromisoformat(a)).days for a in as_of], dtype=float)
+    old_factor = 0.5 ** (np.maximum(age, 0) / HALF_LIFE_DAYS)
+    new_factor = 0.5 ** (np.maximum(-age, 0) / HALF_LIFE_DAYS)   # a test older than the stored figures
+    n = float(examinees)
+    p_mean, p_weight = _decayed(old[:, 0], old[:, 1], p_values, n, old_factor, new_factor)
+    d_mean, d_weight = _decayed(old[:, 2], old[:, 3], discrimination, n, old_factor, new_factor)
+
+    def value(x):
+        return None if np.isnan(x) else round(float(x), 4)
+
+    conn.executemany(UPSERT, [
+        (qid, examinees, int(correct[j]), *(int(c) for c in counts[1:, j]), int(counts[0, j]),
+         value(p_mean[j]), value(d_mean[j]), float(p_weight[j]), float(d_weight[j]), max(as_of[j], date))
+        for j, qid in enumerate(qids.tolist())
+    ])
+    return len(qids)
+
+
+SORTS = {
+    'easiest': "Question_Stats.p_value IS NULL, Question_Stats.p_value DESC",
+    'hardest': "Question_Stats.p_value IS NULL, Question_Stats.p_value",
+    'discrimination': "Question_Stats.discrimination IS NULL, Question_Stats.discrimination DESC",
+}
+
+
+def browse(conn, subject, difficulty=None, p_min=None, p_max=None, sort=None):
+    # (qid, question, p_value, discrimination, attempts) of a subject for Create_IA. p_min/p_max
+    # (0-1) keep only questions with an empirical difficulty in range; sort is a key of SORTS
+    filters = ["Question_Database.subject = ?"]
+    params = [subject]
+    if difficulty:
+        filters.append("Question_Database.difficulty = ?")
+        params.append(difficulty)
+    if p_min is not None:
+        filters.append("Question_Stats.p_value >= ?")
+        params.append(p_min)
+    if p_max is not None:
+        filters.append("Question_Stats.p_value <= ?")
+        params.append(p_max)
+    order = SORTS.get(sort, "Question_Database.qid")
+    return conn.execute(f'''
+        SELECT Question_Database.qid, Question_Database.question, Question_Stats.p_value,
+               Question_Stats.discrimination, Question_Stats.attempts
+        FROM Question_Database LEFT JOIN Question_Stats ON Question_Stats.qid = Question_Database.qid
+        WHERE {' AND '.join(filters)}
+        ORDER BY {order}, Question_Database.qid
+    ''', params).fetchall()
+
+
+def lookup(conn, qids):
+    # qid -> (p_value, discrimination, attempts) for the questions that have been in a graded test
+    qids = [int(qid) for qid in qids]
+    if not qids:
+        return {}
+    return {row[0]: row[1:] for row in conn.execute(
+        f"SELECT qid, p_value, discrimination, attempts FROM Question_Stats WHERE qid IN ({','.join('?' * len(qids))})", qids
+    )}
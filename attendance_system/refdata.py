@@ -0,0 +1,84 @@
+# in-process cache of the reference data: School / Department / Class / TeacherClassSubject / Teacher
+# the whole hierarchy is small and changes a few times a term, so each worker keeps one immutable
+# snapshot and rebuilds it only when the 'refdata' version in Cache_Version moves. every admin route
+# that writes these tables calls invalidate() before committing.
+import threading
+
+import cache_version
+
+_snapshot = None
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+class Snapshot:
+    def __init__(self, conn, version):
+        self.version = version
+        # same row shapes as the SELECT * queries the templates were written against
+        self.schools = conn.execute("SELECT id, name FROM School ORDER BY id").fetchall()
+        self.departments = conn.execute("SELECT id, name, school_id FROM Department ORDER BY id").fetchall()
+        self.classes = conn.execute("SELECT id, name, department_id FROM Class ORDER BY id").fetchall()
+        self.teachers = conn.execute("SELECT user_id, name, subject FROM Teacher ORDER BY id").fetchall()
+        assignments = conn.execute(
+            "SELECT teacher_id, class_id FROM TeacherClassSubject ORDER BY id"
+        ).fetchall()
+
+        self.school = {row[0]: row for row in self.schools}
+        self.department = {row[0]: row for row in self.departments}
+        self.class_ = {row[0]: row for row in self.classes}
+        self.teacher = {row[0]: row for row in self.teachers}
+
+        # school -> department -> class, as nested (row, children) pairs
+        classes_by_department = {}
+        for row in self.classes:
+            classes_by_department.setdefault(row[2], []).append(row)
+        departments_by_school = {}
+        for row in self.departments:
+            departments_by_school.setdefault(row[2], []).append((row, classes_by_department.get(row[0], [])))
+        self.tree = [(row, departments_by_school.get(row[0], [])) for row in self.schools]
+
+        # teacher -> [(class_id, class_name)], what the TeacherClassSubject -> Class join returned
+        self.teacher_classes = {}
+        for teacher_id, class_id in assignments:
+            if class_id in self.class_:
+                self.teacher_classes.setdefault(teacher_id, []).append((class_id, self.class_[class_id][1]))
+        self.class_teachers = {}
+        for teacher_id, class_id in assignments:
+            self.class_teachers.setdefault(class_id, set()).add(teacher_id)
+
+    def classes_for_teacher(self, teacher_id):
+        return self.teacher_classes.get(int(teacher_id), [])
+
+    def teaches(self, teacher_id, class_id):
+        try:
+            return int(teacher_id) in self.class_teachers.get(int(class_id), ())
+        except (TypeError, ValueError):
+            return False
+
+
+def get(conn):
+    global _snapshot
+    version = cache_version.get(conn, 'refdata')
+    snapshot = _snapshot
+    if snapshot is None or snapshot.version != version:
+        with _lock:
+            if _snapshot is None or _snapshot.version != version:
+                _snapshot = Snapshot(conn, version)
+                _stats['misses'] += 1
+            snapshot = _snapshot
+    else:
+        _stats['hits'] += 1  # lock-free on the hot path, so approximate under contention
+    return snapshot
+
+
+def invalidate(conn):
+    # the caller commits; this worker rebuilds on its next get(), the others within CHECK_INTERVAL
+    global _snapshot
+    cache_version.bump(conn, 'refdata')
+    with _lock:
+        _snapshot = None
+
+
+def stats():
+    with _lock:
+        return dict(_stats)
@@ -0,0 +1,173 @@
+# bulk student import pipeline (Excel / CSV)
+# 1. read the sheet and resolve Department / Class names to ids with dicts prefetched once
+# 2. validate every row up front (unknown department/class, duplicate roll/email in the file or
+#    already in the database, missing fields) and collect per-row errors instead of aborting
+# 3. hash passwords with bcrypt on a thread pool across all cores; bcrypt releases the GIL, and
+#    forking a gunicorn worker that runs job, metrics and autosave threads could deadlock the child
+# 4. insert users and students with executemany inside one transaction, after checking emails and
+#    roll numbers again under the write lock: a row taken since step 2 is skipped and reported
+import csv
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+import pandas as pd
+
+COLUMNS = ['Name', 'Email', 'Password', 'Roll Number', 'Class Name', 'Department Name']
+CHUNK = 500  # max host parameters per IN (...) lookup
+
+
+def _hash_password(password, rounds):
+    # same output format as flask_bcrypt's generate_password_hash
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def hash_passwords(passwords, rounds=12, workers=None):
+    passwords = list(passwords)
+    if not passwords:
+        return []
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return [_hash_password(p, rounds) for p in passwords]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_hash_password, passwords, [rounds] * len(passwords)))
+
+
+def read_sheet(filepath):
+    if filepath.lower().endswith('.csv'):
+        df = pd.read_csv(filepath, dtype=str)
+    else:
+        df = pd.read_excel(filepath, dtype=str)
+    df.columns = [str(c).strip() for c in df.columns]
+    missing = [c for c in COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"missing columns: {', '.join(missing)}")
+    df = df[COLUMNS].apply(lambda col: col.str.strip())
+    # spreadsheet row number, counting the header as row 1
+    df.insert(0, 'row', df.index + 2)
+    return df
+
+
+def _existing(conn, sql, values):
+    found = set()
+    values = list(values)
+    for i in range(0, len(values), CHUNK):
+        chunk = values[i:i + CHUNK]
+        placeholders = ','.join('?' * len(chunk))
+        found.update(r[0] for r in conn.execute(sql.format(placeholders), chunk))
+    return found
+
+
+def _taken(conn, df):
+    # (emails, roll numbers) of df already in the database
+    emails = df['Email'].dropna().unique()
+    existing_emails = _existing(conn, "SELECT email FROM users WHERE email IN ({})", emails)
+    existing_emails |= _existing(conn, "SELECT email FROM Student WHERE email IN ({})", emails)
+    existing_rolls = _existing(conn, "SELECT roll_number FROM Student WHERE roll_number IN ({})", df['Roll Number'].dropna().unique())
+    return existing_emails, existing_rolls
+
+
+def validate(conn, df):
+    # returns (valid rows, error rows); both keep the spreadsheet row number
+    departments = {name: dept_id for dept_id, name in conn.execute("SELECT id, name FROM Department")}
+    classes = {(dept_id, name): class_id for class_id, name, dept_id in conn.execute("SELECT id, name, department_id FROM Class")}
+
+    df = df.copy()
+    df['department_id'] = df['Department Name'].map(departments)
+    df['class_id'] = [classes.get((d, c)) for d, c in zip(df['department_id'], df['Class Name'])]
+
+    existing_emails, existing_rolls = _taken(conn, df)
+
+    # first matching check wins, in this order
+    checks = [
+        (df[COLUMNS].isna().any(axis=1), 'missing value'),
+        (df['department_id'].isna(), 'unknown department'),
+        (df['class_id'].isna(), 'unknown class'),
+        (df['Roll Number'].duplicated(keep='first'), 'duplicate roll number in file'),
+        (df['Email'].duplicated(keep='first'), 'duplicate email in file'),
+        (df['Roll Number'].isin(existing_rolls), 'roll number already exists'),
+        (df['Email'].isin(existing_emails), 'email already exists'),
+    ]
+    df['error'] = None
+    for mask, message in checks:
+        df.loc[mask & df['error'].isna(), 'error'] = message
+
+    errors = df[df['error'].notna()]
+    valid = df[df['error'].isna()].copy()
+    valid['class_id'] = valid['class_id'].astype(int)
+    return valid, errors
+
+
+def write_errors(errors, path):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Row', 'Roll Number', 'Email', 'Error'])
+        writer.writerows(errors[['row', 'Roll Number', 'Email', 'error']].itertuples(index=False, name=None))
+
+
+def insert_students(conn, valid, hashes):
+    # returns the rows skipped because their roll number or email was registered after validate()
+    valid = valid.assign(hash=list(hashes), error=None)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        existing_emails, existing_rolls = _taken(conn, valid)
+        valid.loc[valid['Roll Number'].isin(existing_rolls), 'error'] = 'roll number already exists'
+        valid.loc[valid['Email'].isin(existing_emails) & valid['error'].isna(), 'error'] = 'email already exists'
+        skipped = valid[valid['error'].notna()]
+        valid = valid[valid['error'].isna()]
+        emails = valid['Email'].tolist()
+        hashes = valid['hash'].tolist()
+        conn.executemany(
+            "INSERT INTO users (email, password, role) VALUES (?, ?, 'student')",
+            zip(emails, hashes),
+        )
+        user_ids = {}
+        for i in range(0, len(emails), CHUNK):
+            chunk = emails[i:i + CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            user_ids.update((email, uid) for uid, email in conn.execute(f"SELECT id, email FROM users WHERE email IN ({placeholders})", chunk))
+        conn.executemany(
+            "INSERT INTO Student (user_id, name, roll_number, class_id, email, password) VALUES (?, ?, ?, ?, ?, ?)",
+            ((user_ids[email], name, roll, class_id, email, pw)
+             for email, name, roll, class_id, pw in zip(emails, valid['Name'], valid['Roll Number'], valid['class_id'], hashes)),
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return skipped.drop(columns='hash')
+
+
+def import_students(conn, filepath, error_path=None, rounds=12, workers=None, progress=None):
+    # returns a summary dict; rows that fail validation are written to error_path (if given)
+    timings = {}
+    start = time.perf_counter()
+    df = read_sheet(filepath)
+    valid, errors = validate(conn, df)
+    timings['validate'] = time.perf_counter() - start
+    if progress:
+        progress(0.1, f"{len(valid)} valid rows, {len(errors)} rejected")
+
+    start = time.perf_counter()
+    hashes = hash_passwords(valid['Password'], rounds=rounds, workers=workers)
+    timings['hash'] = time.perf_counter() - start
+    if progress:
+        progress(0.9, "passwords hashed")
+
+    start = time.perf_counter()
+    if len(valid):
+        skipped = insert_students(conn, valid, hashes)
+        if len(skipped):
+            errors = pd.concat([errors, skipped]).sort_values('row')
+    timings['insert'] = time.perf_counter() - start
+
+    if error_path and len(errors):
+        write_errors(errors, error_path)
+    return {
+        'rows': len(df),
+        'imported': len(df) - len(errors),
+        'rejected': len(errors),
+        'error_file': error_path if len(errors) else None,
+        'seconds': {k: round(v, 3) for k, v in timings.items()},
+    }
@@ -0,0 +1,58 @@
+# per-worker LRU/TTL cache of the users row behind Flask-Login's load_user
+# entries are dropped explicitly when a route changes a user, and the whole cache is cleared
+# when another worker bumps the 'users' version (see cache_version.py).
+import threading
+import time
+from collections import OrderedDict
+
+import cache_version
+
+MAX_ENTRIES = 2048
+TTL = 300  # seconds
+
+_entries = OrderedDict()   # user_id -> (expires_at, (id, email, role))
+_seen_version = None
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'evictions': 0}
+
+
+def get(conn, user_id, loader):
+    # loader(user_id) -> (id, email, role) or None; only called on a miss
+    global _seen_version
+    key = str(user_id)
+    version = cache_version.get(conn, 'users')
+    now = time.monotonic()
+    with _lock:
+        if version != _seen_version:
+            _entries.clear()
+            _seen_version = version
+        entry = _entries.get(key)
+        if entry is not None and entry[0] > now:
+            _entries.move_to_end(key)
+            _stats['hits'] += 1
+            return entry[1]
+        _stats['misses'] += 1
+
+    row = loader(user_id)
+    if row is not None:
+        with _lock:
+            _entries[key] = (now + TTL, tuple(row))
+            _entries.move_to_end(key)
+            while len(_entries) > MAX_ENTRIES:
+                _entries.popitem(last=False)
+                _stats['evictions'] += 1
+    return row
+
+
+def invalidate(conn, user_id):
+    # drop the local entry and signal the other workers; the caller commits
+    with _lock:
+        _entries.pop(str(user_id), None)
+        _stats['invalidations'] += 1
+    cache_version.bump(conn, 'users')
+
+
+def stats():
+    with _lock:
+        lookups = _stats['hits'] + _stats['misses']
+        return dict(_stats, size=len(_entries), hit_rate=round(_stats['hits'] / lookups, 4) if lookups else None)